@@ -0,0 +1,245 @@
+import os
+import math
+import time
+import threading
+import logging
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Tuple
+
+import config
+import cancellation
+
+logger = logging.getLogger(__name__)
+
+# Relative CPU cost per page at 72 DPI. Rendering operations rasterize and
+# encode every page; structural operations only copy objects around.
+OPERATION_WEIGHTS = {
+    'compress': 1.0,
+    'pdf_to_jpg': 1.0,
+    'jpg_to_pdf': 0.5,
+    'watermark': 0.1,
+    'edit': 0.1,
+    'protect': 0.05,
+    'unlock': 0.05,
+    'merge': 0.02,
+    'split': 0.02,
+    'rotate': 0.02,
+    'sort': 0.02,
+    'analyze': 0.01,
+    'index': 0.02,
+}
+
+# Operations that hold a page raster in memory while they run.
+RENDERING_OPERATIONS = {'compress', 'pdf_to_jpg'}
+
+# Rendering operations that may rasterize a page above the requested DPI.
+# compress_pdf renders bilevel pages at COMPRESS_BILEVEL_SCALE x dpi, and any
+# page may turn out bilevel, so it is charged for the larger render.
+RENDER_SCALES = {
+    'compress': config.COMPRESS_BILEVEL_SCALE,
+}
+
+# RGB raster of an A4 page at 72 DPI.
+PAGE_RASTER_BYTES = 595 * 842 * 3
+
+# Object graphs of parsed documents are a few times larger than the file.
+PARSE_MEMORY_FACTOR = 3
+
+
+class AdmissionRejected(Exception):
+    """Raised when the server is over capacity. Maps to 503 + Retry-After."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Server is busy, please retry later")
+        self.retry_after = retry_after
+
+
+def estimate_cost(operation: str, pages: int, dpi: int = 72, input_bytes: int = 0) -> Tuple[float, int]:
+    """
+    Estimate the cost of a request before running it.
+
+    Args:
+        operation: Key of OPERATION_WEIGHTS.
+        pages: Number of pages (or images) to process.
+        dpi: Render resolution for rasterizing operations.
+        input_bytes: Total size of the input files.
+
+    Returns:
+        (cpu cost units, estimated peak memory in bytes). One cost unit is
+        roughly one page rasterized at 72 DPI.
+    """
+    scale = (dpi * RENDER_SCALES.get(operation, 1) / 72.0) ** 2
+    weight = OPERATION_WEIGHTS.get(operation, 0.1)
+    cost = max(1, pages) * scale * weight
+
+    memory = input_bytes * PARSE_MEMORY_FACTOR
+    if operation in RENDERING_OPERATIONS:
+        # Pages are rendered one at a time
+        memory += int(PAGE_RASTER_BYTES * scale)
+    return cost, memory
+
+
+class _Ticket:
+    __slots__ = ('session_key', 'cost', 'memory', 'granted', 'started')
+
+    def __init__(self, session_key: str, cost: float, memory: int):
+        self.session_key = session_key
+        self.cost = cost
+        self.memory = memory
+        self.granted = False
+        self.started = None
+
+
+class AdmissionController:
+    """
+    Global CPU/memory budget for PDF operations.
+
+    Requests that fit in the remaining budget run immediately. Others wait
+    in per-session queues served round-robin, so one session submitting many
+    large jobs cannot starve the rest. When the queue is full, or a request
+    waits longer than queue_timeout, AdmissionRejected is raised.
+
+    A single job larger than the whole budget is still admitted once nothing
+    else is running, so it can never be blocked forever.
+    """
+
+    def __init__(self, cost_budget: float, memory_budget: int, max_queue: int = 32, queue_timeout: float = 30.0):
+        self.cost_budget = cost_budget
+        self.memory_budget = memory_budget
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._cost_in_use = 0.0
+        self._memory_in_use = 0
+        self._running = 0
+        self._queues = OrderedDict()  # session_key -> deque of waiting tickets
+        self._queued = 0
+        self._rejected = 0
+        self._avg_duration = 1.0  # seconds, moving average
+
+    def _fits(self, ticket: _Ticket) -> bool:
+        if self._running == 0:
+            return True
+        return (self._cost_in_use + ticket.cost <= self.cost_budget and
+                self._memory_in_use + ticket.memory <= self.memory_budget)
+
+    def _grant(self, ticket: _Ticket) -> None:
+        ticket.granted = True
+        ticket.started = time.monotonic()
+        self._cost_in_use += ticket.cost
+        self._memory_in_use += ticket.memory
+        self._running += 1
+
+    def _dispatch(self) -> None:
+        """Grant queued tickets round-robin across sessions while they fit."""
+        while self._queues:
+            session_key, queue = next(iter(self._queues.items()))
+            ticket = queue[0]
+            if not self._fits(ticket):
+                break
+            queue.popleft()
+            self._queued -= 1
+            self._grant(ticket)
+            # Move the session to the back of the rotation
+            del self._queues[session_key]
+            if queue:
+                self._queues[session_key] = queue
+        self._cond.notify_all()
+
+    def _remove(self, ticket: _Ticket) -> None:
+        queue = self._queues.get(ticket.session_key)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            self._queued -= 1
+            if not queue:
+                del self._queues[ticket.session_key]
+
+    def retry_after(self) -> int:
+        """Rough number of seconds until capacity frees up."""
+        waves = (self._queued + 1) / max(1, self._running)
+        return max(1, math.ceil(self._avg_duration * waves))
+
+    def _reject(self) -> AdmissionRejected:
+        self._rejected += 1
+        retry_after = self.retry_after()
+        logger.warning(f"Admission rejected: {self._running} running, {self._queued} queued, retry after {retry_after}s")
+        return AdmissionRejected(retry_after)
+
+    def acquire(self, session_key: str, cost: float, memory: int = 0) -> _Ticket:
+        """
+        Block until the request is admitted, or raise AdmissionRejected.
+        A queued request whose cancellation token trips (e.g. its client
+        went away) gives up its place and raises Cancelled.
+        """
+        token = cancellation.current()
+        ticket = _Ticket(session_key, cost, memory)
+        with self._cond:
+            if not self._queued and self._fits(ticket):
+                self._grant(ticket)
+                return ticket
+
+            if self._queued >= self.max_queue:
+                raise self._reject()
+
+            self._queues.setdefault(session_key, deque()).append(ticket)
+            self._queued += 1
+            self._dispatch()
+
+            deadline = time.monotonic() + self.queue_timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (token is not None and token.cancelled):
+                    self._remove(ticket)
+                    # Our head-of-line ticket may have blocked smaller ones
+                    self._dispatch()
+                    if remaining > 0:
+                        raise cancellation.Cancelled(token.reason)
+                    raise self._reject()
+                # Wake up now and then to notice cancellation
+                self._cond.wait(remaining if token is None else min(remaining, 0.5))
+            return ticket
+
+    def release(self, ticket: _Ticket) -> None:
+        """Return a ticket's budget and admit waiting requests."""
+        with self._cond:
+            self._cost_in_use -= ticket.cost
+            self._memory_in_use -= ticket.memory
+            self._running -= 1
+            duration = time.monotonic() - ticket.started
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, session_key: str, cost: float, memory: int = 0):
+        """Context manager holding an admission ticket for the block."""
+        ticket = self.acquire(session_key, cost, memory)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def snapshot(self) -> dict:
+        """Current load, for the health/capacity endpoint."""
+        with self._cond:
+            return {
+                'running': self._running,
+                'queued': self._queued,
+                'queued_sessions': len(self._queues),
+                'rejected_total': self._rejected,
+                'cost_in_use': round(self._cost_in_use, 1),
+                'cost_budget': self.cost_budget,
+                'memory_in_use': self._memory_in_use,
+                'memory_budget': self.memory_budget,
+                'cost_utilization': round(self._cost_in_use / self.cost_budget, 3) if self.cost_budget else 0,
+                'retry_after': self.retry_after(),
+            }
+
+
+controller = AdmissionController(
+    cost_budget=float(os.environ.get('ADMISSION_COST_BUDGET', 500 * (os.cpu_count() or 1))),
+    memory_budget=int(os.environ.get('ADMISSION_MEMORY_BUDGET_MB', 1024)) * 1024 * 1024,
+    max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', 32)),
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 30)),
+)
@@ -1,38 +1,312 @@
-from flask import Flask, render_template, request, send_file, session, jsonify
+from flask import Flask, render_template, request, session, jsonify, g
 from waitress import serve
 import socket
 import os
 import secrets
 import logging
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
 
 # Import local modules
 import shutil
 import zipfile
 import utils
-import pdf_services
+import config
+import uploads
+import admission
+import worker_pool
+import warmup
+import delivery
+import storage
+import inspection
+import state
+import text_index
+import assets
+import cancellation
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
-app.config['UPLOAD_FOLDER'] = utils.TEMP_DIR
+# Shared by every process and node, so sessions survive restarts and load balancing
+app.secret_key = state.load_secret_key()
+app.config['UPLOAD_FOLDER'] = storage.store.disk.root
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB limit
+app.jinja_env.globals.update(asset_url=assets.asset_url, pdfjs_url=assets.pdfjs_url, fonts_url=assets.fonts_url)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Ensure temp dir exists on startup
-utils.ensure_temp_directory_exists()
+storage.store.disk.ensure_root()
 
 @app.before_request
 def run_cleanup():
-    """Run cleanup before every request to keep temp folder clean."""
-    utils.cleanup_temp_files()
+    """Expire old temp files and metadata records (both throttled)."""
+    storage.store.cleanup()
+    state.metadata.purge_expired()
+
+@app.before_request
+def bind_cancel_token():
+    """
+    Stop this request's PDF work (between pages, see cancellation.py) if
+    its client disconnects; waitress reports that, see start_server().
+    """
+    probe = request.environ.get('waitress.client_disconnected')
+    g.cancel_handle = cancellation.activate(cancellation.CancelToken(probe=probe))
+
+@app.teardown_request
+def unbind_cancel_token(exc=None):
+    cancellation.deactivate(g.pop('cancel_handle', None))
+
+def session_key() -> str:
+    """Key used for per-session fairness and quotas."""
+    return session.get('session_id') or request.remote_addr
+
+def temp_path(filename: str, size_hint: int = 0) -> str:
+    """Allocate a temp file for this request, charged to the current session."""
+    return storage.store.allocate(filename, session=session_key(), size_hint=size_hint)
+
+def temp_dir(dirname: str) -> str:
+    """Create a temp directory for multi-file outputs, charged to the current session."""
+    return storage.store.allocate_dir(dirname, session=session_key())
+
+def output_options() -> dict:
+    """
+    PDF writer options from the request (form field or query parameter):
+    'linearize' ("true" for fast web view) and 'profile' ('fast' or 'compact').
+    """
+    options = {'linearize': request.values.get('linearize', '').lower() in ('1', 'true', 'yes')}
+    if request.values.get('profile'):
+        options['profile'] = request.values['profile']
+    return options
+
+def input_size(paths: list) -> int:
+    """Total size of input files, used as a size hint for outputs."""
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+def has_inputs(field: str = 'files[]') -> bool:
+    """Check whether the request carries multipart files or chunked-upload document ids."""
+    files = [f for f in request.files.getlist(field) if f and f.filename]
+    return bool(files or request.form.getlist('doc_ids[]') or request.form.get('doc_id'))
+
+def collect_inputs(field: str, prefix: str, extensions: tuple = None, check: bool = True,
+                   accept_encrypted: bool = False) -> list:
+    """
+    Gather operation inputs from multipart files and finalized chunked uploads.
+
+    Multipart files are saved to temp and marked as owned, so the route
+    removes them afterwards. Documents from /uploads are read in place and
+    left for the periodic cleanup, so they can feed several operations.
+
+    PDF inputs are inspected as they are collected (header, trailer and page
+    tree only), so unreadable, password-protected or oversized files are
+    rejected with a 400 before any work is queued.
+
+    Args:
+        field: Multipart field name.
+        prefix: Temp file name prefix.
+        extensions: Accepted file name extensions (default: any).
+        check: Inspect and reject unusable PDFs (inspection.check_input).
+        accept_encrypted: Allow PDFs that need a password (unlock).
+
+    Returns:
+        Non-empty list of (path, original_name, owned) tuples.
+
+    Raises:
+        inspection.InputRejected: If no input has an accepted extension, or a
+            PDF input cannot be processed.
+    """
+    inputs = []
+    try:
+        for doc_id in request.form.getlist('doc_ids[]') + request.form.getlist('doc_id'):
+            path, name = uploads.get_document(doc_id)
+            if extensions and not name.lower().endswith(extensions):
+                continue
+            inputs.append((path, name, False))
+
+        for file in request.files.getlist(field):
+            if not file or file.filename == '':
+                continue
+            if extensions and not file.filename.lower().endswith(extensions):
+                continue
+            name = secure_filename(file.filename)
+            file.stream.seek(0, os.SEEK_END)
+            size = file.stream.tell()
+            file.stream.seek(0)
+            path = temp_path(f"{prefix}_{secrets.token_hex(8)}_{name}", size_hint=size)
+            file.save(path)
+            inputs.append((path, name, True))
+
+        if not inputs:
+            kinds = '/'.join(ext.lstrip('.').upper() for ext in extensions) + ' ' if extensions else ''
+            raise inspection.InputRejected(f"No valid {kinds}files found")
+        if check and (extensions is None or '.pdf' in extensions):
+            for path, name, _ in inputs:
+                inspection.check_input(path, name, accept_encrypted)
+    except Exception:
+        discard_inputs(inputs)
+        raise
+    return inputs
+
+def discard_inputs(inputs: list) -> None:
+    """Remove the request-owned input files returned by collect_inputs(), and their search indexes."""
+    for path, _, owned in inputs:
+        if not owned:
+            continue
+        for leftover in (path, index_path_for(path)):
+            try:
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            except Exception:
+                pass
+
+@contextmanager
+def admit(operation: str, paths: list, dpi: int = 72, pages: int = None):
+    """
+    Reserve capacity for an operation on the given input files.
+    Use as a context manager around the pdf_services call. The inputs are
+    pinned meanwhile, so storage eviction cannot remove them mid-job.
+    """
+    with storage.store.pinned(*paths):
+        if pages is None:
+            pages = sum(inspection.page_count(p) for p in paths)
+        cost, memory = admission.estimate_cost(operation, pages, dpi, input_size(paths))
+        with admission.controller.admit(session_key(), cost, memory):
+            yield
+
+def index_path_for(path: str) -> str:
+    """
+    Where the search index of an input file is kept (next to it, in temp
+    storage). The name carries the index version, so indexes kept from an
+    older format are rebuilt rather than misread.
+    """
+    return storage.store.disk_path(f"{os.path.basename(path)}.index-v{text_index.INDEX_VERSION}.json.gz")
+
+def document_index(path: str) -> text_index.TextIndex:
+    """
+    Search index of an input, built in a worker on first use. Documents from
+    /uploads keep theirs for as long as they exist, so they are indexed once
+    and then searched in milliseconds.
+    """
+    index_path = index_path_for(path)
+    if os.path.exists(index_path):
+        storage.store.touch(index_path)
+    else:
+        # Charge the index to the session; the path is the same
+        index_path = temp_path(os.path.basename(index_path))
+        with admit('index', [path]):
+            worker_pool.run('index_text', path, index_path)
+    return text_index.load_index(index_path)
+
+def phrase_search() -> bool:
+    """Whether the request asks for the query words to be consecutive ('phrase' field)."""
+    return request.form.get('phrase', '').lower() in ('1', 'true', 'yes')
+
+def search_query() -> str:
+    """The request's search words ('query' field, shared by all text search tools)."""
+    return request.form.get('query', '').strip()
+
+def matching_pages(path: str) -> list:
+    """0-indexed pages matching the request's 'query' (and 'phrase') fields."""
+    return list(document_index(path).search(search_query(), phrase=phrase_search()))
+
+@app.errorhandler(admission.AdmissionRejected)
+def overloaded_response(e):
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.errorhandler(cancellation.Cancelled)
+def cancelled_response(e, *outputs):
+    """Discard the partial outputs of cancelled work. The client has usually gone already."""
+    delivery.remove_paths(*[path for path in outputs if path])
+    logger.info(f"{request.path} cancelled: {e.reason}")
+    response = jsonify({"error": f"Cancelled: {e.reason}"})
+    response.status_code = 503
+    return response
+
+@app.errorhandler(uploads.UploadError)
+def handle_upload_error(e):
+    return jsonify({"error": str(e)}), 400
+
+@app.errorhandler(inspection.InputRejected)
+def handle_rejected_input(e):
+    return jsonify({"error": str(e), "document": e.info}), 400
+
+@app.route(assets.URL_PREFIX + '<path:filename>')
+def static_asset(filename):
+    return assets.send_asset(filename)
 
 @app.route('/')
 def root():
     return render_template('home.html')
 
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """
+    Start a chunked upload.
+    Expects JSON {"filename": ..., "size": total bytes (optional)}.
+    """
+    data = request.get_json(silent=True) or {}
+    state = uploads.create_upload(data.get('filename', ''), data.get('size'), session=session_key())
+    return jsonify(state), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Report the current offset so an interrupted upload can resume."""
+    return jsonify(uploads.get_upload_status(upload_id))
+
+@app.route('/uploads/<upload_id>', methods=['PATCH', 'PUT'])
+def upload_chunk(upload_id):
+    """
+    Append one chunk.
+    The raw request body is the chunk; 'Upload-Offset' header (or ?offset=) is its start.
+    """
+    offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Missing or invalid Upload-Offset"}), 400
+
+    try:
+        new_offset = uploads.append_chunk(upload_id, offset, request.stream)
+    except uploads.OffsetMismatchError as e:
+        return jsonify({"error": str(e), "offset": e.expected}), 409
+
+    response = jsonify({"upload_id": upload_id, "offset": new_offset})
+    response.headers['Upload-Offset'] = str(new_offset)
+    return response
+
+@app.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """
+    Complete an upload. Returns a 'doc_id' that operation routes accept
+    in place of a multipart file ('doc_id' or 'doc_ids[]' form fields).
+    """
+    data = request.get_json(silent=True) or {}
+    return jsonify(uploads.finalize_upload(upload_id, data.get('sha256')))
+
+@app.route('/inspect', methods=['POST'])
+def inspect_documents():
+    """
+    Describe PDF(s) without processing them: page count and sizes, version,
+    encryption and image/text ratio (see inspection.inspect_pdf).
+    Accepts 'files[]' / 'file' and/or 'doc_ids[]' / 'doc_id'.
+    """
+    field = 'files[]' if request.files.getlist("files[]") else 'file'
+    if not has_inputs(field):
+        return jsonify({"error": "No files uploaded"}), 400
+
+    inputs = collect_inputs(field, 'inspect_in', ('.pdf',), check=False)
+    try:
+        documents = [dict(inspection.inspect(path), name=name) for path, name, _ in inputs]
+        return jsonify({"documents": documents, "max_pages": inspection.MAX_PAGES})
+    except Exception as e:
+        logger.error(f"Inspect error: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        discard_inputs(inputs)
+
 @app.route('/merge/')
 def home():
     return render_template('index.html')
@@ -41,59 +315,42 @@ def home():
 def merge():
     """
     Handle PDF merge request.
-    Expects 'files[]' in the request.files.
+    Expects 'files[]' in the request.files and/or 'doc_ids[]' of finalized uploads.
     """
-    uploaded_files = request.files.getlist("files[]")
-
-    if not uploaded_files or uploaded_files[0].filename == '':
+    if not has_inputs('files[]'):
         return jsonify({"error": "No files selected"}), 400
 
-    saved_paths = []
+    # Create a unique session ID if not exists
+    if 'session_id' not in session:
+        session['session_id'] = secrets.token_hex(16)
+
+    inputs = collect_inputs('files[]', 'merge_in', ('.pdf',))
+    saved_paths = [path for path, _, _ in inputs]
+    output_path = None
     
     try:
-        # Create a unique session ID if not exists
-        if 'session_id' not in session:
-            session['session_id'] = secrets.token_hex(16)
-            
-        # Save uploaded files
-        for file in uploaded_files:
-            if file and file.filename.lower().endswith('.pdf'):
-                # Secure the filename but preserve extension
-                original_filename = secure_filename(file.filename)
-                # Save with a unique name to prevent collisions
-                temp_filename = f"{secrets.token_hex(8)}_{original_filename}"
-                file_path = utils.get_temp_path(temp_filename)
-                
-                file.save(file_path)
-                saved_paths.append(file_path)
-
-        if not saved_paths:
-            return jsonify({"error": "No valid PDF files found"}), 400
-
         # Output filename
         output_filename = f"merged_{secrets.token_hex(8)}.pdf"
-        output_path = utils.get_temp_path(output_filename)
+        output_path = temp_path(output_filename, size_hint=input_size(saved_paths))
 
         # Perform Merge
-        pdf_services.merge_pdfs(saved_paths, output_path)
+        with admit('merge', saved_paths):
+            worker_pool.run('merge_pdfs', saved_paths, output_path, **output_options())
 
         # Return the file
-        return send_file(output_path, as_attachment=True, download_name="merged_document.pdf")
+        return delivery.send_output(output_path, "merged_document.pdf")
 
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e, output_path)
     except Exception as e:
         logger.error(f"Merge error: {e}")
         return jsonify({"error": str(e)}), 500
         
     finally:
-        # Clean up the uploaded input files immediately? 
-        # Or let the periodic cleanup handle it?
-        # Let's clean up input files to save space immediately, keep output file for download
-        for path in saved_paths:
-            try:
-                if os.path.exists(path):
-                    os.remove(path)
-            except Exception:
-                pass
+        # Clean up the uploaded input files immediately, keep output file for download
+        discard_inputs(inputs)
 
 @app.route('/rotate')
 def rotate_page():
@@ -103,15 +360,14 @@ def rotate_page():
 def rotate():
     """
     Handle PDF rotation.
-    Expects 'file' and 'rotations' (JSON string) in request.
+    Expects 'file' (or 'doc_id') and 'rotations' (JSON string) in request.
     """
-    if 'file' not in request.files:
+    if 'file' not in request.files and not request.form.get('doc_id'):
          return jsonify({"error": "No file uploaded"}), 400
          
-    file = request.files['file']
     rotations_json = request.form.get('rotations', '{}')
     
-    if file.filename == '':
+    if not has_inputs('file'):
         return jsonify({"error": "No file selected"}), 400
         
     import json
@@ -120,29 +376,30 @@ def rotate():
     except:
         return jsonify({"error": "Invalid rotation data"}), 400
 
-    saved_path = None
+    inputs = collect_inputs('file', 'rotate_in')
+    output_path = None
     try:
-        # Save input
-        original_width = secure_filename(file.filename)
-        temp_filename = f"rotate_in_{secrets.token_hex(8)}_{original_width}"
-        saved_path = utils.get_temp_path(temp_filename)
-        file.save(saved_path)
+        saved_path = inputs[0][0]
         
         # Prepare output
         output_filename = f"rotated_{secrets.token_hex(8)}.pdf"
-        output_path = utils.get_temp_path(output_filename)
+        output_path = temp_path(output_filename, size_hint=input_size([saved_path]))
         
         # Rotate
-        pdf_services.rotate_pdf(saved_path, output_path, rotations)
+        with admit('rotate', [saved_path]):
+            worker_pool.run('rotate_pdf', saved_path, output_path, rotations, **output_options())
         
-        return send_file(output_path, as_attachment=True, download_name="rotated_document.pdf")
+        return delivery.send_output(output_path, "rotated_document.pdf")
         
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e, output_path)
     except Exception as e:
         logger.error(f"Rotation error: {e}")
         return jsonify({"error": str(e)}), 500
     finally:
-        if saved_path and os.path.exists(saved_path):
-            os.remove(saved_path)
+        discard_inputs(inputs)
 
 @app.route('/sort')
 def sort_page():
@@ -152,15 +409,16 @@ def sort_page():
 def sort_pdf():
     """
     Handle PDF page reordering.
-    Expects 'file' and 'page_order' (JSON array of page numbers) in request.
+    Expects 'file' (or 'doc_id') and 'page_order' (JSON array of page numbers) in request.
+    With 'query' (and optional 'phrase') instead of 'page_order', the pages
+    containing the query words are moved to the front, in their order.
     """
-    if 'file' not in request.files:
+    if 'file' not in request.files and not request.form.get('doc_id'):
          return jsonify({"error": "No file uploaded"}), 400
          
-    file = request.files['file']
     page_order_json = request.form.get('page_order', '[]')
     
-    if file.filename == '':
+    if not has_inputs('file'):
         return jsonify({"error": "No file selected"}), 400
         
     import json
@@ -169,29 +427,38 @@ def sort_pdf():
     except:
         return jsonify({"error": "Invalid page order data"}), 400
 
-    saved_path = None
+    inputs = collect_inputs('file', 'sort_in')
+    output_path = None
     try:
-        # Save input
-        original_name = secure_filename(file.filename)
-        temp_filename = f"sort_in_{secrets.token_hex(8)}_{original_name}"
-        saved_path = utils.get_temp_path(temp_filename)
-        file.save(saved_path)
+        saved_path = inputs[0][0]
+
+        if search_query() and not page_order:
+            matches = matching_pages(saved_path)
+            if not matches:
+                return jsonify({"error": "No pages match the query"}), 400
+            matched = set(matches)
+            others = [pno for pno in range(inspection.page_count(saved_path)) if pno not in matched]
+            page_order = [pno + 1 for pno in matches + others]
         
         # Prepare output
         output_filename = f"sorted_{secrets.token_hex(8)}.pdf"
-        output_path = utils.get_temp_path(output_filename)
+        output_path = temp_path(output_filename, size_hint=input_size([saved_path]))
         
         # Reorder pages
-        pdf_services.reorder_pdf(saved_path, output_path, page_order)
+        with admit('sort', [saved_path]):
+            worker_pool.run('reorder_pdf', saved_path, output_path, page_order, **output_options())
         
-        return send_file(output_path, as_attachment=True, download_name="sorted_document.pdf")
+        return delivery.send_output(output_path, "sorted_document.pdf")
         
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e, output_path)
     except Exception as e:
         logger.error(f"Sort error: {e}")
         return jsonify({"error": str(e)}), 500
     finally:
-        if saved_path and os.path.exists(saved_path):
-            os.remove(saved_path)
+        discard_inputs(inputs)
 
 @app.route('/split')
 def split_page():
@@ -201,15 +468,17 @@ def split_page():
 def split():
     """
     Handle PDF split.
-    Expects 'file' and 'pages' (JSON list or 'all') in request.
+    Expects 'file' (or 'doc_id') and 'pages' (JSON list or 'all') in request.
+    Optional 'max_size_mb' packs consecutive pages into parts under that size.
+    With 'query' (and optional 'phrase'), the pages containing the query
+    words are extracted instead of 'pages'.
     """
-    if 'file' not in request.files:
+    if 'file' not in request.files and not request.form.get('doc_id'):
          return jsonify({"error": "No file uploaded"}), 400
          
-    file = request.files['file']
     pages_json = request.form.get('pages', '[]')
     
-    if file.filename == '':
+    if not has_inputs('file'):
         return jsonify({"error": "No file selected"}), 400
         
     import json
@@ -218,26 +487,36 @@ def split():
     except:
         return jsonify({"error": "Invalid pages data"}), 400
 
-    saved_path = None
-    output_dir = None
+    max_bytes = None
+    if request.form.get('max_size_mb'):
+        try:
+            max_bytes = int(float(request.form['max_size_mb']) * 1024 * 1024)
+        except ValueError:
+            return jsonify({"error": "Invalid max_size_mb"}), 400
+        if max_bytes < 16 * 1024:
+            return jsonify({"error": "max_size_mb is too small"}), 400
+
+    output_dir = zip_path = None
+    inputs = collect_inputs('file', 'split_in')
     
     try:
-        # Save input
-        original_name = secure_filename(file.filename)
-        temp_filename = f"split_in_{secrets.token_hex(8)}_{original_name}"
-        saved_path = utils.get_temp_path(temp_filename)
-        file.save(saved_path)
+        saved_path, original_name, _ = inputs[0]
         
         # Prepare output directory
         session_id = secrets.token_hex(8)
-        output_dir = os.path.join(utils.TEMP_DIR, f"split_out_{session_id}")
-        os.makedirs(output_dir, exist_ok=True)
+        output_dir = temp_dir(f"split_out_{session_id}")
         
         # Perform Split
         # Helper: if pages is "all", pass None to service
         selection = None if pages == "all" else [int(p) for p in pages]
+        if search_query():
+            selection = matching_pages(saved_path)
+            if not selection:
+                return jsonify({"error": "No pages match the query"}), 400
         
-        generated_files = pdf_services.split_pdf(saved_path, output_dir, selection)
+        with admit('split', [saved_path]):
+            generated_files = worker_pool.run('split_pdf', saved_path, output_dir, selection, max_bytes=max_bytes,
+                                              **output_options())
         
         if not generated_files:
              return jsonify({"error": "No pages generated"}), 400
@@ -245,31 +524,30 @@ def split():
         # Decide return format
         if len(generated_files) == 1 and generated_files[0].endswith('.pdf'):
             # Return single PDF
-            return send_file(generated_files[0], as_attachment=True, download_name=f"extracted_{original_name}")
+            return delivery.send_output(generated_files[0], f"extracted_{original_name}")
         else:
             # Zip multiple files
             zip_filename = f"split_files_{session_id}.zip"
-            zip_path = utils.get_temp_path(zip_filename)
+            zip_path = temp_path(zip_filename, size_hint=input_size(generated_files))
             
             with zipfile.ZipFile(zip_path, 'w') as zipf:
                  for file_path in generated_files:
+                     cancellation.check()
                      zipf.write(file_path, os.path.basename(file_path))
+            delivery.remove_paths(output_dir)
             
-            return send_file(zip_path, as_attachment=True, download_name="split_pages.zip")
+            return delivery.send_output(zip_path, "split_pages.zip")
 
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e, output_dir, zip_path)
     except Exception as e:
         logger.error(f"Split error: {e}")
         return jsonify({"error": str(e)}), 500
     finally:
-        # Cleanup input
-        if saved_path and os.path.exists(saved_path):
-            os.remove(saved_path)
-            
-        # Cleanup output dir (files are zipped or sent)
-        # Note: If we use send_file, we can't delete immediately unless we use a background task or stream.
-        # But for now, we leave them for periodic cleanup or implement a smarter cleanup.
-        # For this MVP, we'll rely on periodic cleanup for the output files/zip.
-        pass
+        # Cleanup input; outputs are deleted once downloaded (see delivery.send_output)
+        discard_inputs(inputs)
 
 @app.route('/pdf-to-jpg')
 def pdf_to_jpg_page():
@@ -277,51 +555,88 @@ def pdf_to_jpg_page():
 
 @app.route('/pdf-to-jpg', methods=['POST'])
 def pdf_to_jpg():
-    """Convert PDF to JPGs (Zip download)."""
-    if 'file' not in request.files:
+    """
+    Convert PDF pages to images (Zip download).
+    Optional form fields: 'pages' ("1-3,5"), 'dpi', 'max_size' (longest side in px),
+    'format' (jpeg/png/webp), 'quality', 'grayscale' ('true'), 'clip' (JSON [x0, y0, x1, y1] page fractions).
+    A 'pages' selection that yields a single page returns the image itself.
+    """
+    if 'file' not in request.files and not request.form.get('doc_id'):
         return jsonify({"error": "No file uploaded"}), 400
         
-    file = request.files['file']
-    if file.filename == '':
+    if not has_inputs('file'):
         return jsonify({"error": "No file selected"}), 400
 
-    saved_path = None
-    output_dir = None
+    import json
+    try:
+        page_spec = request.form.get('pages', '').strip()
+        utils.parse_page_spec(page_spec)
+        dpi = min(max(int(request.form.get('dpi', 144)), 10), 600)
+        max_size = request.form.get('max_size')
+        max_size = max(int(max_size), 16) if max_size else None
+        fmt = request.form.get('format', 'jpeg').lower().replace('jpg', 'jpeg')
+        quality = min(max(int(request.form.get('quality', 85)), 1), 100)
+        grayscale = request.form.get('grayscale') == 'true'
+        clip = request.form.get('clip')
+        clip = [min(max(float(v), 0.0), 1.0) for v in json.loads(clip)] if clip else None
+        if clip is not None and (len(clip) != 4 or clip[0] >= clip[2] or clip[1] >= clip[3]):
+            raise ValueError("clip must be [x0, y0, x1, y1]")
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid options: {e}"}), 400
+    if fmt not in ('jpeg', 'png', 'webp'):
+        return jsonify({"error": "Unsupported format"}), 400
+
+    output_dir = zip_path = None
+    inputs = collect_inputs('file', 'conv_in')
     
     try:
-        # Save input
-        original_name = secure_filename(file.filename)
-        temp_filename = f"conv_in_{secrets.token_hex(8)}_{original_name}"
-        saved_path = utils.get_temp_path(temp_filename)
-        file.save(saved_path)
+        saved_path, original_name, _ = inputs[0]
         
         # Prepare output dir
         session_id = secrets.token_hex(8)
-        output_dir = os.path.join(utils.TEMP_DIR, f"conv_out_{session_id}")
-        os.makedirs(output_dir, exist_ok=True)
+        output_dir = temp_dir(f"conv_out_{session_id}")
         
-        # Convert
-        generated_files = pdf_services.pdf_to_images(saved_path, output_dir)
+        selection = None
+        if page_spec:
+            selection = utils.parse_page_ranges(page_spec, inspection.page_count(saved_path))
+            if not selection:
+                return jsonify({"error": "No pages selected"}), 400
+        
+        # Convert (only the selected pages are rendered)
+        pages = len(selection) if selection is not None else None
+        with admit('pdf_to_jpg', [saved_path], dpi=dpi, pages=pages):
+            generated_files = worker_pool.run('pdf_to_images', saved_path, output_dir, pages=selection,
+                                              dpi=dpi, max_size=max_size, fmt=fmt, quality=quality,
+                                              grayscale=grayscale, clip=clip)
         
         if not generated_files:
             return jsonify({"error": "No images generated"}), 400
             
+        if selection is not None and len(generated_files) == 1:
+            image_name = f"{os.path.splitext(original_name)[0]}_{os.path.basename(generated_files[0])}"
+            return delivery.send_output(generated_files[0], image_name)
+            
         # Zip images
         zip_filename = f"images_{original_name}.zip"
-        zip_path = utils.get_temp_path(zip_filename)
+        zip_path = temp_path(zip_filename, size_hint=input_size(generated_files))
         
         with zipfile.ZipFile(zip_path, 'w') as zipf:
             for file_path in generated_files:
+                cancellation.check()
                 zipf.write(file_path, os.path.basename(file_path))
+        delivery.remove_paths(output_dir)
                 
-        return send_file(zip_path, as_attachment=True, download_name=zip_filename)
+        return delivery.send_output(zip_path, zip_filename)
         
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e, output_dir, zip_path)
     except Exception as e:
         logger.error(f"Convert error: {e}")
         return jsonify({"error": str(e)}), 500
     finally:
-         if saved_path and os.path.exists(saved_path):
-            os.remove(saved_path)
+        discard_inputs(inputs)
 
 @app.route('/jpg-to-pdf')
 def jpg_to_pdf_page():
@@ -329,43 +644,50 @@ def jpg_to_pdf_page():
 
 @app.route('/jpg-to-pdf', methods=['POST'])
 def jpg_to_pdf():
-    """Convert multiple Images to PDF."""
-    uploaded_files = request.files.getlist("files[]")
-    
-    if not uploaded_files or uploaded_files[0].filename == '':
+    """
+    Convert multiple Images to PDF.
+    Optional form fields: 'page_size' ('a4'/'letter' to fit and downscale photos),
+    'dpi' (default 150) and 'quality' (default 85) for that mode.
+    """
+    if not has_inputs('files[]'):
         return jsonify({"error": "No files selected"}), 400
 
-    saved_paths = []
-    
+    page_size = request.form.get('page_size', '').lower() or None
+    if page_size == 'original':
+        page_size = None
     try:
-        # Save uploaded images
-        for file in uploaded_files:
-            if file and file.filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                filename = secure_filename(file.filename)
-                temp_filename = f"img_{secrets.token_hex(8)}_{filename}"
-                file_path = utils.get_temp_path(temp_filename)
-                file.save(file_path)
-                saved_paths.append(file_path)
-                
-        if not saved_paths:
-            return jsonify({"error": "No valid image files found"}), 400
+        dpi = min(max(int(request.form.get('dpi', 150)), 36), 600)
+        quality = min(max(int(request.form.get('quality', 85)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "Invalid options"}), 400
+    if page_size not in (None, 'a4', 'letter'):
+        return jsonify({"error": "Unsupported page size"}), 400
 
+    inputs = collect_inputs('files[]', 'img', ('.jpg', '.jpeg', '.png'))
+    saved_paths = [path for path, _, _ in inputs]
+    output_path = None
+    
+    try:
         # Output filename
         output_filename = f"converted_images_{secrets.token_hex(8)}.pdf"
-        output_path = utils.get_temp_path(output_filename)
+        output_path = temp_path(output_filename, size_hint=input_size(saved_paths))
 
         # Convert
-        pdf_services.images_to_pdf(saved_paths, output_path)
+        with admit('jpg_to_pdf', saved_paths, pages=len(saved_paths)):
+            worker_pool.run('images_to_pdf', saved_paths, output_path, page_size=page_size, dpi=dpi, quality=quality,
+                            **output_options())
 
-        return send_file(output_path, as_attachment=True, download_name="converted_images.pdf")
+        return delivery.send_output(output_path, "converted_images.pdf")
 
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e, output_path)
     except Exception as e:
         logger.error(f"Convert error: {e}")
         return jsonify({"error": str(e)}), 500
     finally:
-        for path in saved_paths:
-             if os.path.exists(path):
-                os.remove(path)
+        discard_inputs(inputs)
 
 @app.route('/watermark')
 def watermark_page():
@@ -374,10 +696,9 @@ def watermark_page():
 @app.route('/watermark', methods=['POST'])
 def watermark():
     """Apply watermark to PDF."""
-    if 'file' not in request.files:
+    if not has_inputs('file'):
         return jsonify({"error": "No file uploaded"}), 400
     
-    file = request.files['file']
     config_json = request.form.get('config', '{}')
     
     import json
@@ -386,18 +707,12 @@ def watermark():
     except:
         return jsonify({"error": "Invalid config"}), 400
         
-    saved_path = None
-    output_path = None
-    
-    saved_path = None
     output_path = None
     image_path = None # Initialize image_path here
+    inputs = collect_inputs('file', 'wm_in')
     
     try:
-        original_name = secure_filename(file.filename)
-        temp_filename = f"wm_in_{secrets.token_hex(8)}_{original_name}"
-        saved_path = utils.get_temp_path(temp_filename)
-        file.save(saved_path) # Save the main PDF file
+        saved_path, original_name, _ = inputs[0]
         
         config = json.loads(request.form.get('config', '{}'))
         
@@ -406,22 +721,26 @@ def watermark():
             img_file = request.files['image_file']
             if img_file.filename != '':
                 img_name = secure_filename(img_file.filename)
-                image_path = utils.get_temp_path(f"wm_img_{secrets.token_hex(4)}_{img_name}")
+                image_path = temp_path(f"wm_img_{secrets.token_hex(4)}_{img_name}")
                 img_file.save(image_path)
         
         output_filename = f"watermarked_{secrets.token_hex(4)}_{original_name}"
-        output_path = utils.get_temp_path(output_filename)
+        output_path = temp_path(output_filename, size_hint=input_size([saved_path]))
         
-        pdf_services.add_watermark(saved_path, output_path, config, image_path)
+        with admit('watermark', [saved_path]):
+            worker_pool.run('add_watermark', saved_path, output_path, config, image_path, **output_options())
         
-        return send_file(output_path, as_attachment=True, download_name=output_filename)
+        return delivery.send_output(output_path, output_filename)
         
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e, output_path)
     except Exception as e:
         logger.error(f"Watermark error: {e}")
         return jsonify({"error": str(e)}), 500
     finally:
-        if saved_path and os.path.exists(saved_path):
-            os.remove(saved_path)
+        discard_inputs(inputs)
         if image_path and os.path.exists(image_path):
             os.remove(image_path)
 
@@ -432,62 +751,56 @@ def protect_page():
 @app.route('/protect', methods=['POST'])
 def protect():
     """Protect PDF(s)."""
-    uploaded_files = request.files.getlist("files[]")
-    if not uploaded_files:
-        if 'file' in request.files:
-            uploaded_files = [request.files['file']]
-        else:
-             return jsonify({"error": "No files uploaded"}), 400
+    field = 'files[]' if request.files.getlist("files[]") else 'file'
+    if field not in request.files and not has_inputs(field):
+         return jsonify({"error": "No files uploaded"}), 400
              
-    if not uploaded_files or uploaded_files[0].filename == '':
+    if not has_inputs(field):
         return jsonify({"error": "No files selected"}), 400
 
-    saved_paths = []
+    inputs = collect_inputs(field, 'prot_in', ('.pdf',))
+    saved_paths = [(path, name) for path, name, _ in inputs]
+    protected_paths = []
+    output_path = zip_path = None
     
     try:
         user_pwd = request.form.get('user_password', '')
         owner_pwd = request.form.get('owner_password', '')
+        algorithm = request.form.get('algorithm', 'AES-256')
         permissions = {
             'print': request.form.get('allow_print') == 'true',
             'copy': request.form.get('allow_copy') == 'true',
             'modify': request.form.get('allow_modify') == 'true'
         }
-        
-        for file in uploaded_files:
-            if file and file.filename.lower().endswith('.pdf'):
-                filename = secure_filename(file.filename)
-                temp_filename = f"prot_in_{secrets.token_hex(4)}_{filename}"
-                saved_path = utils.get_temp_path(temp_filename)
-                file.save(saved_path)
-                saved_paths.append((saved_path, filename))
                 
-        if not saved_paths:
-            return jsonify({"error": "No valid PDF files"}), 400
-            
-        protected_paths = []
-        for input_path, original_name in saved_paths:
-            output_filename = f"protected_{original_name}"
-            output_path = utils.get_temp_path(f"prot_out_{secrets.token_hex(4)}_{original_name}")
-            pdf_services.protect_pdf(input_path, output_path, user_pwd, owner_pwd, permissions)
-            protected_paths.append((output_path, output_filename))
+        with admit('protect', [path for path, _ in saved_paths]):
+            for input_path, original_name in saved_paths:
+                output_filename = f"protected_{original_name}"
+                output_path = temp_path(f"prot_out_{secrets.token_hex(4)}_{original_name}", size_hint=input_size([input_path]))
+                worker_pool.run('protect_pdf', input_path, output_path, user_pwd, owner_pwd, permissions, algorithm=algorithm,
+                                **output_options())
+                protected_paths.append((output_path, output_filename))
             
         if len(protected_paths) == 1:
-            return send_file(protected_paths[0][0], as_attachment=True, download_name=protected_paths[0][1])
+            return delivery.send_output(protected_paths[0][0], protected_paths[0][1])
         else:
             zip_filename = f"protected_files_{secrets.token_hex(4)}.zip"
-            zip_path = utils.get_temp_path(zip_filename)
+            zip_path = temp_path(zip_filename, size_hint=input_size([path for path, _ in protected_paths]))
             with zipfile.ZipFile(zip_path, 'w') as zipf:
                 for path, name in protected_paths:
                     zipf.write(path, name)
-            return send_file(zip_path, as_attachment=True, download_name=zip_filename)
+            delivery.remove_paths(*[path for path, _ in protected_paths])
+            return delivery.send_output(zip_path, zip_filename)
 
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e, output_path, zip_path, *[path for path, _ in protected_paths])
     except Exception as e:
         logger.error(f"Protect error: {e}")
         return jsonify({"error": str(e)}), 500
     finally:
-        for path, _ in saved_paths:
-            if os.path.exists(path): os.remove(path)
-        # Periodic cleanup handles outputs
+        discard_inputs(inputs)
 
 @app.route('/unlock')
 def unlock_page():
@@ -496,48 +809,43 @@ def unlock_page():
 @app.route('/unlock', methods=['POST'])
 def unlock():
     """Unlock PDF(s)."""
-    uploaded_files = request.files.getlist("files[]")
-    if not uploaded_files:
+    if not has_inputs('files[]'):
          return jsonify({"error": "No files uploaded"}), 400
          
-    saved_paths = []
+    inputs = collect_inputs('files[]', 'unlock_in', ('.pdf',), accept_encrypted=True)
+    saved_paths = [(path, name) for path, name, _ in inputs]
+    unlocked_paths = []
+    output_path = zip_path = None
     try:
         password = request.form.get('password', '')
-        
-        for file in uploaded_files:
-            if file and file.filename.lower().endswith('.pdf'):
-                filename = secure_filename(file.filename)
-                temp_filename = f"unlock_in_{secrets.token_hex(4)}_{filename}"
-                saved_path = utils.get_temp_path(temp_filename)
-                file.save(saved_path)
-                saved_paths.append((saved_path, filename))
                 
-        if not saved_paths:
-             return jsonify({"error": "No valid PDF files"}), 400
-             
-        unlocked_paths = []
-        for input_path, original_name in saved_paths:
-            output_filename = f"unlocked_{original_name}"
-            output_path = utils.get_temp_path(f"unlock_out_{secrets.token_hex(4)}_{original_name}")
-            pdf_services.unlock_pdf(input_path, output_path, password)
-            unlocked_paths.append((output_path, output_filename))
+        with admit('unlock', [path for path, _ in saved_paths]):
+            for input_path, original_name in saved_paths:
+                output_filename = f"unlocked_{original_name}"
+                output_path = temp_path(f"unlock_out_{secrets.token_hex(4)}_{original_name}", size_hint=input_size([input_path]))
+                worker_pool.run('unlock_pdf', input_path, output_path, password, **output_options())
+                unlocked_paths.append((output_path, output_filename))
             
         if len(unlocked_paths) == 1:
-            return send_file(unlocked_paths[0][0], as_attachment=True, download_name=unlocked_paths[0][1])
+            return delivery.send_output(unlocked_paths[0][0], unlocked_paths[0][1])
         else:
             zip_filename = f"unlocked_files_{secrets.token_hex(4)}.zip"
-            zip_path = utils.get_temp_path(zip_filename)
+            zip_path = temp_path(zip_filename, size_hint=input_size([path for path, _ in unlocked_paths]))
             with zipfile.ZipFile(zip_path, 'w') as zipf:
                 for path, name in unlocked_paths:
                     zipf.write(path, name)
-            return send_file(zip_path, as_attachment=True, download_name=zip_filename)
+            delivery.remove_paths(*[path for path, _ in unlocked_paths])
+            return delivery.send_output(zip_path, zip_filename)
 
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e, output_path, zip_path, *[path for path, _ in unlocked_paths])
     except Exception as e:
         logger.error(f"Unlock error: {e}")
         return jsonify({"error": str(e)}), 500
     finally:
-        for path, _ in saved_paths:
-            if os.path.exists(path): os.remove(path)
+        discard_inputs(inputs)
 
 @app.route('/compress')
 def compress_page():
@@ -546,52 +854,36 @@ def compress_page():
 @app.route('/compress', methods=['POST'])
 def compress():
     """Compress PDF(s)."""
-    uploaded_files = request.files.getlist("files[]")
-    if not uploaded_files:
-        if 'file' in request.files:
-            uploaded_files = [request.files['file']]
-        else:
-             return jsonify({"error": "No files uploaded"}), 400
+    field = 'files[]' if request.files.getlist("files[]") else 'file'
+    if field not in request.files and not has_inputs(field):
+         return jsonify({"error": "No files uploaded"}), 400
     
-    if not uploaded_files or uploaded_files[0].filename == '':
+    if not has_inputs(field):
         return jsonify({"error": "No files selected"}), 400
         
-    saved_paths = []
+    inputs = collect_inputs(field, 'comp_in', ('.pdf',))
+    saved_paths = [(path, name) for path, name, _ in inputs]
     compressed_paths = []
+    output_path = zip_path = None
     
     try:
         level = request.form.get('level', 'recommended')
-        level_settings = {
-            'extreme': (50, 20),
-            'recommended': (72, 40),
-            'less': (100, 60)
-        }
-        dpi, quality = level_settings.get(level, (72, 40))
+        dpi, quality = config.COMPRESSION_LEVELS.get(level, config.COMPRESSION_LEVELS['recommended'])
         logger.info(f"Compression level: {level} (DPI={dpi}, Quality={quality})")
-        
-        for file in uploaded_files:
-            if file and file.filename.lower().endswith('.pdf'):
-                original_name = secure_filename(file.filename)
-                temp_filename = f"comp_in_{secrets.token_hex(4)}_{original_name}"
-                saved_path = utils.get_temp_path(temp_filename)
-                file.save(saved_path)
-                saved_paths.append((saved_path, original_name))
-
-        if not saved_paths:
-             return jsonify({"error": "No valid PDF files found"}), 400
 
         total_original_size = 0
         total_new_size = 0
         
-        for input_path, original_name in saved_paths:
-            output_filename = f"compressed_{original_name}"
-            output_path = utils.get_temp_path(f"comp_out_{secrets.token_hex(4)}_{original_name}")
-            
-            pdf_services.compress_pdf(input_path, output_path, dpi=dpi, quality=quality)
-            compressed_paths.append((output_path, output_filename))
-            
-            total_original_size += os.path.getsize(input_path)
-            total_new_size += os.path.getsize(output_path)
+        with admit('compress', [path for path, _ in saved_paths], dpi=dpi):
+            for input_path, original_name in saved_paths:
+                output_filename = f"compressed_{original_name}"
+                output_path = temp_path(f"comp_out_{secrets.token_hex(4)}_{original_name}", size_hint=input_size([input_path]))
+                
+                worker_pool.run('compress_pdf', input_path, output_path, dpi=dpi, quality=quality, **output_options())
+                compressed_paths.append((output_path, output_filename))
+                
+                total_original_size += os.path.getsize(input_path)
+                total_new_size += os.path.getsize(output_path)
 
         saving_pct = 0
         if total_original_size > 0:
@@ -600,55 +892,206 @@ def compress():
 
         if len(compressed_paths) == 1:
             out_path, out_name = compressed_paths[0]
-            response = send_file(out_path, as_attachment=True, download_name=out_name)
+            response = delivery.send_output(out_path, out_name)
             response.headers["X-Compression-Ratio"] = str(saving_pct)
             return response
         else:
             zip_filename = f"compressed_files_{secrets.token_hex(4)}.zip"
-            zip_path = utils.get_temp_path(zip_filename)
+            zip_path = temp_path(zip_filename, size_hint=input_size([path for path, _ in compressed_paths]))
             
             with zipfile.ZipFile(zip_path, 'w') as zipf:
                 for path, name in compressed_paths:
+                    cancellation.check()
                     zipf.write(path, name)
             
-            response = send_file(zip_path, as_attachment=True, download_name=zip_filename)
+            response = delivery.send_output(zip_path, zip_filename)
             response.headers["X-Compression-Ratio"] = str(saving_pct)
             return response
         
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e, output_path, zip_path, *[path for path, _ in compressed_paths])
     except Exception as e:
         logger.error(f"Compress error: {e}")
         return jsonify({"error": str(e)}), 500
     finally:
-        for path, _ in saved_paths:
-            if os.path.exists(path):
-                os.remove(path)
+        discard_inputs(inputs)
         if len(compressed_paths) > 1:
             for path, _ in compressed_paths:
                 if os.path.exists(path):
                     os.remove(path)
 
 
+@app.route('/analyze', methods=['POST'])
+def analyze():
+    """
+    Size breakdown of a PDF: bytes by images, fonts, content streams and
+    duplicates, overall and per page, with ranked compression suggestions.
+    Expects 'file' or 'doc_id'.
+    """
+    if not has_inputs('file'):
+        return jsonify({"error": "No file uploaded"}), 400
+
+    inputs = collect_inputs('file', 'analyze_in', ('.pdf',))
+    try:
+        input_path, original_name, _ = inputs[0]
+        with admit('analyze', [input_path]):
+            report = worker_pool.run('analyze_pdf', input_path)
+        report['name'] = original_name
+        return jsonify(report)
+
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e)
+    except Exception as e:
+        logger.error(f"Analyze error: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        discard_inputs(inputs)
+
+
+@app.route('/search', methods=['POST'])
+def search():
+    """
+    Find the pages of a PDF that contain all the query words.
+    Expects 'file' or 'doc_id' and 'query'. Optional 'phrase' ("true") requires
+    the words to be consecutive; 'word*' matches words by prefix. The text
+    is indexed on first use, so repeated searches of an uploaded document
+    take milliseconds.
+    """
+    query = search_query()
+    if not has_inputs('file'):
+        return jsonify({"error": "No file uploaded"}), 400
+    if not query:
+        return jsonify({"error": "No search query"}), 400
+
+    inputs = collect_inputs('file', 'search_in', ('.pdf',))
+    try:
+        input_path, original_name, _ = inputs[0]
+        index = document_index(input_path)
+        matches = index.search(query, phrase=phrase_search())
+        return jsonify({
+            "name": original_name,
+            "query": query,
+            "page_count": index.page_count,
+            "pages": [{"page": pno + 1, "hits": len(hits)} for pno, hits in matches.items()],
+            "total_hits": sum(len(hits) for hits in matches.values()),
+        })
+
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e)
+    except Exception as e:
+        logger.error(f"Search error: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        discard_inputs(inputs)
+
+
+# Pages answered by one /highlight request
+MAX_HIGHLIGHT_PAGES = 50
+
+@app.route('/highlight', methods=['POST'])
+def highlight():
+    """
+    Rectangles of the query hits, for drawing over page previews.
+    Expects 'file' or 'doc_id' and 'query' (optional 'phrase', as for /search).
+    Optional 'pages' (JSON list of page numbers) limits the answer to those
+    pages; by default the first MAX_HIGHLIGHT_PAGES matching pages.
+    """
+    import json
+
+    query = search_query()
+    if not has_inputs('file'):
+        return jsonify({"error": "No file uploaded"}), 400
+    if not query:
+        return jsonify({"error": "No search query"}), 400
+    try:
+        wanted = {int(p) - 1 for p in json.loads(request.form['pages'])} if request.form.get('pages') else None
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid pages data"}), 400
+
+    inputs = collect_inputs('file', 'highlight_in', ('.pdf',))
+    try:
+        input_path, _, _ = inputs[0]
+        matches = document_index(input_path).search(query, phrase=phrase_search())
+        selected = [pno for pno in matches if wanted is None or pno in wanted][:MAX_HIGHLIGHT_PAGES]
+        with admit('index', [input_path], pages=len(selected)):
+            pages = worker_pool.run('find_word_rects', input_path, {pno: matches[pno] for pno in selected})
+        return jsonify({"query": query, "pages": pages})
+
+    except admission.AdmissionRejected as e:
+        return overloaded_response(e)
+    except cancellation.Cancelled as e:
+        return cancelled_response(e)
+    except Exception as e:
+        logger.error(f"Highlight error: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        discard_inputs(inputs)
+
+
+@app.route('/outputs/<output_id>')
+def download_output(output_id):
+    """Download a result by the id in its Content-Location, from any node."""
+    return delivery.send_registered(output_id)
+
+@app.route('/health')
+def health():
+    """Report readiness, current load and capacity (for load balancers and autoscaling)."""
+    startup = warmup.status()
+    load = admission.controller.snapshot()
+    if not startup['ready']:
+        return jsonify({"status": "starting", "startup": startup, "admission": load}), 503
+    status = 'busy' if load['queued'] else 'ok'
+    return jsonify({"status": status, "node": state.NODE_ID, "startup": startup, "admission": load,
+                    "storage": storage.store.snapshot()})
+
 def start_server():
     """Start the Waitress server."""
-    host = socket.gethostbyname(socket.gethostname())
+    host = os.environ.get('HOST') or socket.gethostbyname(socket.gethostname())
     port = int(os.environ.get('PORT', 80))
+    # Queued requests wait inside a thread, so allow more threads than cores
+    threads = int(os.environ.get('THREADS', 8))
+
+    # Pages load pdf.js and fonts from this server once they are vendored
+    missing = assets.missing_vendored()
+    if missing:
+        logger.warning(f"Vendored assets are missing, pages load them from CDNs: {', '.join(missing)}. "
+                       f"Run `python -m assets fetch-pdfjs` and `python -m assets fetch-fonts` and commit static/vendor.")
+
+    # Fingerprint any changed static files; unchanged ones are only hashed
+    try:
+        assets.build()
+    except OSError as e:
+        logger.warning(f"Could not build static assets, serving them unversioned: {e}")
+    
+    # Start the worker processes in the background, which load the PDF
+    # libraries (this process never does); /health reports "starting" until
+    # they are warm
+    warmup.start_background(worker_pool.warm_workers)
     
-    logger.info(f"Starting server on http://{host}:{port}")
-    serve(app, host=host, port=port)
+    logger.info(f"Starting server on http://{host}:{port} ({threads} threads)")
+    # With request lookahead waitress keeps reading the socket while a request
+    # runs, so it notices a client that hangs up (waitress.client_disconnected)
+    serve(app, host=host, port=port, threads=threads, channel_request_lookahead=5)
 
 @app.route('/edit-pdf', methods=['GET', 'POST'])
 def edit_pdf_page():
     if request.method == 'POST':
-        if 'file' not in request.files:
+        if 'file' not in request.files and not request.form.get('doc_id'):
             return jsonify({'error': 'No file part'}), 400
-        file = request.files['file']
-        if file.filename == '':
+        if not has_inputs('file'):
             return jsonify({'error': 'No selected file'}), 400
             
-        if file:
-            filename = secure_filename(file.filename)
-            input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(input_path)
+        inputs = collect_inputs('file', 'edit_in')
+        image_paths = {}
+        output_path = None
+        try:
+            input_path, filename, _ = inputs[0]
             
             # Edits Config (JSON string)
             edits_json = request.form.get('edits', '{}')
@@ -662,38 +1105,39 @@ def edit_pdf_page():
 
             # Handle Uploaded Images for editing
             # Expecting keys like "image_0", "image_1" corresponding to imageIds in config
-            image_paths = {}
             for key in request.files:
                 if key.startswith('image_assets_'):
                     img_file = request.files[key]
                     if img_file.filename:
                         img_name = secure_filename(img_file.filename)
-                        img_path = os.path.join(app.config['UPLOAD_FOLDER'], f"asset_{img_name}")
+                        img_path = temp_path(f"asset_{secrets.token_hex(4)}_{img_name}")
                         img_file.save(img_path)
                         # Key format: image_assets_{id}
                         asset_id = key.replace('image_assets_', '')
                         image_paths[asset_id] = img_path
             
             output_filename = f"edited_{filename}"
-            output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
+            output_path = temp_path(f"edit_out_{secrets.token_hex(4)}_{filename}", size_hint=input_size([input_path]))
             
-            try:
-                pdf_services.apply_edits(input_path, output_path, edits_config, image_paths)
+            with admit('edit', [input_path]):
+                worker_pool.run('apply_edits', input_path, output_path, edits_config, image_paths,
+                                **output_options())
                 
-                # Clean up input
-                try:
-                    os.remove(input_path)
-                    for p in image_paths.values():
-                        if os.path.exists(p): os.remove(p)
-                except:
-                    pass
-                    
-                return send_file(output_path, as_attachment=True)
-            except Exception as e:
-                logger.error(f"Error applying edits: {e}", exc_info=True)
-                return jsonify({'error': str(e)}), 500
-            except Exception as e:
-                return jsonify({'error': str(e)}), 500
+            return delivery.send_output(output_path, output_filename)
+        except admission.AdmissionRejected as e:
+            delivery.remove_paths(output_path)
+            return overloaded_response(e)
+        except cancellation.Cancelled as e:
+            return cancelled_response(e, output_path)
+        except Exception as e:
+            logger.error(f"Error applying edits: {e}", exc_info=True)
+            if output_path:
+                delivery.remove_paths(output_path)  # partial output
+            return jsonify({'error': str(e)}), 500
+        finally:
+            # Inputs and image assets are only needed while the edit runs
+            discard_inputs(inputs)
+            delivery.remove_paths(*image_paths.values())
 
     return render_template('edit_pdf.html')
 
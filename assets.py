@@ -0,0 +1,332 @@
+"""
+Static assets: vendored pdf.js and fonts, fingerprinted and precompressed copies.
+
+    python -m assets fetch-pdfjs   # vendor pdf.js into static/vendor/pdfjs (once, then commit it)
+    python -m assets fetch-fonts   # vendor the Outfit font into static/vendor/fonts (likewise)
+    python -m assets build         # fingerprint and compress static/ into static/dist
+
+The build copies every file under static/ to static/dist with a content
+hash in its name (css/styles.3f9a0c1d2e.css), writes .gz and .br variants
+of text assets, and records the mapping in static/dist/manifest.json.
+Templates link through asset_url(), so each deploy references new names
+and the files can be cached forever (Cache-Control: immutable). Outputs
+are content-addressed and never overwritten, so pages rendered before a
+deploy keep loading their old assets.
+
+Without a manifest (a fresh checkout), asset_url() falls back to the plain
+/static URLs. Until pdf.js and the fonts are vendored, pdfjs_url() and
+fonts_url() fall back to their CDNs and the server warns on start
+(missing_vendored()).
+"""
+import os
+import sys
+import gzip
+import json
+import hashlib
+import logging
+import argparse
+import mimetypes
+import posixpath
+import re
+import urllib.parse
+import urllib.request
+from functools import lru_cache
+from typing import Dict, List
+
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: gzip variants only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.environ.get('ASSETS_DIR') or os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+URL_PREFIX = '/assets/'
+MAX_AGE = 365 * 24 * 3600
+
+PDFJS_VERSION = '4.0.379'
+PDFJS_FILES = ('pdf.min.mjs', 'pdf.worker.min.mjs')
+PDFJS_DIR = 'vendor/pdfjs'
+PDFJS_CDN = f"https://cdnjs.cloudflare.com/ajax/libs/pdf.js/{PDFJS_VERSION}/"
+
+FONTS_DIR = 'vendor/fonts'
+FONTS_CSS = f"{FONTS_DIR}/outfit.css"
+FONTS_SOURCE = "https://fonts.googleapis.com/css2?family=Outfit:wght@300;400;500;600;700&display=swap"
+# Google Fonts picks the font format by user agent; this one gets woff2
+FONTS_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+# Worth precompressing; images and fonts are compressed already
+COMPRESSIBLE = ('.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.html')
+
+# Browsers refuse module scripts without a JavaScript type, and on Windows
+# the registry can map .js to text/plain
+mimetypes.add_type('text/javascript', '.js')
+mimetypes.add_type('text/javascript', '.mjs')
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def fingerprinted_name(path: str, data: bytes) -> str:
+    """'css/styles.css' -> 'css/styles.<hash>.css'."""
+    stem, ext = posixpath.splitext(path)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _rewrite_css_urls(path: str, data: bytes, manifest: Dict[str, str]) -> bytes:
+    """Point relative url(...) references at the fingerprinted files."""
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        target = match.group(2)
+        if re.match(r'^([a-z]+:|/|#)', target, re.I):
+            return match.group(0)
+        clean = target.split('?')[0].split('#')[0]
+        logical = posixpath.normpath(posixpath.join(base, clean))
+        if logical not in manifest:
+            return match.group(0)
+        return f"url({match.group(1)}{posixpath.relpath(manifest[logical], base)}{match.group(1)})"
+
+    return _CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.partial"
+    with open(partial, 'wb') as f:
+        f.write(data)
+    os.replace(partial, path)
+
+
+def _write_variants(path: str, data: bytes) -> None:
+    """Write .gz and .br next to an asset, where they are smaller."""
+    if os.path.splitext(path)[1] not in COMPRESSIBLE:
+        return
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(data) and not os.path.exists(path + suffix):
+            _write_atomic(path + suffix, compressed)
+
+
+def _source_files(static_dir: str, dist_dir: str) -> List[str]:
+    """Logical (posix, static-relative) paths of the source assets; stylesheets last."""
+    paths = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist_dir]
+        for name in files:
+            paths.append(os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, '/'))
+    # Stylesheets reference the other assets, so their names must be known first
+    return sorted(paths, key=lambda p: (p.endswith('.css'), p))
+
+
+def build(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR) -> Dict[str, str]:
+    """
+    Fingerprint and precompress every static asset, then write the manifest.
+
+    Assets already built are skipped, so rebuilding an unchanged tree only
+    hashes the sources.
+
+    Returns:
+        The manifest: {logical path: fingerprinted path}.
+    """
+    dist_dir = os.path.abspath(dist_dir)
+    entries = {}
+    written = 0
+    for path in _source_files(os.path.abspath(static_dir), dist_dir):
+        with open(os.path.join(static_dir, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = _rewrite_css_urls(path, data, entries)
+        name = fingerprinted_name(path, data)
+        output = os.path.join(dist_dir, name)
+        if not os.path.exists(output):
+            _write_atomic(output, data)
+            written += 1
+        _write_variants(output, data)
+        entries[path] = name
+
+    _write_atomic(os.path.join(dist_dir, MANIFEST_NAME),
+                  json.dumps(entries, indent=2, sort_keys=True).encode('utf-8'))
+    logger.info(f"Built {len(entries)} assets ({written} new) in {dist_dir}")
+    return entries
+
+
+def fetch_pdfjs(source: str = PDFJS_CDN, static_dir: str = STATIC_DIR) -> List[str]:
+    """
+    Copy pdf.js into static/vendor/pdfjs.
+
+    Args:
+        source: Base URL, or a local directory such as
+            node_modules/pdfjs-dist/build (for machines without internet).
+
+    Returns:
+        Paths of the files written.
+    """
+    written = []
+    for name in PDFJS_FILES:
+        if os.path.isdir(source):
+            with open(os.path.join(source, name), 'rb') as f:
+                data = f.read()
+        else:
+            with urllib.request.urlopen(source.rstrip('/') + '/' + name, timeout=60) as response:
+                data = response.read()
+        path = os.path.join(static_dir, *PDFJS_DIR.split('/'), name)
+        _write_atomic(path, data)
+        written.append(path)
+        logger.info(f"Vendored {name} ({len(data)} bytes)")
+    return written
+
+
+def fetch_fonts(source: str = FONTS_SOURCE, static_dir: str = STATIC_DIR) -> List[str]:
+    """
+    Copy the Outfit stylesheet and the font files it references into
+    static/vendor/fonts, pointing its url(...)s at the local copies.
+
+    Args:
+        source: Google Fonts stylesheet URL, or a local directory holding
+            an outfit.css and its font files (e.g. another checkout's
+            static/vendor/fonts).
+
+    Returns:
+        Paths of the files written.
+    """
+    local = os.path.isdir(source)
+
+    def read(location: str) -> bytes:
+        if local:
+            with open(os.path.join(source, location), 'rb') as f:
+                return f.read()
+        url = urllib.parse.urljoin(source, location)
+        with urllib.request.urlopen(urllib.request.Request(url, headers={'User-Agent': FONTS_USER_AGENT}),
+                                    timeout=60) as response:
+            return response.read()
+
+    fonts_dir = os.path.join(static_dir, *FONTS_DIR.split('/'))
+    written = []
+
+    def vendor(match):
+        location = match.group(2)
+        name = posixpath.basename(urllib.parse.urlparse(location).path)
+        path = os.path.join(fonts_dir, name)
+        if path not in written:
+            data = read(location)
+            _write_atomic(path, data)
+            written.append(path)
+            logger.info(f"Vendored {name} ({len(data)} bytes)")
+        return f"url({name})"
+
+    css = _CSS_URL.sub(vendor, read(posixpath.basename(FONTS_CSS) if local else '').decode('utf-8'))
+    path = os.path.join(static_dir, *FONTS_CSS.split('/'))
+    _write_atomic(path, css.encode('utf-8'))
+    written.append(path)
+    return written
+
+
+def missing_vendored(static_dir: str = STATIC_DIR) -> List[str]:
+    """Vendored files (static-relative) that are not there: pdf.js, the font stylesheet and its fonts."""
+    def exists(filename: str) -> bool:
+        return os.path.isfile(os.path.join(static_dir, *filename.split('/')))
+
+    missing = [f"{PDFJS_DIR}/{name}" for name in PDFJS_FILES if not exists(f"{PDFJS_DIR}/{name}")]
+    if not exists(FONTS_CSS):
+        return missing + [FONTS_CSS]
+    with open(os.path.join(static_dir, *FONTS_CSS.split('/')), encoding='utf-8') as f:
+        fonts = {match.group(2) for match in _CSS_URL.finditer(f.read())}
+    return missing + sorted(f"{FONTS_DIR}/{name}" for name in fonts if not exists(f"{FONTS_DIR}/{name}"))
+
+
+# --- serving ------------------------------------------------------------
+
+@lru_cache(maxsize=4)
+def _load_manifest(path: str, mtime_ns: int) -> Dict[str, str]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def manifest() -> Dict[str, str]:
+    """The current manifest ({} before the first build); reloaded when rebuilt."""
+    path = os.path.join(DIST_DIR, MANIFEST_NAME)
+    try:
+        return _load_manifest(path, os.stat(path).st_mtime_ns)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url(filename: str) -> str:
+    """URL of a static asset: the fingerprinted copy when built, else /static."""
+    name = manifest().get(filename)
+    if name:
+        return URL_PREFIX + name
+    return url_for('static', filename=filename)
+
+
+def _vendored(filename: str) -> bool:
+    return filename in manifest() or os.path.isfile(os.path.join(STATIC_DIR, *filename.split('/')))
+
+
+def pdfjs_url(name: str) -> str:
+    """URL of a pdf.js file: the vendored copy, or the CDN until it is vendored."""
+    filename = f"{PDFJS_DIR}/{name}"
+    return asset_url(filename) if _vendored(filename) else PDFJS_CDN + name
+
+
+def fonts_url() -> str:
+    """URL of the font stylesheet: the vendored copy, or Google Fonts until it is vendored."""
+    return asset_url(FONTS_CSS) if _vendored(FONTS_CSS) else FONTS_SOURCE
+
+
+def send_asset(filename: str):
+    """
+    Serve a fingerprinted asset, precompressed if the client accepts it.
+
+    The name changes whenever the content does, so responses are cached
+    for a year without revalidation.
+    """
+    path = safe_join(DIST_DIR, filename)
+    if path is None or filename == MANIFEST_NAME or not os.path.isfile(path):
+        abort(404)
+
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[candidate] > 0 and os.path.isfile(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_file(path, mimetype=mimetype, max_age=MAX_AGE, conditional=True)
+    response.headers['Cache-Control'] = f"public, max-age={MAX_AGE}, immutable"
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m assets', description="Build static assets")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('build', help="Fingerprint and precompress static/ and write the manifest")
+    fetch = commands.add_parser('fetch-pdfjs', help=f"Vendor pdf.js {PDFJS_VERSION} into static/{PDFJS_DIR}")
+    fetch.add_argument('--source', default=PDFJS_CDN, help="Base URL or local directory to copy from")
+    fonts = commands.add_parser('fetch-fonts', help=f"Vendor the Outfit font into static/{FONTS_DIR}")
+    fonts.add_argument('--source', default=FONTS_SOURCE,
+                       help="Google Fonts stylesheet URL, or a local directory with outfit.css and its fonts")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.command == 'fetch-pdfjs':
+        fetch_pdfjs(args.source)
+    elif args.command == 'fetch-fonts':
+        fetch_fonts(args.source)
+    else:
+        build()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Asyncio API for pdf_services, for embedding in async applications.
+
+    from async_services import AsyncPDFServices
+
+    async with AsyncPDFServices(workers=4) as pdf:
+        merged = await pdf.merge([b"%PDF-...", "/path/b.pdf", request.content])
+        async for page_number, jpeg in pdf.pdf_to_images(merged, dpi=100):
+            await send(jpeg)
+
+CPU work runs in a WorkerPool (separate processes, per-job timeout and
+memory limit), so the event loop never blocks on PDF processing. At most
+`max_pending` jobs are in flight; further calls wait for a slot, which is
+the backpressure for producers. Cancelling the awaiting task stops the job
+at its next page (see cancellation.py), and the cancellation propagates
+once the job has stopped, so staged files outlive it; the worker is only
+killed if it does not stop in time.
+
+Inputs may be a path, bytes, an async iterable of byte chunks, or an object
+with an async read() (e.g. aiohttp's StreamReader). Results are bytes, or
+written to `output_path` and returned as the path. Page images and split
+parts are yielded as soon as they are ready.
+"""
+import os
+import asyncio
+import tempfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterable, AsyncIterator, List, Tuple, Union
+
+import config
+import cancellation
+import worker_pool
+
+logger = logging.getLogger(__name__)
+
+Source = Union[str, bytes, AsyncIterable]
+
+# Chunk size when reading async streams with read()
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class AsyncPDFServices:
+    """
+    Async facade over pdf_services.
+
+    Args:
+        workers: Worker processes for a private pool. None shares the app's
+            pool (worker_pool.get_pool(), WORKER_POOL_SIZE); 0 runs jobs in
+            threads of this process.
+        max_pending: Jobs in flight at once (default: 2 per worker).
+        job_timeout: Per-job limit in seconds (private pool only).
+        tmp_dir: Where inputs and outputs are staged (default: system temp).
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None, job_timeout: float = 300,
+                 tmp_dir: str = None):
+        if workers is None:
+            self._pool, self._owns_pool = worker_pool.get_pool(), False
+        elif workers > 0:
+            self._pool, self._owns_pool = worker_pool.WorkerPool(workers, job_timeout=job_timeout), True
+        else:
+            self._pool, self._owns_pool = None, False
+        size = self._pool.size if self._pool else (os.cpu_count() or 1)
+        self.max_pending = max_pending or 2 * size
+        self.tmp_dir = tmp_dir
+        self._slots = asyncio.Semaphore(self.max_pending)
+        # Threads only wait on worker pipes (or run jobs in-process when there is no pool)
+        self._threads = ThreadPoolExecutor(max_workers=self.max_pending, thread_name_prefix='async-pdf')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self) -> None:
+        """Shut down the threads, and the pool if this instance started it."""
+        self._threads.shutdown(wait=False)
+        if self._owns_pool:
+            await asyncio.get_running_loop().run_in_executor(None, self._pool.close)
+
+    # --- plumbing -------------------------------------------------------
+
+    async def _run(self, func_name: str, *args, **kwargs):
+        """Run one pdf_services call off the event loop, within the pending-job limit."""
+        loop = asyncio.get_running_loop()
+        token = cancellation.CancelToken()
+        if self._pool is None:
+            call = partial(_run_in_process, token, func_name, *args, **kwargs)
+        else:
+            call = partial(self._pool.call, func_name, *args, cancel=token, **kwargs)
+
+        await self._slots.acquire()
+        try:
+            job = loop.run_in_executor(self._threads, call)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job has really finished, not just until
+        # the awaiting task is cancelled
+        job.add_done_callback(self._job_done)
+        try:
+            return await asyncio.shield(job)
+        except asyncio.CancelledError:
+            token.cancel()  # the job stops at its next page
+            logger.info(f"Cancelled {func_name}")
+            # Callers remove the job's staged inputs and outputs as the
+            # cancellation propagates, so let it stop using them first
+            while not job.done():
+                try:
+                    await asyncio.wait([job])
+                except asyncio.CancelledError:
+                    pass
+            raise
+
+    def _job_done(self, job: asyncio.Future) -> None:
+        self._slots.release()
+        if not job.cancelled():
+            job.exception()  # retrieved, even when nobody awaits it any more
+
+    @staticmethod
+    async def _write_source(source: Source, path: str) -> None:
+        """Stage an input at `path` without blocking the loop on large writes."""
+        loop = asyncio.get_running_loop()
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            await loop.run_in_executor(None, _write_bytes, path, bytes(source))
+            return
+        with open(path, 'wb') as f:
+            if hasattr(source, 'read'):
+                while True:
+                    chunk = await source.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await loop.run_in_executor(None, f.write, chunk)
+            else:
+                async for chunk in source:
+                    await loop.run_in_executor(None, f.write, chunk)
+
+    async def _stage(self, workdir: str, source: Source, name: str) -> str:
+        if isinstance(source, (str, os.PathLike)):
+            return os.fspath(source)
+        path = os.path.join(workdir, name)
+        await self._write_source(source, path)
+        return path
+
+    async def _single(self, func_name: str, source: Source, output_path: str, *args, **kwargs):
+        """One input, one PDF output: returns bytes, or the path when output_path is given."""
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as workdir:
+            input_path = await self._stage(workdir, source, 'input.pdf')
+            target = output_path or os.path.join(workdir, 'output.pdf')
+            await self._run(func_name, input_path, target, *args, **kwargs)
+            if output_path:
+                return output_path
+            return await asyncio.get_running_loop().run_in_executor(None, _read_bytes, target)
+
+    # --- operations -----------------------------------------------------
+
+    async def merge(self, sources: List[Source], output_path: str = None, **options):
+        """Merge PDFs in order (options: linearize, profile)."""
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as workdir:
+            paths = [await self._stage(workdir, source, f"input_{i}.pdf") for i, source in enumerate(sources)]
+            target = output_path or os.path.join(workdir, 'merged.pdf')
+            await self._run('merge_pdfs', paths, target, **options)
+            if output_path:
+                return output_path
+            return await asyncio.get_running_loop().run_in_executor(None, _read_bytes, target)
+
+    async def rotate(self, source: Source, rotations: dict, output_path: str = None, **options):
+        """Rotate pages ({page index: degrees clockwise})."""
+        return await self._single('rotate_pdf', source, output_path, {str(k): v for k, v in rotations.items()},
+                                  **options)
+
+    async def reorder(self, source: Source, page_order: List[int], output_path: str = None, **options):
+        """Reorder pages (1-indexed page numbers in their new order)."""
+        return await self._single('reorder_pdf', source, output_path, page_order, **options)
+
+    async def compress(self, source: Source, level: str = 'recommended', output_path: str = None, **options):
+        """Compress by re-rendering pages (level: extreme, recommended, less)."""
+        dpi, quality = config.COMPRESSION_LEVELS[level]
+        return await self._single('compress_pdf', source, output_path, dpi=dpi, quality=quality, **options)
+
+    async def watermark(self, source: Source, config: dict, image: Source = None, output_path: str = None,
+                        **options):
+        """Add a text or image watermark (config as for pdf_services.add_watermark)."""
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as workdir:
+            image_path = await self._stage(workdir, image, 'watermark.img') if image is not None else None
+            return await self._single('add_watermark', source, output_path, config, image_path, **options)
+
+    async def protect(self, source: Source, user_password: str, owner_password: str, permissions: dict = None,
+                      output_path: str = None, **options):
+        """Encrypt (options: algorithm, linearize, profile)."""
+        return await self._single('protect_pdf', source, output_path, user_password, owner_password, permissions,
+                                  **options)
+
+    async def unlock(self, source: Source, password: str, output_path: str = None, **options):
+        """Remove encryption."""
+        return await self._single('unlock_pdf', source, output_path, password, **options)
+
+    async def images_to_pdf(self, images: List[Source], output_path: str = None, **options):
+        """One page per image (options: page_size, dpi, quality, linearize, profile)."""
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as workdir:
+            paths = [await self._stage(workdir, image, f"image_{i}") for i, image in enumerate(images)]
+            target = output_path or os.path.join(workdir, 'images.pdf')
+            await self._run('images_to_pdf', paths, target, **options)
+            if output_path:
+                return output_path
+            return await asyncio.get_running_loop().run_in_executor(None, _read_bytes, target)
+
+    async def analyze(self, source: Source) -> dict:
+        """Size breakdown and compression suggestions (pdf_services.analyze_pdf)."""
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as workdir:
+            return await self._run('analyze_pdf', await self._stage(workdir, source, 'input.pdf'))
+
+    async def split(self, source: Source, page_selection: List[int] = None, max_bytes: int = None,
+                    **options) -> AsyncIterator[Tuple[str, bytes]]:
+        """Yield (file name, bytes) for each part of pdf_services.split_pdf."""
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as workdir:
+            input_path = await self._stage(workdir, source, 'input.pdf')
+            output_dir = os.path.join(workdir, 'parts')
+            os.makedirs(output_dir)
+            parts = await self._run('split_pdf', input_path, output_dir, page_selection, max_bytes, **options)
+            loop = asyncio.get_running_loop()
+            for part in parts:
+                yield os.path.basename(part), await loop.run_in_executor(None, _read_bytes, part)
+                os.remove(part)
+
+    async def pdf_to_images(self, source: Source, pages: List[int] = None, batch: int = 4, prefetch: int = 2,
+                            **options) -> AsyncIterator[Tuple[int, bytes]]:
+        """
+        Yield (1-indexed page number, image bytes) in page order, as pages are rendered.
+
+        Pages are rendered in batches of `batch`, with up to `prefetch`
+        batches running ahead of the consumer, spread over the workers. A
+        slow consumer therefore holds back rendering instead of letting
+        images pile up. Options as for pdf_services.pdf_to_images (dpi,
+        fmt, quality, max_size, grayscale, clip).
+        """
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as workdir:
+            input_path = await self._stage(workdir, source, 'input.pdf')
+            if pages is None:
+                pages = list(range(await self._run('count_pages', input_path)))
+            batches = [pages[i:i + batch] for i in range(0, len(pages), batch)]
+            loop = asyncio.get_running_loop()
+
+            def render(index: int) -> asyncio.Task:
+                output_dir = os.path.join(workdir, f"batch_{index}")
+                os.makedirs(output_dir)
+                return asyncio.ensure_future(self._run('render_pages', input_path, output_dir,
+                                                       pages=batches[index], **options))
+
+            running = [render(i) for i in range(min(prefetch, len(batches)))]
+            try:
+                for index in range(len(batches)):
+                    files = await running.pop(0)
+                    if index + len(running) + 1 < len(batches):
+                        running.append(render(index + len(running) + 1))
+                    for page_number, path in files:
+                        yield page_number + 1, await loop.run_in_executor(None, _read_bytes, path)
+                        os.remove(path)
+            finally:
+                for task in running:
+                    task.cancel()
+                if running:
+                    await asyncio.gather(*running, return_exceptions=True)
+
+
+def _run_in_process(token: cancellation.CancelToken, func_name: str, *args, **kwargs):
+    """Run a pdf_services call in this process (in an executor thread: the import loads fitz)."""
+    import pdf_services
+    return cancellation.run(token, getattr(pdf_services, func_name), *args, **kwargs)
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    with open(path, 'wb') as f:
+        f.write(data)
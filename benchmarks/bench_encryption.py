@@ -0,0 +1,69 @@
+"""
+Compare /protect and /unlock: PyMuPDF save-time encryption (current) vs the
+previous pypdf copy-and-encrypt implementation.
+
+    python -m benchmarks.bench_encryption
+"""
+import os
+import time
+import tempfile
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.constants import UserAccessPermissions
+
+import pdf_services
+from benchmarks.corpus import build_corpus
+
+
+def legacy_protect(file_path: str, output_path: str, user_pwd: str, owner_pwd: str) -> None:
+    """The pypdf implementation protect_pdf used before (AES-128)."""
+    reader = PdfReader(file_path)
+    writer = PdfWriter()
+    writer.append(reader)
+    flags = UserAccessPermissions.PRINT | UserAccessPermissions.MODIFY | UserAccessPermissions.EXTRACT | 512
+    writer.encrypt(user_password=user_pwd, owner_password=owner_pwd, permissions_flag=flags, algorithm="AES-128")
+    with open(output_path, "wb") as f:
+        writer.write(f)
+
+
+def legacy_unlock(file_path: str, output_path: str, password: str) -> None:
+    """The pypdf implementation unlock_pdf used before."""
+    reader = PdfReader(file_path)
+    if reader.is_encrypted:
+        reader.decrypt(password)
+    writer = PdfWriter()
+    writer.append(reader)
+    with open(output_path, "wb") as f:
+        writer.write(f)
+
+
+def _timed(func, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    workdir = tempfile.mkdtemp(prefix="bench_enc_")
+    print(f"{'document':<12} {'MB':>7} {'pypdf protect':>14} {'native AES-128':>15} {'native AES-256':>15} "
+          f"{'pypdf unlock':>13} {'native unlock':>14} {'speedup':>8}")
+
+    for name, path in build_corpus().items():
+        size_mb = os.path.getsize(path) / 1e6
+        legacy_out = os.path.join(workdir, f"{name}_legacy.pdf")
+        native_out = os.path.join(workdir, f"{name}_native.pdf")
+        native128_out = os.path.join(workdir, f"{name}_native128.pdf")
+
+        t_legacy = _timed(legacy_protect, path, legacy_out, "user", "owner")
+        t_native128 = _timed(pdf_services.protect_pdf, path, native128_out, "user", "owner", algorithm="AES-128")
+        t_native = _timed(pdf_services.protect_pdf, path, native_out, "user", "owner")
+        t_legacy_unlock = _timed(legacy_unlock, legacy_out, os.path.join(workdir, f"{name}_legacy_open.pdf"), "user")
+        t_native_unlock = _timed(pdf_services.unlock_pdf, native_out, os.path.join(workdir, f"{name}_native_open.pdf"), "user")
+
+        speedup = (t_legacy + t_legacy_unlock) / (t_native + t_native_unlock)
+        print(f"{name:<12} {size_mb:>7.1f} {t_legacy:>13.2f}s {t_native128:>14.2f}s {t_native:>14.2f}s "
+              f"{t_legacy_unlock:>12.2f}s {t_native_unlock:>13.2f}s {speedup:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Output size and save time per writer profile, for each pdf_services operation.
+
+"plain" is a bare save() with no options, i.e. what reorder/watermark/edits
+wrote before the shared writer policy.
+
+    python -m benchmarks.bench_writer
+"""
+import os
+import time
+import tempfile
+
+import pdf_services
+from benchmarks.corpus import build_corpus
+
+PROFILES = ('plain', 'fast', 'compact')
+
+
+def _operations(path: str, workdir: str) -> dict:
+    """name -> callable(profile) returning the total output size in bytes."""
+    pages = pdf_services.count_pages(path)
+
+    def single(name, func, *args):
+        def call(profile):
+            target = os.path.join(workdir, f"{name}_{profile}.pdf")
+            func(*args, target, profile=profile)
+            return os.path.getsize(target)
+        return call
+
+    def split(profile):
+        files = pdf_services.split_pdf(path, tempfile.mkdtemp(dir=workdir), profile=profile)
+        return sum(os.path.getsize(f) for f in files)
+
+    def rotate(target, profile):
+        pdf_services.rotate_pdf(path, target, {str(i): 90 for i in range(pages)}, profile=profile)
+
+    def reorder(target, profile):
+        pdf_services.reorder_pdf(path, target, list(range(pages, 0, -1)), profile=profile)
+
+    def watermark(target, profile):
+        pdf_services.add_watermark(path, target, {'text': 'DRAFT'}, profile=profile)
+
+    return {
+        'merge x2': single('merge', pdf_services.merge_pdfs, [path, path]),
+        'rotate': single('rotate', rotate),
+        'reorder': single('reorder', reorder),
+        'watermark': single('watermark', watermark),
+        'split': split,
+    }
+
+
+def main() -> None:
+    pdf_services.WRITER_PROFILES['plain'] = {}
+    workdir = tempfile.mkdtemp(prefix="bench_writer_")
+
+    header = f"{'document':<12} {'operation':<10}"
+    for profile in PROFILES:
+        header += f" {profile + ' KB':>12} {'s':>6}"
+    print(header + f" {'fast Δ':>8} {'compact Δ':>10}")
+
+    for name, path in build_corpus().items():
+        for op_name, op in _operations(path, workdir).items():
+            sizes, times = {}, {}
+            for profile in PROFILES:
+                start = time.perf_counter()
+                sizes[profile] = op(profile)
+                times[profile] = time.perf_counter() - start
+            line = f"{name:<12} {op_name:<10}"
+            for profile in PROFILES:
+                line += f" {sizes[profile] / 1024:>12.0f} {times[profile]:>6.2f}"
+            for profile in ('fast', 'compact'):
+                delta = (sizes[profile] / sizes['plain'] - 1) * 100
+                line += f" {delta:>+7.1f}%" if profile == 'fast' else f" {delta:>+9.1f}%"
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
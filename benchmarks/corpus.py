@@ -0,0 +1,118 @@
+"""
+Deterministic synthetic PDF corpus for the benchmarks.
+
+Nothing is downloaded: documents are generated with PyMuPDF and PIL and
+cached in a temp directory. BENCH_SCALE multiplies the page counts, e.g.
+BENCH_SCALE=10 produces files in the 50-100MB range.
+"""
+import io
+import os
+import random
+import tempfile
+import logging
+
+import fitz
+from PIL import Image, ImageFilter
+
+logger = logging.getLogger(__name__)
+
+CORPUS_DIR = os.environ.get('BENCH_CORPUS_DIR', os.path.join(tempfile.gettempdir(), 'pdf_suite_corpus'))
+
+WORDS = ("invoice total amount payable account reference period statement balance "
+         "customer service contract agreement schedule section clause party notice "
+         "delivery address order quantity price tax date signature page report").split()
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_text_pdf(path: str, pages: int, seed: int = 1) -> None:
+    """Born-digital text document (fonts and content streams, no images)."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = "\n\n".join(_paragraph(rng, rng.randint(40, 90)) for _ in range(6))
+        page.insert_textbox(fitz.Rect(60, 60, 535, 780), text, fontsize=10, fontname="helv")
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+def _scan_image(rng: random.Random, text: str, grayscale: bool) -> bytes:
+    """Render text to a page raster and degrade it like a scanner would."""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(60, 60, 535, 780), text, fontsize=11, fontname="tiro")
+    pix = page.get_pixmap(dpi=150, colorspace=fitz.csGRAY if grayscale else fitz.csRGB)
+    doc.close()
+
+    img = Image.frombytes("L" if grayscale else "RGB", [pix.width, pix.height], pix.samples)
+    noise = Image.effect_noise(img.size, rng.randint(8, 16)).convert(img.mode)
+    img = Image.blend(img, noise, 0.08).filter(ImageFilter.GaussianBlur(0.6))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def make_scan_pdf(path: str, pages: int, seed: int = 2, grayscale: bool = False, blank_every: int = 0) -> None:
+    """Scanned document: one full-page JPEG per page (optionally blank separators)."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    blank = None
+    for i in range(pages):
+        page = doc.new_page()
+        if blank_every and i % blank_every == blank_every - 1:
+            blank = blank or _scan_image(random.Random(0), "", grayscale)
+            data = blank
+        else:
+            data = _scan_image(rng, "\n\n".join(_paragraph(rng, 60) for _ in range(5)), grayscale)
+        page.insert_image(page.rect, stream=data)
+    doc.save(path)
+    doc.close()
+
+
+def make_photo_pdf(path: str, pages: int, seed: int = 3) -> None:
+    """Colour photos, one per page, at roughly phone-camera resolution."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for _ in range(pages):
+        base = Image.radial_gradient("L").resize((2400, 1800))
+        color = Image.merge("RGB", [base.point(lambda v, k=rng.random(): int(v * k)) for _ in range(3)])
+        noise = Image.effect_noise(color.size, 30).convert("RGB")
+        img = Image.blend(color, noise, 0.25)
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=90)
+        page = doc.new_page(width=842, height=595)
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    doc.save(path)
+    doc.close()
+
+
+# name -> (builder, base page count, extra kwargs)
+DOCUMENTS = {
+    'text': (make_text_pdf, 60, {}),
+    'scan_color': (make_scan_pdf, 12, {}),
+    'scan_gray': (make_scan_pdf, 12, {'grayscale': True, 'blank_every': 4}),
+    'photos': (make_photo_pdf, 6, {}),
+}
+
+
+def build_corpus(names=None, scale: int = None) -> dict:
+    """
+    Build (or reuse) corpus documents.
+
+    Returns:
+        Dict of name -> path.
+    """
+    scale = scale or int(os.environ.get('BENCH_SCALE', 1))
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    paths = {}
+    for name in names or DOCUMENTS:
+        builder, pages, kwargs = DOCUMENTS[name]
+        path = os.path.join(CORPUS_DIR, f"{name}_x{scale}.pdf")
+        if not os.path.exists(path):
+            logger.info(f"Generating corpus document {path}")
+            builder(path, pages * scale, **kwargs)
+        paths[name] = path
+    return paths
@@ -0,0 +1,306 @@
+"""
+Load test: replay a mix of tool requests against a locally started server.
+
+    python -m benchmarks.loadtest
+    python -m benchmarks.loadtest -c 16 -d 120 --threads 16 --pool-size 4
+    python -m benchmarks.loadtest --mix merge=3,split=3,compress=1 --report run.json
+    python -m benchmarks.loadtest --url http://127.0.0.1:8080   # a running server (no RSS)
+
+The server is started as `python app.py` (waitress, worker pool, admission
+control: the production stack) on a free local port, with its own temp
+storage and state. Request bodies are built from the synthetic corpus once,
+so the clients cost little CPU. Everything stays on the loopback interface.
+
+Reports per operation: completed requests, errors, rejections (503 from
+admission control), throughput and p50/p95/p99 latency; and the server's RSS,
+main process plus workers, sampled over the run (Linux /proc).
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from benchmarks.corpus import build_corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = 'merge=2,compress=1,pdf-to-jpg=2,watermark=2,split=2'
+
+# operation -> (path, form fields, [(field, corpus document)])
+WORKLOADS = {
+    'merge': ('/merge', {}, [('files[]', 'text'), ('files[]', 'scan_gray')]),
+    'compress': ('/compress', {'level': 'recommended'}, [('file', 'scan_color')]),
+    'pdf-to-jpg': ('/pdf-to-jpg', {'dpi': '72', 'pages': '1-4'}, [('file', 'text')]),
+    'watermark': ('/watermark', {'config': json.dumps({'mode': 'text', 'text': 'DRAFT', 'size': 40})},
+                  [('file', 'text')]),
+    'split': ('/split', {'pages': '"all"'}, [('file', 'scan_gray')]),
+}
+
+
+def encode_multipart(fields: dict, files: List[Tuple[str, str, bytes]]) -> Tuple[bytes, str]:
+    """Build a multipart/form-data body. Returns (body, content type)."""
+    boundary = f"loadtest{random.getrandbits(64):016x}"
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/pdf\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def build_requests(mix: Dict[str, int]) -> Dict[str, Tuple[str, bytes, str]]:
+    """operation -> (path, body, content type), for the operations in the mix."""
+    corpus = build_corpus()
+    contents = {name: open(path, 'rb').read() for name, path in corpus.items()}
+    built = {}
+    for operation in mix:
+        path, fields, files = WORKLOADS[operation]
+        body, content_type = encode_multipart(fields, [(field, f"{doc}.pdf", contents[doc]) for field, doc in files])
+        built[operation] = (path, body, content_type)
+    return built
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in WORKLOADS:
+            raise ValueError(f"Unknown operation '{name}' (choose from {', '.join(WORKLOADS)})")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, threads: int, pool_size: int = None) -> Tuple[subprocess.Popen, str, str]:
+    """Start app.py on a free loopback port. Returns (process, base url, log path)."""
+    port = free_port()
+    env = dict(os.environ, HOST='127.0.0.1', PORT=str(port), THREADS=str(threads),
+               STORAGE_ROOT=os.path.join(workdir, 'storage'), STATE_DIR=os.path.join(workdir, 'state'))
+    if pool_size is not None:
+        env['WORKER_POOL_SIZE'] = str(pool_size)
+    log_path = os.path.join(workdir, 'server.log')
+    with open(log_path, 'wb') as log:
+        process = subprocess.Popen([sys.executable, 'app.py'], cwd=ROOT, env=env, stdout=log,
+                                   stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}", log_path
+
+
+def wait_ready(url: str, process: subprocess.Popen = None, timeout: float = 180) -> None:
+    """Poll /health until the server reports warm (200)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=5) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server not ready after {timeout:g}s")
+
+
+def process_tree_rss(pid: int) -> int:
+    """Resident memory of a process and all its descendants, in bytes (Linux)."""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name may contain spaces; fields resume after ')'
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    tree, frontier = {pid}, [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent and child not in tree]
+        tree.update(children)
+        frontier.extend(children)
+
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    total = 0
+    for member in tree:
+        try:
+            with open(f"/proc/{member}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+def sample_rss(pid: int, interval: float, stop: threading.Event, samples: list) -> None:
+    start = time.monotonic()
+    while not stop.is_set():
+        samples.append((round(time.monotonic() - start, 1), process_tree_rss(pid)))
+        stop.wait(interval)
+
+
+def client(url: str, requests: dict, mix: Dict[str, int], deadline: float, seed: int, results: list) -> None:
+    """Send requests from the mix back to back until the deadline."""
+    rng = random.Random(seed)
+    operations, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        path, body, content_type = requests[operation]
+        request = urllib.request.Request(url + path, data=body, headers={'Content-Type': content_type})
+        start = time.perf_counter()
+        received = 0
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                status = response.status
+                while True:
+                    block = response.read(256 * 1024)
+                    if not block:
+                        break
+                    received += len(block)
+        except urllib.error.HTTPError as e:
+            status = e.code
+            e.read()
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            status = 0
+        results.append((operation, time.perf_counter() - start, status, received))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))]
+
+
+def summarize(results: list, elapsed: float) -> dict:
+    by_operation = defaultdict(list)
+    for result in results:
+        by_operation[result[0]].append(result)
+    by_operation['all'] = list(results)
+
+    summary = {}
+    for operation, rows in by_operation.items():
+        ok = sorted(latency for _, latency, status, _ in rows if 200 <= status < 400)
+        rejected = sum(status == 503 for _, _, status, _ in rows)
+        summary[operation] = {
+            'requests': len(rows),
+            'ok': len(ok),
+            'rejected': rejected,
+            'errors': len(rows) - len(ok) - rejected,
+            'error_rate': round((len(rows) - len(ok)) / len(rows), 4) if rows else 0.0,
+            'throughput_rps': round(len(ok) / elapsed, 3),
+            'p50_ms': round(percentile(ok, 50) * 1000, 1),
+            'p95_ms': round(percentile(ok, 95) * 1000, 1),
+            'p99_ms': round(percentile(ok, 99) * 1000, 1),
+            'mb_received': round(sum(row[3] for row in rows) / 1e6, 1),
+        }
+    return summary
+
+
+def print_report(report: dict) -> None:
+    print(f"{report['elapsed_seconds']}s, {report['clients']} clients, server threads={report['threads']} "
+          f"pool={report['pool_size'] if report['pool_size'] is not None else 'default'}")
+    print(f"{'operation':<12} {'ok':>6} {'503':>5} {'err':>5} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for operation, stats in sorted(report['operations'].items(), key=lambda item: item[0] == 'all'):
+        print(f"{operation:<12} {stats['ok']:>6} {stats['rejected']:>5} {stats['errors']:>5} "
+              f"{stats['throughput_rps']:>7.2f} {stats['p50_ms']:>8.0f} {stats['p95_ms']:>8.0f} {stats['p99_ms']:>8.0f}")
+    rss = report['rss_mb']
+    if rss:
+        values = [mb for _, mb in rss]
+        print(f"server RSS: start {values[0]:.0f} MB, peak {max(values):.0f} MB, end {values[-1]:.0f} MB")
+        step = max(1, len(rss) // 20)
+        print("  " + "  ".join(f"{t:g}s:{mb:.0f}" for t, mb in rss[::step]))
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.loadtest', description=__doc__.split('\n')[1])
+    parser.add_argument('-c', '--clients', type=int, default=8, help="Concurrent clients")
+    parser.add_argument('-d', '--duration', type=float, default=60, help="Seconds of load")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Operation weights (default {DEFAULT_MIX})")
+    parser.add_argument('--threads', type=int, default=8, help="Server THREADS")
+    parser.add_argument('--pool-size', type=int, help="Server WORKER_POOL_SIZE (default: its own default)")
+    parser.add_argument('--url', help="Load an already running server instead of starting one")
+    parser.add_argument('--sample', type=float, default=1.0, help="RSS sampling interval in seconds")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--report', help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    args = parse_args(argv)
+    mix = parse_mix(args.mix)
+    requests = build_requests(mix)
+
+    process, workdir = None, tempfile.mkdtemp(prefix='loadtest_')
+    url = args.url.rstrip('/') if args.url else None
+    if url is None:
+        process, url, log_path = start_server(workdir, args.threads, args.pool_size)
+        print(f"Server log: {log_path}", file=sys.stderr)
+
+    stop, samples = threading.Event(), []
+    try:
+        wait_ready(url, process)
+        sampler = None
+        if process is not None and os.path.isdir('/proc'):
+            sampler = threading.Thread(target=sample_rss, args=(process.pid, args.sample, stop, samples), daemon=True)
+            sampler.start()
+
+        results = []
+        start = time.monotonic()
+        deadline = start + args.duration
+        clients = [threading.Thread(target=client, args=(url, requests, mix, deadline, args.seed + i, results))
+                   for i in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.monotonic() - start
+        stop.set()
+        if sampler is not None:
+            sampler.join()
+    finally:
+        stop.set()
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            # Keep only the server log
+            for name in ('storage', 'state'):
+                shutil.rmtree(os.path.join(workdir, name), ignore_errors=True)
+
+    report = {
+        'url': url,
+        'clients': args.clients,
+        'threads': args.threads,
+        'pool_size': args.pool_size,
+        'mix': mix,
+        'elapsed_seconds': round(elapsed, 1),
+        'operations': summarize(results, elapsed),
+        'rss_mb': [(t, round(rss / 2 ** 20, 1)) for t, rss in samples],
+    }
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Cooperative cancellation for long-running PDF work.
+
+A CancelToken trips when its event is set (job cancelled), its deadline
+passes, or its probe reports the client has gone (waitress'
+client_disconnected). Long loops in pdf_services call check() between
+pages, so cancelled work stops within about a page and the worker is free
+for the next job:
+
+    with cancellation.scope(CancelToken(deadline=time.time() + 60)):
+        pdf_services.compress_pdf(...)   # raises Cancelled when it trips
+
+Without a token in scope (CLI, tests) check() does nothing.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+# Reasons, as reported by Cancelled.reason
+CLIENT_DISCONNECTED = 'client disconnected'
+JOB_CANCELLED = 'job cancelled'
+DEADLINE_EXCEEDED = 'deadline exceeded'
+
+_current: ContextVar[Optional['CancelToken']] = ContextVar('cancel_token', default=None)
+
+
+class Cancelled(Exception):
+    """The work was stopped before it finished; its partial output should be discarded."""
+
+    def __init__(self, reason: str = JOB_CANCELLED):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """
+    Cancellation signal for one request or job.
+
+    Args:
+        deadline: Wall-clock time (time.time()) after which the work stops.
+            Wall-clock so it means the same in worker processes.
+        event: Flag to share (e.g. a multiprocessing.Event for a worker).
+        probe: Callable returning True once the work is no longer wanted,
+            polled on every check.
+    """
+
+    def __init__(self, deadline: float = None, event=None, probe: Callable[[], bool] = None):
+        self.deadline = deadline
+        self.event = event if event is not None else threading.Event()
+        self.probe = probe
+        self.reason = None
+
+    def cancel(self, reason: str = JOB_CANCELLED) -> None:
+        if self.reason is None:
+            self.reason = reason
+        self.event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self.event.is_set():
+            if self.reason is None:
+                # Set from another process; the reason travelled separately, if at all
+                self.reason = JOB_CANCELLED
+            return True
+        if self.deadline is not None and time.time() >= self.deadline:
+            self.cancel(DEADLINE_EXCEEDED)
+            return True
+        if self.probe is not None and self.probe():
+            self.cancel(CLIENT_DISCONNECTED)
+            return True
+        return False
+
+    def check(self) -> None:
+        """Raise Cancelled if the token has tripped."""
+        if self.cancelled:
+            raise Cancelled(self.reason)
+
+
+def current() -> Optional[CancelToken]:
+    """The token in scope, if any."""
+    return _current.get()
+
+
+def check() -> None:
+    """Raise Cancelled if the token in scope has tripped; called between pages."""
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+
+def activate(token: Optional[CancelToken]):
+    """Put a token in scope until deactivate() (for setup/teardown hooks)."""
+    return _current.set(token)
+
+
+def deactivate(handle) -> None:
+    if handle is not None:
+        _current.reset(handle)
+
+
+@contextmanager
+def scope(token: Optional[CancelToken]):
+    """Run the block with `token` in scope."""
+    handle = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(handle)
+
+
+def run(token: Optional[CancelToken], func: Callable, *args, **kwargs):
+    """Call func with `token` in scope (e.g. in an executor thread, which has its own context)."""
+    with scope(token):
+        return func(*args, **kwargs)
@@ -0,0 +1,309 @@
+"""
+Batch command line interface for pdf_services.
+
+    python -m cli compress  archive/ -o out/ --level recommended -j 8
+    python -m cli watermark "scans/**/*.pdf" -o out/ --text CONFIDENTIAL
+    python -m cli split     big.pdf -o parts/ --max-size-mb 10
+    python -m cli to-jpg    docs/ -o images/ --dpi 150
+    python -m cli merge     chapters/ -o book.pdf
+
+Inputs are files, directories (their PDFs; -r for subdirectories) or glob
+patterns. Files are processed in a pool of worker processes. Outputs that
+are newer than their inputs are skipped, so an interrupted nightly run can
+simply be restarted. A JSON run report (--report) records per-file timings
+and overall throughput.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Tuple
+
+import config
+import inspection
+
+logger = logging.getLogger('cli')
+
+
+def expand_inputs(patterns: List[str], recursive: bool = False) -> List[Tuple[str, str]]:
+    """
+    Resolve input arguments to PDF files.
+
+    Returns:
+        Sorted (path, base directory) pairs. Outputs mirror the path
+        relative to its base, so files from nested directories do not collide.
+    """
+    found = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            search = os.path.join(pattern, '**', '*.pdf') if recursive else os.path.join(pattern, '*.pdf')
+            for path in glob.glob(search, recursive=recursive):
+                found.setdefault(os.path.abspath(path), os.path.abspath(pattern))
+        elif glob.has_magic(pattern):
+            for path in glob.glob(pattern, recursive=True):
+                if path.lower().endswith('.pdf') and os.path.isfile(path):
+                    found.setdefault(os.path.abspath(path), os.path.abspath(os.path.dirname(path)))
+        elif os.path.isfile(pattern):
+            found.setdefault(os.path.abspath(pattern), os.path.abspath(os.path.dirname(pattern)))
+        else:
+            logger.warning(f"No such file or directory: {pattern}")
+    return sorted(found.items())
+
+
+def check_inputs(paths: List[str], workers: int) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Inspect inputs up front, as the web routes do (inspection.check_input),
+    in worker processes.
+
+    Returns:
+        (usable paths, [(path, reason)] for the files that cannot be processed)
+    """
+    usable, rejected = [], []
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(paths)))) as pool:
+        futures = {path: pool.submit(inspection.inspect_pdf, path) for path in paths}
+        for path, future in futures.items():
+            try:
+                inspection.check_info(future.result(), os.path.basename(path))
+                usable.append(path)
+            except inspection.InputRejected as e:
+                rejected.append((path, str(e)))
+            except Exception as e:  # crashed its worker
+                rejected.append((path, f"{os.path.basename(path)}: {e or 'Unreadable or damaged PDF'}"))
+    return usable, rejected
+
+
+def is_up_to_date(output: str, sources: List[str]) -> bool:
+    """True if the output (file or directory) exists and is newer than every source."""
+    if not os.path.exists(output):
+        return False
+    if os.path.isdir(output) and not os.listdir(output):
+        return False
+    newest = max(os.path.getmtime(source) for source in sources)
+    return os.path.getmtime(output) >= newest
+
+
+def _output_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def run_task(task: dict) -> dict:
+    """
+    Run one pdf_services call (in a worker process).
+
+    The result is written next to the final output and renamed into place
+    when complete, so a crashed or killed run never leaves an output that
+    looks up to date.
+    """
+    import pdf_services
+
+    output = task['output']
+    partial = output + '.partial'
+    result = {'inputs': task['inputs'], 'output': output, 'status': 'done', 'error': None,
+              'input_bytes': sum(os.path.getsize(path) for path in task['inputs'])}
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        if task['is_dir']:
+            shutil.rmtree(partial, ignore_errors=True)
+            os.makedirs(partial)
+        func = getattr(pdf_services, task['func'])
+        func(*task['args'], partial, **task['kwargs'])
+        if task['is_dir']:
+            shutil.rmtree(output, ignore_errors=True)
+        os.replace(partial, output)
+        result['output_bytes'] = _output_size(output)
+    except Exception as e:
+        result.update(status='failed', error=str(e))
+        if os.path.isdir(partial):
+            shutil.rmtree(partial, ignore_errors=True)
+        elif os.path.exists(partial):
+            os.remove(partial)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _output_for(path: str, base: str, output_dir: str, suffix: str = '.pdf') -> str:
+    relative = os.path.splitext(os.path.relpath(path, base))[0]
+    return os.path.abspath(os.path.join(output_dir, relative + suffix))
+
+
+def build_tasks(args, inputs: List[Tuple[str, str]]) -> List[dict]:
+    """One task per input file (a single task for merge)."""
+    writer = {'linearize': args.linearize}
+    if args.profile:
+        writer['profile'] = args.profile
+
+    if args.command == 'merge':
+        paths = [path for path, _ in inputs]
+        return [{'func': 'merge_pdfs', 'inputs': paths, 'output': os.path.abspath(args.output),
+                 'args': (paths,), 'kwargs': writer, 'is_dir': False}]
+
+    tasks = []
+    for path, base in inputs:
+        if args.command == 'compress':
+            dpi, quality = config.COMPRESSION_LEVELS[args.level]
+            task = {'func': 'compress_pdf', 'args': (path,), 'output': _output_for(path, base, args.output),
+                    'kwargs': dict(writer, dpi=dpi, quality=quality), 'is_dir': False}
+        elif args.command == 'watermark':
+            watermark_config = {'mode': 'image' if args.image else 'text', 'text': args.text, 'x': args.x, 'y': args.y,
+                      'size': args.size, 'rotation': args.rotation, 'opacity': args.opacity, 'color': args.color}
+            task = {'func': 'add_watermark', 'args': (path,), 'output': _output_for(path, base, args.output),
+                    'kwargs': dict(writer, watermark_config=watermark_config, image_path=args.image), 'is_dir': False}
+            if args.image:
+                task['sources'] = [path, args.image]
+        elif args.command == 'split':
+            max_bytes = int(args.max_size_mb * 1024 * 1024) if args.max_size_mb else None
+            task = {'func': 'split_pdf', 'args': (path,), 'output': _output_for(path, base, args.output, ''),
+                    'kwargs': dict(writer, max_bytes=max_bytes), 'is_dir': True}
+        else:  # to-jpg
+            task = {'func': 'pdf_to_images', 'args': (path,), 'output': _output_for(path, base, args.output, ''),
+                    'kwargs': {'dpi': args.dpi, 'fmt': args.format, 'quality': args.quality}, 'is_dir': True}
+        task['inputs'] = [path]
+        tasks.append(task)
+    return tasks
+
+
+def run(args) -> dict:
+    """Execute a parsed command line and return the run report."""
+    inputs = expand_inputs(args.inputs, args.recursive)
+    started = time.time()
+    start = time.perf_counter()
+    results = []
+
+    if args.command == 'merge' and inputs:
+        # One bad file would fail the whole merge, so check them all first
+        usable, rejected = check_inputs([path for path, _ in inputs], args.workers)
+        for path, reason in rejected:
+            (logger.warning if args.skip_invalid else logger.error)(reason)
+            results.append({'inputs': [path], 'output': os.path.abspath(args.output),
+                            'status': 'skipped' if args.skip_invalid else 'failed', 'error': reason,
+                            'seconds': 0.0, 'input_bytes': os.path.getsize(path)})
+        if rejected and not args.skip_invalid:
+            print(f"Not merging: {len(rejected)} input(s) cannot be processed (--skip-invalid leaves them out)",
+                  file=sys.stderr)
+            inputs = []
+        else:
+            inputs = [(path, base) for path, base in inputs if path in usable]
+    tasks = build_tasks(args, inputs) if inputs else []
+
+    pending = []
+    for task in tasks:
+        if not args.force and is_up_to_date(task['output'], task.get('sources', task['inputs'])):
+            results.append({'inputs': task['inputs'], 'output': task['output'], 'status': 'skipped',
+                            'error': None, 'seconds': 0.0,
+                            'input_bytes': sum(os.path.getsize(path) for path in task['inputs']),
+                            'output_bytes': _output_size(task['output'])})
+        else:
+            pending.append(task)
+
+    print(f"{len(tasks)} task(s): {len(pending)} to run, {len(tasks) - len(pending)} up to date", file=sys.stderr)
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(pending))) as pool:
+            futures = [pool.submit(run_task, task) for task in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results.append(result)
+                name = os.path.basename(result['output'])
+                if result['status'] == 'failed':
+                    logger.error(f"[{done}/{len(pending)}] {name}: {result['error']}")
+                else:
+                    logger.info(f"[{done}/{len(pending)}] {name} ({result['seconds']}s)")
+
+    elapsed = time.perf_counter() - start
+    processed = [r for r in results if r['status'] == 'done']
+    processed_bytes = sum(r['input_bytes'] for r in processed)
+    report = {
+        'command': args.command,
+        'argv': sys.argv[1:],
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(started)),
+        'elapsed_seconds': round(elapsed, 3),
+        'workers': args.workers,
+        'totals': {
+            'tasks': len(results),
+            'done': len(processed),
+            'skipped': sum(r['status'] == 'skipped' for r in results),
+            'failed': sum(r['status'] == 'failed' for r in results),
+            'input_bytes': processed_bytes,
+            'output_bytes': sum(r.get('output_bytes', 0) for r in processed),
+        },
+        'throughput': {
+            'files_per_second': round(len(processed) / elapsed, 3) if elapsed else None,
+            'mb_per_second': round(processed_bytes / 1e6 / elapsed, 3) if elapsed else None,
+        },
+        'files': sorted(results, key=lambda r: r['output']),
+    }
+    return report
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(prog='python -m cli', description="Batch PDF processing")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('inputs', nargs='+', help="PDF files, directories or glob patterns")
+    common.add_argument('-o', '--output', required=True,
+                        help="Output directory (output file for merge)")
+    common.add_argument('-r', '--recursive', action='store_true', help="Include PDFs in subdirectories")
+    common.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    common.add_argument('-f', '--force', action='store_true', help="Rebuild outputs that are up to date")
+    common.add_argument('--report', help="Write the JSON run report to this file ('-' for stdout)")
+    common.add_argument('--profile', choices=('fast', 'compact'), help="PDF writer profile")
+    common.add_argument('--linearize', action='store_true', help="Write linearized (fast web view) PDFs")
+    common.add_argument('-v', '--verbose', action='store_true', help="Log every file")
+
+    commands = parser.add_subparsers(dest='command', required=True)
+    compress = commands.add_parser('compress', parents=[common], help="Compress PDFs")
+    compress.add_argument('--level', choices=('extreme', 'recommended', 'less'), default='recommended')
+
+    merge = commands.add_parser('merge', parents=[common], help="Merge all inputs into one PDF, in name order")
+    merge.add_argument('--skip-invalid', action='store_true',
+                       help="Leave out damaged or password-protected inputs instead of not merging")
+
+    split = commands.add_parser('split', parents=[common], help="Split PDFs into pages or size-limited parts")
+    split.add_argument('--max-size-mb', type=float, help="Pack pages into parts under this size")
+
+    watermark = commands.add_parser('watermark', parents=[common], help="Watermark PDFs")
+    watermark.add_argument('--text', default='CONFIDENTIAL')
+    watermark.add_argument('--image', help="Image file to use instead of text")
+    watermark.add_argument('--size', type=float, default=40,
+                           help="Font size, or image width as a fraction of the page width")
+    watermark.add_argument('--opacity', type=float, default=0.5)
+    watermark.add_argument('--rotation', type=int, default=45)
+    watermark.add_argument('--color', default='#ff0000')
+    watermark.add_argument('--x', type=float, default=0.5, help="Horizontal centre as a fraction of the page")
+    watermark.add_argument('--y', type=float, default=0.5, help="Vertical centre as a fraction of the page")
+
+    to_jpg = commands.add_parser('to-jpg', parents=[common], help="Render pages to images")
+    to_jpg.add_argument('--dpi', type=int, default=144)
+    to_jpg.add_argument('--format', choices=('jpeg', 'png', 'webp'), default='jpeg')
+    to_jpg.add_argument('--quality', type=int, default=85)
+
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    # pdf_services logs every operation at INFO
+    logging.getLogger('pdf_services').setLevel(logging.WARNING)
+
+    report = run(args)
+    totals = report['totals']
+    print(f"Done in {report['elapsed_seconds']}s: {totals['done']} processed, {totals['skipped']} skipped, "
+          f"{totals['failed']} failed ({report['throughput']['files_per_second']} files/s)", file=sys.stderr)
+    if args.report == '-':
+        json.dump(report, sys.stdout, indent=2)
+    elif args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,18 @@
+"""
+Settings shared by the web process, the CLI and the workers.
+
+Kept free of heavy imports (and of logging setup), so reading them never
+loads fitz into a process that only dispatches work.
+"""
+
+# Compress PDF presets: level -> (render DPI, JPEG quality)
+COMPRESSION_LEVELS = {
+    'extreme': (50, 20),
+    'recommended': (72, 40),
+    'less': (100, 60),
+}
+
+# compress_pdf keeps bilevel (text) pages at this multiple of the target DPI:
+# at one bit per pixel they are still smaller than a JPEG at the target DPI,
+# and text stays legible. Admission control accounts for the extra pixels.
+COMPRESS_BILEVEL_SCALE = 2
@@ -0,0 +1,174 @@
+import io
+import os
+import shutil
+import secrets
+import logging
+from urllib.parse import quote
+from zlib import adler32
+
+from flask import current_app, jsonify, redirect, request
+from werkzeug.utils import send_file as _send_file
+
+import state
+from storage import store
+
+logger = logging.getLogger(__name__)
+
+# Hand the transfer to the front proxy instead of streaming it from Python:
+#   'x-accel-redirect' (nginx) - needs an internal location serving STORAGE_ROOT, e.g.
+#       location /_temp/ { internal; alias /srv/app/temp/; }
+#   'x-sendfile' (Apache mod_xsendfile, lighttpd) - the absolute path is sent
+OFFLOAD = os.environ.get('DELIVERY_OFFLOAD', '').lower()
+ACCEL_PREFIX = os.environ.get('DELIVERY_ACCEL_PREFIX', '/_temp/')
+
+
+class SingleUseFile(io.FileIO):
+    """
+    Output file that deletes itself once it has been sent completely.
+
+    WSGI servers stream wsgi.file_wrapper bodies by reading (and, in
+    waitress, seeking) the file object, then close it when the transfer
+    ends or the client goes away. Only a complete transfer leaves the
+    position at the end of the file, so an interrupted download keeps
+    the file for a Range retry and the periodic cleanup removes it later.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path, 'rb')
+        self.path = path
+        self.size = os.fstat(self.fileno()).st_size
+        self.delete_when_sent = True
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        sent = self.tell() >= self.size
+        super().close()
+        if sent and self.delete_when_sent:
+            remove_paths(self.path)
+
+
+def remove_paths(*paths) -> None:
+    """Delete files or directories, ignoring ones already gone or still in use."""
+    for path in paths:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove {path}: {e}")
+
+
+def _etag(path: str, stat: os.stat_result) -> str:
+    # Same recipe as werkzeug's send_file
+    check = adler32(path.encode()) & 0xFFFFFFFF
+    return f"{stat.st_mtime}-{stat.st_size}-{check}"
+
+
+def _offload(path: str, download_name: str, mimetype: str = None):
+    """Response without a body that tells the proxy which file to send."""
+    response = _send_file(
+        path, request.environ, mimetype=mimetype, as_attachment=True, download_name=download_name,
+        conditional=False, etag=False, use_x_sendfile=True, response_class=current_app.response_class,
+    )
+    if OFFLOAD == 'x-accel-redirect':
+        relative = os.path.relpath(os.path.abspath(path), store.disk.root)
+        del response.headers['X-Sendfile']
+        response.headers['X-Accel-Redirect'] = ACCEL_PREFIX.rstrip('/') + '/' + quote(relative.replace(os.sep, '/'))
+        # nginx sets the length of the file it sends
+        del response.headers['Content-Length']
+    return response
+
+
+def _is_offloadable(path: str) -> bool:
+    # Files on the RAM backend are small; Python sends those itself
+    return OFFLOAD in ('x-accel-redirect', 'x-sendfile') and store.disk.contains(path)
+
+
+def register_output(path: str, download_name: str, single_use: bool = True, mimetype: str = None) -> str:
+    """
+    Record an output in the shared metadata store, so that any process or
+    node can serve it at /outputs/<id> until it is downloaded or expires.
+
+    Returns:
+        Output id.
+    """
+    output_id = secrets.token_hex(16)
+    state.metadata.put('outputs', output_id, {
+        'path': os.path.abspath(path), 'name': download_name, 'single_use': single_use,
+        'mimetype': mimetype, 'node': state.NODE_ID, 'node_url': state.NODE_URL,
+    }, ttl=store.max_age)
+    return output_id
+
+
+def send_registered(output_id: str):
+    """
+    Serve a registered output by id, from any node.
+
+    The file is sent directly when this node can read it (same host, or a
+    STORAGE_ROOT shared between hosts). Otherwise the client is redirected
+    to the node that wrote it, if that node set NODE_URL.
+    """
+    record = state.metadata.get('outputs', output_id) if len(output_id) == 32 else None
+    if record is None:
+        return jsonify({"error": "Unknown or expired output"}), 404
+    if os.path.exists(record['path']):
+        return send_output(record['path'], record['name'], record['single_use'], record['mimetype'],
+                           output_id=output_id)
+    if record['node'] != state.NODE_ID and record['node_url']:
+        return redirect(f"{record['node_url']}/outputs/{output_id}", code=307)
+    state.metadata.delete('outputs', output_id)
+    return jsonify({"error": "Output has expired"}), 404
+
+
+def send_output(path: str, download_name: str, single_use: bool = True, mimetype: str = None,
+                output_id: str = None):
+    """
+    Send a generated file as a download.
+
+    Supports conditional GET (ETag / If-None-Match, Last-Modified) and
+    single Range requests. The body is handed to the server's file wrapper,
+    so waitress streams it from its I/O loop rather than a worker thread.
+    With DELIVERY_OFFLOAD set, the proxy sends the file instead.
+
+    Args:
+        path: File to send.
+        download_name: File name offered to the client.
+        single_use: Delete the file as soon as a full (200) transfer completes.
+            Offloaded files are left to the periodic cleanup, since the proxy
+            reads them after the response has been returned.
+        mimetype: Content type (guessed from download_name by default).
+        output_id: Registered id of the output (a new one is registered by default).
+
+    Returns:
+        Flask response. Its Content-Location (/outputs/<id>) stays valid on
+        every node until the file is deleted or expires, e.g. to resume the
+        download behind a load balancer.
+    """
+    output_id = output_id or register_output(path, download_name, single_use, mimetype)
+    if _is_offloadable(path):
+        response = _offload(path, download_name, mimetype)
+        response.headers['Content-Location'] = f"/outputs/{output_id}"
+        return response
+
+    stat = os.stat(path)
+    file = SingleUseFile(path) if single_use else open(path, 'rb')
+    try:
+        response = _send_file(
+            file, request.environ, mimetype=mimetype, as_attachment=True, download_name=download_name,
+            conditional=False, etag=_etag(os.path.abspath(path), stat), last_modified=stat.st_mtime,
+            response_class=current_app.response_class,
+        )
+        response.content_length = stat.st_size
+        response.accept_ranges = 'bytes'
+        response = response.make_conditional(request.environ, accept_ranges=True, complete_length=stat.st_size)
+    except Exception:
+        file.close()
+        raise
+
+    if single_use and response.status_code != 200:
+        # 206 / 304: the client is resuming or already has it, keep the file
+        file.delete_when_sent = False
+    response.headers['Content-Location'] = f"/outputs/{output_id}"
+    return response
@@ -0,0 +1,522 @@
+import os
+import math
+import zlib
+import struct
+import secrets
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import cancellation
+
+logger = logging.getLogger(__name__)
+
+# Resolution assumed when an image carries no density information
+# (same default as PyMuPDF, so page sizes don't change).
+DEFAULT_DPI = 96
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Target page sizes for the downscaling mode, portrait, in points
+PAGE_SIZES = {
+    'a4': (595.28, 841.89),
+    'letter': (612.0, 792.0),
+}
+
+# SOF markers PDF's DCTDecode handles: baseline, extended sequential, progressive
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2}
+_JPEG_ALL_SOF_MARKERS = _JPEG_SOF_MARKERS | {0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+# EXIF orientation -> where the stored image's bottom-left, bottom-right and
+# top-left corners end up on the displayed page.
+_ORIENTATION_CORNERS = {
+    1: ('BL', 'BR', 'TL'),
+    2: ('BR', 'BL', 'TR'),
+    3: ('TR', 'TL', 'BR'),
+    4: ('TL', 'TR', 'BL'),
+    5: ('TR', 'BR', 'TL'),
+    6: ('TL', 'BL', 'TR'),
+    7: ('BL', 'TL', 'BR'),
+    8: ('BR', 'TR', 'BL'),
+}
+
+
+class EmbeddableImage:
+    """
+    An image ready to be written as a PDF XObject.
+
+    ``chunks`` lists (offset, length) ranges of ``path`` that form the
+    stream data, so encoded image data is copied from disk as-is. For
+    images that had to be decoded, ``data`` holds the encoded stream instead.
+    """
+
+    def __init__(self, width: int, height: int, colorspace, bpc: int, filter_name: str,
+                 path: str = None, chunks: list = None, data: bytes = None,
+                 decode_parms: str = None, decode: str = None, smask: 'EmbeddableImage' = None,
+                 dpi: tuple = (DEFAULT_DPI, DEFAULT_DPI), orientation: int = 1):
+        self.width = width
+        self.height = height
+        self.colorspace = colorspace
+        self.bpc = bpc
+        self.filter_name = filter_name
+        self.path = path
+        self.chunks = chunks
+        self.data = data
+        self.decode_parms = decode_parms
+        self.decode = decode
+        self.smask = smask
+        self.dpi = dpi
+        self.orientation = orientation
+
+    @property
+    def length(self) -> int:
+        if self.data is not None:
+            return len(self.data)
+        return sum(length for _, length in self.chunks)
+
+    def page_size(self) -> tuple:
+        """Displayed page size in points, honouring density and orientation."""
+        width_pt = self.width * 72.0 / self.dpi[0]
+        height_pt = self.height * 72.0 / self.dpi[1]
+        if self.orientation in (5, 6, 7, 8):
+            return height_pt, width_pt
+        return width_pt, height_pt
+
+    def display_pixels(self) -> tuple:
+        """Pixel dimensions once EXIF orientation is applied."""
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+
+
+def fit_to_page(display_size: tuple, page_size: str) -> tuple:
+    """
+    Fit content of the given aspect onto a named page size, centred.
+    The page is turned landscape for landscape content.
+
+    Returns:
+        (page_width, page_height, (x, y, width, height)) in points.
+    """
+    page_w, page_h = PAGE_SIZES[page_size]
+    content_w, content_h = display_size
+    if content_w > content_h:
+        page_w, page_h = page_h, page_w
+    scale = min(page_w / content_w, page_h / content_h)
+    w, h = content_w * scale, content_h * scale
+    return page_w, page_h, ((page_w - w) / 2, (page_h - h) / 2, w, h)
+
+
+def _read_exif_orientation(payload: bytes) -> int:
+    """Extract the orientation tag from an APP1 Exif payload (after 'Exif\\0\\0')."""
+    if len(payload) < 8:
+        return 1
+    endian = '<' if payload[:2] == b'II' else '>'
+    ifd_offset = struct.unpack(endian + 'I', payload[4:8])[0]
+    if ifd_offset + 2 > len(payload):
+        return 1
+    count = struct.unpack(endian + 'H', payload[ifd_offset:ifd_offset + 2])[0]
+    for i in range(count):
+        entry = ifd_offset + 2 + i * 12
+        if entry + 12 > len(payload):
+            break
+        tag, _, _, value = struct.unpack(endian + 'HHIH', payload[entry:entry + 10])
+        if tag == 0x0112:
+            return value if value in _ORIENTATION_CORNERS else 1
+    return 1
+
+
+def probe_jpeg(path: str) -> Optional[EmbeddableImage]:
+    """
+    Read a JPEG's dimensions, components, density and orientation from its
+    header segments only. Returns None when it can't be passed through.
+    """
+    dpi = (DEFAULT_DPI, DEFAULT_DPI)
+    orientation = 1
+    adobe = False
+
+    with open(path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            byte = f.read(1)
+            if not byte:
+                return None
+            if byte != b'\xff':
+                continue
+            marker = f.read(1)
+            while marker == b'\xff':  # fill bytes
+                marker = f.read(1)
+            if not marker:
+                return None
+            marker = marker[0]
+            if marker in _JPEG_STANDALONE_MARKERS:
+                continue
+            length = struct.unpack('>H', f.read(2))[0]
+
+            if marker in _JPEG_ALL_SOF_MARKERS:
+                precision, height, width, components = struct.unpack('>BHHB', f.read(6))
+                if marker not in _JPEG_SOF_MARKERS or precision != 8 or components not in (1, 3, 4):
+                    return None
+                break
+
+            if marker == 0xDA:  # start of scan before any frame header
+                return None
+
+            segment = f.read(length - 2)
+            if marker == 0xE0 and segment[:5] == b'JFIF\x00' and len(segment) >= 12:
+                units, x_density, y_density = struct.unpack('>BHH', segment[7:12])
+                if units in (1, 2) and x_density and y_density:
+                    factor = 2.54 if units == 2 else 1.0
+                    dpi = (x_density * factor, y_density * factor)
+            elif marker == 0xE1 and segment[:6] == b'Exif\x00\x00':
+                orientation = _read_exif_orientation(segment[6:])
+            elif marker == 0xEE and segment[:5] == b'Adobe':
+                adobe = True
+
+    colorspace = {1: '/DeviceGray', 3: '/DeviceRGB', 4: '/DeviceCMYK'}[components]
+    # Adobe CMYK JPEGs are stored inverted
+    decode = '[1 0 1 0 1 0 1 0]' if components == 4 and adobe else None
+    return EmbeddableImage(width, height, colorspace, 8, '/DCTDecode', path=path,
+                           chunks=[(0, os.path.getsize(path))], decode=decode,
+                           dpi=dpi, orientation=orientation)
+
+
+def probe_png(path: str) -> Optional[EmbeddableImage]:
+    """
+    Read a PNG's chunk table. Non-interlaced images without alpha have their
+    IDAT data embedded unchanged (PDF's FlateDecode understands PNG
+    predictors). Returns None when the image needs decoding.
+    """
+    idat = []
+    palette = None
+    dpi = (DEFAULT_DPI, DEFAULT_DPI)
+    header = None
+
+    with open(path, 'rb') as f:
+        if f.read(8) != b'\x89PNG\r\n\x1a\n':
+            return None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                return None
+            length, chunk_type = struct.unpack('>I4s', chunk_header)
+            if chunk_type == b'IDAT':
+                idat.append((f.tell(), length))
+                f.seek(length + 4, os.SEEK_CUR)
+                continue
+            if chunk_type == b'IEND':
+                break
+            data = f.read(length)
+            f.seek(4, os.SEEK_CUR)  # CRC
+            if chunk_type == b'IHDR':
+                header = struct.unpack('>IIBBBBB', data)
+            elif chunk_type == b'PLTE':
+                palette = data
+            elif chunk_type == b'tRNS':
+                return None  # transparency needs an SMask
+            elif chunk_type == b'pHYs':
+                ppu_x, ppu_y, unit = struct.unpack('>IIB', data)
+                if unit == 1 and ppu_x and ppu_y:
+                    dpi = (round(ppu_x * 0.0254), round(ppu_y * 0.0254))
+
+    if not header or not idat:
+        return None
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if interlace or color_type not in (0, 2, 3):
+        return None
+
+    if color_type == 3:
+        if not palette:
+            return None
+        colorspace = f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex()}>]"
+        colors = 1
+    elif color_type == 2:
+        colorspace, colors = '/DeviceRGB', 3
+    else:
+        colorspace, colors = '/DeviceGray', 1
+
+    decode_parms = f"<< /Predictor 15 /Colors {colors} /BitsPerComponent {bit_depth} /Columns {width} >>"
+    return EmbeddableImage(width, height, colorspace, bit_depth, '/FlateDecode', path=path,
+                           chunks=idat, decode_parms=decode_parms, dpi=dpi)
+
+
+def decode_image(path: str) -> EmbeddableImage:
+    """Fallback: decode with PIL and re-encode as Flate (alpha becomes an SMask)."""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        dpi = img.info.get('dpi') or (DEFAULT_DPI, DEFAULT_DPI)
+        dpi = tuple(float(v) or DEFAULT_DPI for v in dpi)
+        has_alpha = img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+        if has_alpha:
+            img = img.convert('RGBA')
+        smask = None
+        if has_alpha:
+            alpha = img.getchannel('A')
+            smask = EmbeddableImage(img.width, img.height, '/DeviceGray', 8, '/FlateDecode',
+                                    data=zlib.compress(alpha.tobytes(), 6))
+        gray = img.mode in ('1', 'L', 'LA', 'I', 'F')
+        base = img.convert('L' if gray else 'RGB')
+        return EmbeddableImage(base.width, base.height, '/DeviceGray' if gray else '/DeviceRGB', 8,
+                               '/FlateDecode', data=zlib.compress(base.tobytes(), 6),
+                               smask=smask, dpi=dpi)
+
+
+def probe_image(path: str) -> Optional[EmbeddableImage]:
+    """Header-only probe; None if the image cannot be embedded as-is."""
+    with open(path, 'rb') as f:
+        signature = f.read(8)
+    if signature[:2] == b'\xff\xd8':
+        return probe_jpeg(path)
+    if signature == b'\x89PNG\r\n\x1a\n':
+        return probe_png(path)
+    return None
+
+
+def load_image(path: str) -> EmbeddableImage:
+    """Probe an image for pass-through embedding, decoding only when unavoidable."""
+    probed = probe_image(path)
+    if probed is None:
+        logger.info(f"Decoding {os.path.basename(path)} (not embeddable as-is)")
+        probed = decode_image(path)
+    return probed
+
+
+class StreamingPDFWriter:
+    """
+    Minimal PDF writer that appends one image page at a time directly to
+    the output file. Only offsets are kept in memory, so memory use does not
+    grow with the number or size of images.
+    """
+
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, output_path: str):
+        self._file = open(output_path, 'wb')
+        self._offsets = {}
+        self._next_object = 3
+        self._page_refs = []
+        self._file.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _allocate(self) -> int:
+        number = self._next_object
+        self._next_object += 1
+        return number
+
+    def _begin_object(self, number: int) -> None:
+        self._offsets[number] = self._file.tell()
+        self._file.write(f"{number} 0 obj\n".encode())
+
+    def _write_object(self, number: int, body: str) -> None:
+        self._begin_object(number)
+        self._file.write(body.encode('latin-1') + b"\nendobj\n")
+
+    def _write_image(self, image: EmbeddableImage) -> int:
+        smask_ref = self._write_image(image.smask) if image.smask else None
+        number = self._allocate()
+        entries = [
+            "/Type /XObject", "/Subtype /Image",
+            f"/Width {image.width}", f"/Height {image.height}",
+            f"/ColorSpace {image.colorspace}", f"/BitsPerComponent {image.bpc}",
+            f"/Filter {image.filter_name}", f"/Length {image.length}",
+        ]
+        if image.decode_parms:
+            entries.append(f"/DecodeParms {image.decode_parms}")
+        if image.decode:
+            entries.append(f"/Decode {image.decode}")
+        if smask_ref:
+            entries.append(f"/SMask {smask_ref} 0 R")
+
+        self._begin_object(number)
+        self._file.write(f"<< {' '.join(entries)} >>\nstream\n".encode('latin-1'))
+        if image.data is not None:
+            self._file.write(image.data)
+        else:
+            with open(image.path, 'rb') as src:
+                for offset, length in image.chunks:
+                    src.seek(offset)
+                    _copy_range(src, self._file, length)
+        self._file.write(b"\nendstream\nendobj\n")
+        return number
+
+    def add_image_page(self, image: EmbeddableImage, page_size: str = None) -> None:
+        """
+        Append a page showing the image. By default the page is exactly the
+        size of the image; with a named page_size the image is fitted onto it.
+        """
+        if page_size:
+            page_w, page_h, (x, y, w, h) = fit_to_page(image.page_size(), page_size)
+        else:
+            page_w, page_h = image.page_size()
+            x, y, w, h = 0, 0, page_w, page_h
+        image_ref = self._write_image(image)
+
+        corners = {'BL': (x, y), 'BR': (x + w, y), 'TL': (x, y + h), 'TR': (x + w, y + h)}
+        bl, br, tl = (corners[c] for c in _ORIENTATION_CORNERS.get(image.orientation, _ORIENTATION_CORNERS[1]))
+        matrix = (br[0] - bl[0], br[1] - bl[1], tl[0] - bl[0], tl[1] - bl[1], bl[0], bl[1])
+        content = ("q %s cm /Im0 Do Q" % " ".join(f"{v:.4f}" for v in matrix)).encode()
+
+        content_ref = self._allocate()
+        self._begin_object(content_ref)
+        self._file.write(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream\nendobj\n")
+
+        page_ref = self._allocate()
+        self._write_object(page_ref, (
+            f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {page_w:.4f} {page_h:.4f}] "
+            f"/Resources << /XObject << /Im0 {image_ref} 0 R >> >> /Contents {content_ref} 0 R >>"
+        ))
+        self._page_refs.append(page_ref)
+
+    def close(self) -> None:
+        """Write the page tree, catalog, cross-reference table and trailer."""
+        kids = " ".join(f"{ref} 0 R" for ref in self._page_refs)
+        self._write_object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_refs)} >>")
+        self._write_object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>")
+
+        xref_offset = self._file.tell()
+        size = self._next_object
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for number in range(1, size):
+            lines.append(f"{self._offsets[number]:010d} 00000 n \n")
+        lines.append(f"trailer\n<< /Size {size} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self._file.write("".join(lines).encode())
+        self._file.close()
+
+    def abort(self) -> None:
+        self._file.close()
+
+
+def _copy_range(src, dst, length: int) -> None:
+    while length > 0:
+        block = src.read(min(COPY_BUFFER_SIZE, length))
+        if not block:
+            raise IOError("Unexpected end of image data")
+        dst.write(block)
+        length -= len(block)
+
+
+def downscale_image(path: str, output_path: str, target: tuple, quality: int) -> str:
+    """
+    Decode an image, apply its EXIF orientation and shrink it to fit within
+    target (width, height) pixels, saving a JPEG. Runs in a pool process.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as img:
+        if img.format == 'JPEG':
+            # libjpeg can decode directly at 1/2, 1/4 or 1/8 scale
+            orientation = img.getexif().get(0x0112, 1)
+            stored_target = (target[1], target[0]) if orientation in (5, 6, 7, 8) else target
+            img.draft(None, stored_target)
+        img = ImageOps.exif_transpose(img)
+
+        if 'A' in img.getbands() or (img.mode == 'P' and 'transparency' in img.info):
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, 'white')
+            img.paste(rgba, mask=rgba.getchannel('A'))
+        elif img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        img.thumbnail(target, Image.LANCZOS)
+        img.save(output_path, format='JPEG', quality=quality, optimize=True)
+    return output_path
+
+
+def _display_pixels(path: str, probed: Optional[EmbeddableImage]) -> tuple:
+    if probed is not None:
+        return probed.display_pixels()
+    from PIL import Image
+    with Image.open(path) as img:  # reads the header only
+        width, height = img.size
+        if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            return height, width
+        return width, height
+
+
+def write_images_pdf(image_paths: List[str], output_path: str, page_size: str = None,
+                     dpi: int = 150, quality: int = 85, workers: int = None) -> int:
+    """
+    Write one page per image to output_path, streaming image data from disk.
+
+    Args:
+        image_paths: Images in page order.
+        output_path: Output PDF.
+        page_size: None keeps each image at its natural size. 'a4' or
+                   'letter' fits images onto that page size, and images with
+                   more pixels than the page needs at ``dpi`` are downscaled
+                   (in parallel, in a process pool) and re-encoded as JPEG.
+        dpi: Target resolution for page_size mode.
+        quality: JPEG quality for downscaled images.
+        workers: Process pool size (default: CPU count).
+
+    Returns:
+        Number of pages written.
+    """
+    if page_size and page_size not in PAGE_SIZES:
+        raise ValueError(f"Unknown page size: {page_size}")
+
+    writer = StreamingPDFWriter(output_path)
+    if not page_size:
+        try:
+            for path in image_paths:
+                cancellation.check()
+                writer.add_image_page(load_image(path))
+        except Exception:
+            writer.abort()
+            raise
+        writer.close()
+        return len(image_paths)
+
+    # Decide per image from its header: pass through, or downscale
+    plan = []
+    for index, path in enumerate(image_paths):
+        probed = probe_image(path)
+        display = _display_pixels(path, probed)
+        _, _, (_, _, fit_w, fit_h) = fit_to_page(display, page_size)
+        target = (math.ceil(fit_w * dpi / 72.0), math.ceil(fit_h * dpi / 72.0))
+        if display[0] <= target[0] and display[1] <= target[1]:
+            plan.append((path, probed, None))
+        else:
+            scaled_path = os.path.join(os.path.dirname(output_path) or '.',
+                                       f"scaled_{secrets.token_hex(4)}_{index}.jpg")
+            plan.append((path, None, (scaled_path, target)))
+
+    jobs = [job for _, _, job in plan if job]
+    executor = None
+    if len(jobs) > 1:
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    futures = {}
+    completed = False
+    try:
+        for index, (path, _, job) in enumerate(plan):
+            if job and executor:
+                futures[index] = executor.submit(downscale_image, path, job[0], job[1], quality)
+
+        # Consume in page order; later images keep scaling in the background
+        for index, (path, probed, job) in enumerate(plan):
+            cancellation.check()
+            if job is None:
+                writer.add_image_page(probed or load_image(path), page_size)
+                continue
+            scaled_path = futures[index].result() if executor else downscale_image(path, job[0], job[1], quality)
+            try:
+                writer.add_image_page(load_image(scaled_path), page_size)
+            finally:
+                os.remove(scaled_path)
+        completed = True
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if not completed:
+            writer.abort()
+            for _, _, job in plan:
+                if job and os.path.exists(job[0]):
+                    os.remove(job[0])
+
+    writer.close()
+    logger.info(f"Wrote {len(plan)} pages ({len(jobs)} downscaled) to {output_path}")
+    return len(plan)
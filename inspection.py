@@ -0,0 +1,199 @@
+import os
+import re
+import logging
+from collections import Counter
+from functools import lru_cache
+
+import cancellation
+import worker_pool
+
+logger = logging.getLogger(__name__)
+
+# Inputs with more pages are rejected before any work is queued (0 = no limit)
+MAX_PAGES = int(os.environ.get('INPUT_MAX_PAGES', 5000))
+
+# Seconds an inspection may take in its worker; slower (hostile or badly
+# damaged) files are rejected
+INSPECT_TIMEOUT = float(os.environ.get('INPUT_INSPECT_TIMEOUT', 10))
+
+# Image/text statistics read the resources of at most this many pages, spread over the document
+SAMPLE_PAGES = 200
+
+_HEADER = re.compile(rb'%PDF-(\d\.\d)')
+
+
+class InputRejected(Exception):
+    """An input file that an operation cannot process (unreadable, password protected, too large)."""
+
+    def __init__(self, message: str, info: dict = None):
+        super().__init__(message)
+        self.info = info or {}
+
+
+def _blank_info(file_path: str) -> dict:
+    return {
+        'file_size': os.path.getsize(file_path), 'version': None, 'valid': False, 'repaired': False,
+        'encrypted': False, 'needs_password': False, 'encryption': None, 'page_count': None,
+        'page_sizes': [], 'image_ratio': None, 'text_pages': None, 'image_pages': None, 'error': None,
+    }
+
+
+def _stream_length(doc, xref: int) -> int:
+    kind, value = doc.xref_get_key(xref, 'Length')
+    if kind == 'xref':
+        value = doc.xref_object(int(value.split()[0]))
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def inspect_pdf(file_path: str) -> dict:
+    """
+    Describe a PDF cheaply, without parsing content streams.
+
+    Only the header, the xref/trailer and the page tree are read (page
+    boxes and resource dictionaries), so this takes milliseconds even for
+    large files, unless fitz has to repair a damaged xref. Runs fitz on
+    untrusted input: call it through inspect(), which isolates it.
+
+    Args:
+        file_path: Path to the PDF.
+
+    Returns:
+        Dictionary with 'file_size', 'version', 'valid', 'repaired',
+        'encrypted', 'needs_password', 'encryption', 'page_count',
+        'page_sizes' (distinct [width, height, count] in points, rotation
+        applied), 'image_ratio' (estimated share of the file taken by
+        images), 'text_pages' and 'image_pages' (share of pages with fonts /
+        images) and 'error'.
+    """
+    import fitz  # preloaded by warmup in the workers; the web process never loads it
+
+    info = _blank_info(file_path)
+    with open(file_path, 'rb') as f:
+        header = _HEADER.search(f.read(1024))
+    if not header:
+        info['error'] = "Not a PDF file"
+        return info
+    info['version'] = header.group(1).decode()
+
+    try:
+        doc = fitz.open(file_path, filetype='pdf')
+    except Exception as e:
+        logger.info(f"Could not open {file_path}: {e}")
+        info['error'] = "Unreadable or damaged PDF"
+        return info
+
+    with doc:
+        info['repaired'] = bool(doc.is_repaired)
+        info['encrypted'] = bool(doc.is_encrypted)
+        info['needs_password'] = bool(doc.needs_pass)
+        if doc.needs_pass:
+            # The page tree is encrypted too
+            info['valid'] = True
+            return info
+
+        try:
+            info['encryption'] = doc.metadata.get('encryption')
+            kind, value = doc.xref_get_key(doc.pdf_catalog(), 'Version')
+            if kind == 'name' and value.lstrip('/') > info['version']:
+                info['version'] = value.lstrip('/')
+
+            page_count = doc.page_count
+            sizes = Counter()
+            for pno in range(page_count):
+                box = doc.page_cropbox(pno)
+                kind, rotation = doc.xref_get_key(doc.page_xref(pno), 'Rotate')
+                width, height = round(box.width), round(box.height)
+                if kind == 'int' and int(rotation) % 180:
+                    width, height = height, width
+                sizes[(width, height)] += 1
+
+            sample = sorted({pno * page_count // SAMPLE_PAGES for pno in range(SAMPLE_PAGES)}) \
+                if page_count > SAMPLE_PAGES else range(page_count)
+            images, text_pages, image_pages = set(), 0, 0
+            for pno in sample:
+                page_images = doc.get_page_images(pno)
+                images.update(image[0] for image in page_images)
+                image_pages += bool(page_images)
+                text_pages += bool(doc.get_page_fonts(pno))
+            sampled = max(len(sample), 1)
+            image_bytes = sum(_stream_length(doc, xref) for xref in images) * page_count / sampled
+        except Exception as e:
+            logger.info(f"Could not read the page tree of {file_path}: {e}")
+            info['error'] = "Damaged page tree"
+            return info
+
+        info.update({
+            'valid': True,
+            'page_count': page_count,
+            'page_sizes': [[w, h, count] for (w, h), count in sizes.most_common()],
+            'image_ratio': round(min(image_bytes / max(info['file_size'], 1), 1.0), 3),
+            'text_pages': round(text_pages / sampled, 3),
+            'image_pages': round(image_pages / sampled, 3),
+        })
+    return info
+
+
+@lru_cache(maxsize=256)
+def _inspect_cached(path: str, inode: int, size: int) -> dict:
+    try:
+        return worker_pool.run('inspect_document', path, timeout=INSPECT_TIMEOUT)
+    except cancellation.Cancelled:
+        raise
+    except worker_pool.WorkerError as e:
+        # Hung or crashed its worker: reject the file, the server is unaffected
+        logger.warning(f"Could not inspect {path}: {e}")
+        info = _blank_info(path)
+        info['error'] = "Too slow to read, damaged PDF" if isinstance(e, worker_pool.JobTimeout) \
+            else "Unreadable or damaged PDF"
+        return info
+
+
+def inspect(file_path: str) -> dict:
+    """
+    inspect_pdf() in a worker process (uploads are untrusted and fitz may
+    repair a damaged file by scanning all of it), limited to INSPECT_TIMEOUT.
+
+    Cached on the file's identity (routes check, then admit). Not on its
+    mtime: storage.touch() bumps that on every use of an uploaded document.
+    Inputs are never rewritten in place.
+    """
+    stat = os.stat(file_path)
+    return _inspect_cached(os.path.abspath(file_path), stat.st_ino, stat.st_size)
+
+
+def page_count(file_path: str) -> int:
+    """Page count from the inspection cache (0 if unknown)."""
+    return inspect(file_path)['page_count'] or 0
+
+
+def check_input(file_path: str, name: str, accept_encrypted: bool = False) -> dict:
+    """
+    Reject inputs an operation cannot process, before any work is queued.
+
+    Args:
+        file_path: Saved input file.
+        name: Original file name, for the error message.
+        accept_encrypted: Allow files that need a password (unlock).
+
+    Returns:
+        The inspection result.
+
+    Raises:
+        InputRejected: If the file is not a readable PDF, needs a password
+            or has more than MAX_PAGES pages.
+    """
+    return check_info(inspect(file_path), name, accept_encrypted)
+
+
+def check_info(info: dict, name: str, accept_encrypted: bool = False) -> dict:
+    """check_input() on an inspection result (e.g. from inspect_pdf() in a CLI worker)."""
+    if info['error']:
+        raise InputRejected(f"{name}: {info['error']}", info)
+    if info['needs_password'] and not accept_encrypted:
+        raise InputRejected(f"{name} is password protected, unlock it first", info)
+    if MAX_PAGES and (info['page_count'] or 0) > MAX_PAGES:
+        raise InputRejected(f"{name} has {info['page_count']} pages, the limit is {MAX_PAGES}", info)
+    return info
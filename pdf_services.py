@@ -1,46 +1,127 @@
-from pypdf import PdfWriter, PdfReader
 import fitz  # PyMuPDF
 import os
+import re
 import math
 import logging
 from typing import List, Tuple, Union
 
+import config
+import cancellation
+import image_ingest
+import inspection
+import text_index
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def merge_pdfs(file_paths: List[str], output_path: str) -> str:
+def linearize_pdf(output_path: str, password: str = "") -> None:
+    """
+    Rewrite a finished PDF in place as linearized ("fast web view"), so
+    viewers can show the first page before the whole file has arrived.
+
+    MuPDF can no longer write linearized files, so this is a post-processing
+    pass through qpdf (via pikepdf). Encryption is kept as is.
+
+    Args:
+        output_path: PDF to rewrite.
+        password: Owner password, if the file is encrypted.
+    """
+    try:
+        import pikepdf
+    except ImportError:
+        logger.warning("pikepdf is not installed, output is not linearized")
+        return
+
+    tmp_path = f"{output_path}.linearizing"
+    try:
+        with pikepdf.open(output_path, password=password) as pdf:
+            pdf.save(tmp_path, linearize=True, encryption=pdf.is_encrypted)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Save settings shared by every PDF this module writes.
+# "fast": drop unused objects, compress uncompressed streams and pack objects
+#   into object streams. Costs about as much as a plain save.
+# "compact": also merge duplicate objects and streams, recompress at maximum
+#   effort and subset embedded fonts. Slower, smallest output.
+WRITER_PROFILES = {
+    'fast': {'garbage': 1, 'deflate': True, 'use_objstms': 1},
+    'compact': {'garbage': 4, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True,
+                'use_objstms': 1, 'compression_effort': 100, 'subset_fonts': True},
+}
+DEFAULT_PROFILE = os.environ.get('PDF_WRITER_PROFILE', 'fast')
+
+def save_pdf(doc, output_path: str, profile: str = None, linearize: bool = False, **options) -> None:
+    """
+    Save a PyMuPDF document with the shared writer policy.
+    
+    Args:
+        doc: Document to save.
+        output_path: Destination path.
+        profile: Key of WRITER_PROFILES (default DEFAULT_PROFILE).
+        linearize: Rewrite the result as linearized (fast web view).
+        **options: Extra save() options, e.g. encryption settings.
+    """
+    profile = profile or DEFAULT_PROFILE
+    if profile not in WRITER_PROFILES:
+        raise ValueError(f"Unknown writer profile: {profile}")
+    settings = dict(WRITER_PROFILES[profile])
+    if settings.pop('subset_fonts', False):
+        doc.subset_fonts()
+    settings.update(options)
+    doc.save(output_path, **settings)
+    if linearize:
+        linearize_pdf(output_path, password=options.get('owner_pw') or "")
+
+def merge_pdfs(file_paths: List[str], output_path: str, linearize: bool = False, profile: str = None) -> str:
     """
     Merge multiple PDF files into one.
     
     Args:
         file_paths: List of absolute paths to the PDF files to merge.
         output_path: Absolute path where the merged PDF should be saved.
+        linearize: Write a linearized (fast web view) file.
+        profile: Writer profile, 'fast' (default) or 'compact' (see WRITER_PROFILES).
         
     Returns:
         The path to the output file if successful.
     """
-    merger = PdfWriter()
+    merged = fitz.open()
     
     try:
+        toc = []
         for path in file_paths:
-            if os.path.exists(path):
-                merger.append(path)
-            else:
+            cancellation.check()
+            if not os.path.exists(path):
                 logger.warning(f"File not found during merge: {path}")
+                continue
+            with fitz.open(path) as src:
+                offset = merged.page_count
+                merged.insert_pdf(src)
+                # Keep each file's bookmarks, pointing at the merged pages
+                toc.extend([level, title, page + offset if page > 0 else page]
+                           for level, title, page in src.get_toc())
+        if toc:
+            merged.set_toc(toc)
 
         # Write the merged PDF
-        merger.write(output_path)
+        save_pdf(merged, output_path, profile, linearize)
         logger.info(f"Successfully merged {len(file_paths)} files to {output_path}")
         return output_path
         
+    except cancellation.Cancelled:
+        raise
     except Exception as e:
         logger.error(f"Error merging PDFs: {e}")
         raise
     finally:
-        merger.close()
+        merged.close()
 
-def rotate_pdf(file_path: str, output_path: str, rotations: dict) -> str:
+def rotate_pdf(file_path: str, output_path: str, rotations: dict, linearize: bool = False,
+               profile: str = None) -> str:
     """
     Rotate specific pages of a PDF.
     
@@ -49,23 +130,22 @@ def rotate_pdf(file_path: str, output_path: str, rotations: dict) -> str:
         output_path: Path to save the rotated PDF.
         rotations: Dictionary where key is page number (0-indexed) and value is rotation angle (90, 180, 270).
                    Example: {0: 90, 2: 180}
+        linearize: Write a linearized (fast web view) file.
+        profile: Writer profile, 'fast' (default) or 'compact' (see WRITER_PROFILES).
                    
     Returns:
         Path to output file.
     """
-    reader = PdfReader(file_path)
-    writer = PdfWriter()
+    doc = fitz.open(file_path)
     
     try:
-        for i, page in enumerate(reader.pages):
-            angle = rotations.get(str(i), 0) # JSON keys might be strings
+        for i, page in enumerate(doc):
+            angle = int(rotations.get(str(i), 0)) # JSON keys might be strings
             if angle != 0:
-                # pypdf rotates clockwise
-                page.rotate(angle)
-            writer.add_page(page)
+                # Clockwise, added to the page's current rotation
+                page.set_rotation((page.rotation + angle) % 360)
             
-        with open(output_path, "wb") as f:
-            writer.write(f)
+        save_pdf(doc, output_path, profile, linearize)
             
         logger.info(f"Rotated PDF saved to {output_path}")
         return output_path
@@ -73,8 +153,11 @@ def rotate_pdf(file_path: str, output_path: str, rotations: dict) -> str:
     except Exception as e:
         logger.error(f"Error rotating PDF: {e}")
         raise
+    finally:
+        doc.close()
 
-def reorder_pdf(file_path: str, output_path: str, page_order: list) -> str:
+def reorder_pdf(file_path: str, output_path: str, page_order: list, linearize: bool = False,
+                profile: str = None) -> str:
     """
     Reorder PDF pages based on the provided order.
     
@@ -83,6 +166,8 @@ def reorder_pdf(file_path: str, output_path: str, page_order: list) -> str:
         output_path: Path to save the reordered PDF.
         page_order: List of page numbers in desired order (1-indexed).
                    Example: [3, 1, 2] means page 3 first, then page 1, then page 2.
+        linearize: Write a linearized (fast web view) file.
+        profile: Writer profile, 'fast' (default) or 'compact' (see WRITER_PROFILES).
                    
     Returns:
         Path to output file.
@@ -99,7 +184,7 @@ def reorder_pdf(file_path: str, output_path: str, page_order: list) -> str:
             else:
                 logger.warning(f"Page {page_num} is out of range, skipping")
         
-        new_doc.save(output_path)
+        save_pdf(new_doc, output_path, profile, linearize)
         new_doc.close()
         doc.close()
         
@@ -110,7 +195,115 @@ def reorder_pdf(file_path: str, output_path: str, page_order: list) -> str:
         logger.error(f"Error reordering PDF: {e}")
         raise
 
-def split_pdf(file_path: str, output_dir: str, page_selection: List[int] = None) -> List[str]:
+# Indirect references inside an object, and the back-references that would
+# pull in the page tree (or other pages, via annotations) when followed
+_REF = re.compile(rb"(\d+) 0 R")
+_BACKREF = re.compile(rb"/(?:Parent|P)\s+\d+\s+0\s+R")
+
+# Estimated bytes per object ("n 0 obj ... endobj" + xref entry) and per
+# file (catalog, page tree, trailer)
+OBJECT_OVERHEAD = 40
+PART_OVERHEAD = 1024
+
+class _PageSizeEstimator:
+    """
+    Estimate how many bytes each page contributes to a new file.
+
+    Every object is measured once (dictionary plus raw stream length, no
+    decoding), and a page's cost is the set of objects reachable from it, so
+    fonts and images shared between pages are only counted once per part.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.xref_count = doc.xref_length()
+        self._sizes = {}
+        self._refs = {}
+
+    def _measure(self, xref: int) -> List[int]:
+        if xref not in self._refs:
+            source = self.doc.xref_object(xref, compressed=True).encode()
+            self._refs[xref] = [int(r) for r in _REF.findall(_BACKREF.sub(b"", source))]
+            size = len(source) + OBJECT_OVERHEAD
+            if self.doc.xref_is_stream(xref):
+                kind, value = self.doc.xref_get_key(xref, "Length")
+                size += int(value) if kind == "int" else len(self.doc.xref_stream_raw(xref))
+            self._sizes[xref] = size
+        return self._refs[xref]
+
+    def page_objects(self, pno: int) -> dict:
+        """Objects reachable from a page, as {xref: estimated bytes}."""
+        objects = {}
+        stack = [self.doc.page_xref(pno)]
+        while stack:
+            xref = stack.pop()
+            if xref in objects or not 0 < xref < self.xref_count:
+                continue
+            stack.extend(self._measure(xref))
+            objects[xref] = self._sizes[xref]
+        return objects
+
+def _pack_pages(estimator: _PageSizeEstimator, pages: List[int], max_bytes: int) -> List[List[int]]:
+    """Group consecutive pages into parts whose estimated size stays under max_bytes."""
+    parts = []
+    current, included, size = [], set(), PART_OVERHEAD
+    for pno in pages:
+        objects = estimator.page_objects(pno)
+        added = sum(nbytes for xref, nbytes in objects.items() if xref not in included)
+        if current and size + added > max_bytes:
+            parts.append(current)
+            current, included, size = [], set(), PART_OVERHEAD
+            added = sum(objects.values())
+        current.append(pno)
+        included.update(objects)
+        size += added
+    if current:
+        parts.append(current)
+    return parts
+
+def _write_pages(doc, pages: List[int], output_path: str, linearize: bool = False, profile: str = None) -> int:
+    """Copy pages (in order) into a new PDF; returns the file size."""
+    part = fitz.open()
+    start = 0
+    # insert_pdf per run of consecutive pages; shared objects are copied once
+    for i in range(1, len(pages) + 1):
+        if i == len(pages) or pages[i] != pages[i - 1] + 1:
+            part.insert_pdf(doc, from_page=pages[start], to_page=pages[i - 1])
+            start = i
+    save_pdf(part, output_path, profile, linearize)
+    part.close()
+    return os.path.getsize(output_path)
+
+def _split_by_size(file_path: str, output_dir: str, max_bytes: int, page_selection: List[int] = None,
+                   linearize: bool = False, profile: str = None) -> List[str]:
+    doc = fitz.open(file_path)
+    try:
+        pages = [p for p in page_selection if 0 <= p < doc.page_count] if page_selection else list(range(doc.page_count))
+        estimator = _PageSizeEstimator(doc)
+        pending = _pack_pages(estimator, pages, max_bytes)
+        written = []
+        while pending:
+            cancellation.check()
+            part = pending.pop(0)
+            span = f"{part[0] + 1}" if len(part) == 1 else f"{part[0] + 1}-{part[-1] + 1}"
+            output_path = os.path.join(output_dir, f"part_{len(written) + 1}_pages_{span}.pdf")
+            size = _write_pages(doc, part, output_path, linearize, profile)
+            if size > max_bytes and len(part) > 1:
+                # Estimate was off (e.g. inherited resources): halve the part
+                os.remove(output_path)
+                middle = len(part) // 2
+                pending[:0] = [part[:middle], part[middle:]]
+                continue
+            if size > max_bytes:
+                logger.warning(f"Page {part[0] + 1} alone is {size} bytes, above the {max_bytes} byte limit")
+            written.append(output_path)
+        logger.info(f"Split {len(pages)} pages into {len(written)} parts (limit {max_bytes} bytes)")
+        return written
+    finally:
+        doc.close()
+
+def split_pdf(file_path: str, output_dir: str, page_selection: List[int] = None, max_bytes: int = None,
+              linearize: bool = False, profile: str = None) -> List[str]:
     """
     Split PDF into multiple files or extract specific pages.
     
@@ -120,90 +313,169 @@ def split_pdf(file_path: str, output_dir: str, page_selection: List[int] = None)
         page_selection: List of 0-indexed page numbers to extract. 
                         If None, splits all pages into individual files.
                         If provided, extracts those pages into a SINGLE new PDF.
+        max_bytes: Size mode: pack consecutive pages (of the selection, or the
+                   whole document) into as few parts as possible, each under
+                   max_bytes. Page sizes are estimated from their resources
+                   in one pass; a page that is larger on its own gets its own part.
+        linearize: Write linearized (fast web view) files.
+        profile: Writer profile, 'fast' (default) or 'compact' (see WRITER_PROFILES).
         
     Returns:
         List of paths to generated files.
     """
-    reader = PdfReader(file_path)
+    if max_bytes:
+        try:
+            return _split_by_size(file_path, output_dir, max_bytes, page_selection, linearize, profile)
+        except cancellation.Cancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error splitting PDF by size: {e}")
+            raise
+
+    doc = fitz.open(file_path)
     generated_files = []
     
     try:
         if page_selection:
             # Extract specific pages into ONE new PDF
-            writer = PdfWriter()
-            for page_num in page_selection:
-                if 0 <= page_num < len(reader.pages):
-                    writer.add_page(reader.pages[page_num])
+            pages = [page_num for page_num in page_selection if 0 <= page_num < doc.page_count]
             
             output_filename = f"extracted_pages.pdf"
             output_path = os.path.join(output_dir, output_filename)
             
-            with open(output_path, "wb") as f:
-                writer.write(f)
+            _write_pages(doc, pages, output_path, linearize, profile)
             
             generated_files.append(output_path)
             logger.info(f"Extracted {len(page_selection)} pages to {output_path}")
             
         else:
             # Split ALL pages into individual files
-            for i, page in enumerate(reader.pages):
-                writer = PdfWriter()
-                writer.add_page(page)
-                
+            for i in range(doc.page_count):
+                cancellation.check()
                 output_filename = f"page_{i+1}.pdf"
                 output_path = os.path.join(output_dir, output_filename)
                 
-                with open(output_path, "wb") as f:
-                    writer.write(f)
+                _write_pages(doc, [i], output_path, linearize, profile)
                 
                 generated_files.append(output_path)
             logger.info(f"Split PDF into {len(generated_files)} individual files")
             
         return generated_files
 
+    except cancellation.Cancelled:
+        raise
     except Exception as e:
         logger.error(f"Error splitting PDF: {e}")
         raise
+    finally:
+        doc.close()
+
+# Output formats for pdf_to_images: format -> file extension
+IMAGE_FORMATS = {'jpeg': 'jpg', 'png': 'png', 'webp': 'webp'}
+
+def pdf_to_images(file_path: str, output_dir: str, pages: List[int] = None, dpi: int = 144,
+                  max_size: int = None, fmt: str = 'jpeg', quality: int = 85,
+                  grayscale: bool = False, clip: List[float] = None) -> List[str]:
+    """
+    Render pages of a PDF to image files.
 
-def pdf_to_images(file_path: str, output_dir: str) -> List[str]:
+    Takes the same arguments as render_pages().
+
+    Returns:
+        List of paths to generated images.
     """
-    Convert each page of a PDF into a JPG image.
+    return [path for _, path in render_pages(file_path, output_dir, pages, dpi, max_size, fmt, quality,
+                                             grayscale, clip)]
+
+def render_pages(file_path: str, output_dir: str, pages: List[int] = None, dpi: int = 144,
+                 max_size: int = None, fmt: str = 'jpeg', quality: int = 85,
+                 grayscale: bool = False, clip: List[float] = None) -> List[Tuple[int, str]]:
+    """
+    Render pages of a PDF to image files, reporting which page each file is.
     
     Args:
         file_path: Path to input PDF.
         output_dir: Directory to save output images.
+        pages: 0-indexed page numbers to render. None renders every page.
+        dpi: Render resolution (default 144, i.e. 2x zoom).
+        max_size: Optional cap in pixels for the longest side; lowers the
+                  effective DPI for thumbnails.
+        fmt: 'jpeg', 'png' or 'webp'.
+        quality: JPEG/WebP quality 1-100.
+        grayscale: Render in DeviceGray (1 byte per pixel instead of 3).
+        clip: Optional region [x0, y0, x1, y1] as fractions of the page (0-1).
         
     Returns:
-        List of paths to generated images.
+        (0-indexed page number, image path) pairs, in order. Pages outside
+        the document are skipped.
     """
     generated_files = []
+    ext = IMAGE_FORMATS.get(fmt)
+    if ext is None:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
     
     try:
         doc = fitz.open(file_path)
+        page_numbers = range(len(doc)) if pages is None else [p for p in pages if 0 <= p < len(doc)]
         
-        for i, page in enumerate(doc):
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2)) # 2x zoom for better quality
+        for i in page_numbers:
+            cancellation.check()
+            page = doc[i]
+            region = page.rect
+            if clip:
+                x0, y0, x1, y1 = clip
+                region = fitz.Rect(region.x0 + region.width * x0, region.y0 + region.height * y0,
+                                   region.x0 + region.width * x1, region.y0 + region.height * y1)
+            
+            zoom = dpi / 72.0
+            if max_size:
+                zoom = min(zoom, max_size / max(region.width, region.height))
+            
+            # Only the requested region is rasterized; no alpha channel
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace,
+                                  alpha=False, clip=region if clip else None)
             
-            output_filename = f"page_{i+1}.jpg"
+            output_filename = f"page_{i+1}.{ext}"
             output_path = os.path.join(output_dir, output_filename)
             
-            pix.save(output_path)
-            generated_files.append(output_path)
+            if fmt == 'jpeg':
+                pix.save(output_path, jpg_quality=quality)
+            elif fmt == 'webp':
+                pix.pil_save(output_path, format="WEBP", quality=quality)
+            else:
+                pix.save(output_path)
+            generated_files.append((i, output_path))
             
+        doc.close()
         logger.info(f"Converted PDF to {len(generated_files)} images in {output_dir}")
         return generated_files
         
+    except cancellation.Cancelled:
+        raise
     except Exception as e:
         logger.error(f"Error converting PDF to images: {e}")
         raise
 
-def images_to_pdf(image_paths: List[str], output_path: str) -> str:
+def images_to_pdf(image_paths: List[str], output_path: str, page_size: str = None,
+                  dpi: int = 150, quality: int = 85, linearize: bool = False, profile: str = None) -> str:
     """
-    Convert a list of images into a single PDF using PyMuPDF.
+    Convert a list of images into a single PDF, one page per image.
+    
+    JPEGs (and plain PNGs) are embedded byte-for-byte with no decode or
+    re-encode, and pages are streamed to disk as they are added, so memory
+    stays flat however many images there are.
     
     Args:
         image_paths: List of absolute paths to images.
         output_path: Path to save the output PDF.
+        page_size: Optional 'a4' or 'letter'. Images are fitted onto the page
+                   and oversized ones downscaled to ``dpi`` in parallel.
+        dpi: Target resolution when page_size is set.
+        quality: JPEG quality for downscaled images.
+        linearize: Write a linearized (fast web view) file.
+        profile: Writer profile. The streaming writer's output is already
+                 'fast'; 'compact' re-saves it to merge duplicate images.
         
     Returns:
         Path to output file.
@@ -212,27 +484,25 @@ def images_to_pdf(image_paths: List[str], output_path: str) -> str:
         if not image_paths:
             raise ValueError("No images provided")
 
-        doc = fitz.open()
-        
-        for path in image_paths:
-            img = fitz.open(path) # Open image as document
-            rect = img[0].rect # Get image dimensions
-            pdfbytes = img.convert_to_pdf() # Convert to PDF stream
-            img.close()
-            
-            imgPdf = fitz.open("pdf", pdfbytes) # Open stream as PDF
-            page = doc.new_page(width = rect.width, height = rect.height)
-            page.show_pdf_page(rect, imgPdf, 0) # Draw image PDF onto page
-            
-        doc.save(output_path)
+        image_ingest.write_images_pdf(image_paths, output_path, page_size=page_size, dpi=dpi, quality=quality)
+        if (profile or DEFAULT_PROFILE) != 'fast':
+            compact_path = f"{output_path}.compact"
+            with fitz.open(output_path) as doc:
+                save_pdf(doc, compact_path, profile)
+            os.replace(compact_path, output_path)
+        if linearize:
+            linearize_pdf(output_path)
         logger.info(f"Converted {len(image_paths)} images to PDF at {output_path}")
         return output_path
         
+    except cancellation.Cancelled:
+        raise
     except Exception as e:
         logger.error(f"Error converting images to PDF: {e}")
         raise
 
-def add_watermark(file_path: str, output_path: str, watermark_config: dict, image_path: str = None) -> str:
+def add_watermark(file_path: str, output_path: str, watermark_config: dict, image_path: str = None,
+                  linearize: bool = False, profile: str = None) -> str:
     """
     Add watermark (text or image) to PDF.
     
@@ -241,6 +511,8 @@ def add_watermark(file_path: str, output_path: str, watermark_config: dict, imag
         output_path: Output PDF
         watermark_config: Config dict (text, x, y, size, rotation, etc.)
         image_path: Path to image file for 'image' mode
+        linearize: Write a linearized (fast web view) file.
+        profile: Writer profile, 'fast' (default) or 'compact' (see WRITER_PROFILES).
     """
     try:
         doc = fitz.open(file_path)
@@ -262,6 +534,7 @@ def add_watermark(file_path: str, output_path: str, watermark_config: dict, imag
             img_ratio = img[0].rect.height / img[0].rect.width
         
         for page in doc:
+            cancellation.check()
             rect = page.rect
             x_pos = rect.width * x_pct
             y_pos = rect.height * y_pct
@@ -355,98 +628,550 @@ def add_watermark(file_path: str, output_path: str, watermark_config: dict, imag
                 page.show_pdf_page(target_rect, src_doc, 0, rotate=-rotate)
                 src_doc.close()
             
-        doc.save(output_path)
+        save_pdf(doc, output_path, profile, linearize)
         logger.info(f"Watermarked PDF saved to {output_path}")
         return output_path
         
+    except cancellation.Cancelled:
+        raise
     except Exception as e:
         logger.error(f"Error adding watermark: {e}")
         raise
 
-def compress_pdf(file_path: str, output_path: str, dpi: int = 72, quality: int = 40) -> str:
+# Indirect reference in PDF object source ("12 0 R")
+_REFERENCE = re.compile(r'\b(\d+) (\d+) R\b')
+
+def _object_digest(doc, xref: int, memo: dict) -> bytes:
+    """
+    Digest of an object and everything it references, by content: references
+    are replaced by the digests of their targets, so equal objects stored
+    twice (a font or scan embedded by each merged file) match.
+    """
+    import hashlib
+
+    if xref in memo:
+        return memo[xref]
+    memo[xref] = b'cycle'  # a reference back into the graph hashes as a marker
+    digest = hashlib.md5()
+    digest.update(_source_digest(doc, doc.xref_object(xref, compressed=True), memo))
+    if doc.xref_is_stream(xref):
+        digest.update(hashlib.md5(doc.xref_stream_raw(xref) or b'').digest())
+    memo[xref] = digest.digest()
+    return memo[xref]
+
+def _source_digest(doc, source: str, memo: dict) -> bytes:
+    """Digest of PDF object source with its references resolved (see _object_digest)."""
+    import hashlib
+
+    resolved = _REFERENCE.sub(lambda m: _object_digest(doc, int(m.group(1)), memo).hex(), source)
+    return hashlib.md5(resolved.encode()).digest()
+
+def _page_resources(doc, page) -> str:
+    """Source of the page's /Resources, inherited from the page tree if the page has none."""
+    xref = page.xref
+    while xref:
+        kind, value = doc.xref_get_key(xref, 'Resources')
+        if kind != 'null':
+            return value
+        kind, parent = doc.xref_get_key(xref, 'Parent')
+        xref = int(parent.split()[0]) if kind == 'xref' else 0
+    return ''
+
+def _page_fingerprint(doc, page, memo: dict = None) -> bytes:
+    """
+    Identify pages that render identically, without rendering them.
+
+    Hashes the page geometry, the decoded content stream and the whole
+    /Resources dictionary it draws with (inherited if need be): images,
+    fonts, form XObjects, graphics states, patterns, shadings and colour
+    spaces, by content, so the same scan or logo embedded twice matches.
+    Annotated pages only match themselves. The match is exact; pages that
+    merely look alike (two scans of one blank sheet) are not merged.
+
+    Args:
+        memo: Object digests shared between the pages of one document, so
+            resources used by every page are hashed once.
+
+    Returns:
+        A digest, or b'' when the page cannot be fingerprinted (never reused).
+    """
+    import hashlib
+
+    memo = {} if memo is None else memo
+    try:
+        digest = hashlib.md5()
+        digest.update(repr((tuple(page.rect), page.rotation, tuple(page.cropbox))).encode())
+        for xref in page.get_contents():  # none on blank pages
+            digest.update(doc.xref_stream(xref) or b'')
+        digest.update(_source_digest(doc, _page_resources(doc, page), memo))
+        kind, annots = doc.xref_get_key(page.xref, 'Annots')
+        if kind != 'null':
+            digest.update(f"{page.xref}:{annots}".encode())  # annotated pages only match themselves
+        return digest.digest()
+    except Exception as e:
+        logger.debug(f"Could not fingerprint page {page.number}: {e}")
+        return b''
+
+# Page classes for compress_pdf, decided at about CLASSIFY_DPI: 'color' if
+# more than COLOR_AREA of the page is saturated, 'gray' if more than
+# GRAY_AREA is flat mid-grey (photos, tints; anti-aliased text edges are not
+# flat), otherwise 'bilevel' (text and line art)
+CLASSIFY_DPI = 48
+COLOR_AREA = 0.001
+GRAY_AREA = 0.01
+
+# Bilevel pages are kept at this multiple of the target DPI (see config)
+BILEVEL_SCALE = config.COMPRESS_BILEVEL_SCALE
+
+def _classify_page(rgb) -> str:
+    """Label a low-resolution page render (H x W x 3 uint8 array) 'bilevel', 'gray' or 'color'."""
+    import numpy as np
+
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    chroma = np.maximum(np.maximum(r, g), b) - np.minimum(np.minimum(r, g), b)
+    if np.count_nonzero(chroma > 40) > COLOR_AREA * chroma.size:
+        return 'color'
+
+    gray = g  # the channels agree within the chroma threshold
+    # Local contrast over each pixel's 3x3 neighbourhood (separable max/min filters)
+    padded = np.pad(gray, 1, mode='edge')
+    rows_max = np.maximum(np.maximum(padded[:-2], padded[1:-1]), padded[2:])
+    rows_min = np.minimum(np.minimum(padded[:-2], padded[1:-1]), padded[2:])
+    local_max = np.maximum(np.maximum(rows_max[:, :-2], rows_max[:, 1:-1]), rows_max[:, 2:])
+    local_min = np.minimum(np.minimum(rows_min[:, :-2], rows_min[:, 1:-1]), rows_min[:, 2:])
+    flat_gray = (gray > 48) & (gray < 208) & (local_max - local_min < 32)
+    return 'gray' if np.count_nonzero(flat_gray) > GRAY_AREA * gray.size else 'bilevel'
+
+def _insert_rendered_page(new_page, page, dpi: int, quality: int) -> Tuple[str, int]:
+    """
+    Render `page` and draw it over the whole of `new_page`, encoded for its
+    class: 1-bit Flate at BILEVEL_SCALE x dpi for bilevel pages, otherwise
+    grey or colour JPEG at dpi. The class is decided on a CLASSIFY_DPI
+    render first, so only bilevel pages pay for the higher resolution.
+
+    Returns:
+        (page class, xref of the inserted image)
+    """
+    from PIL import Image
+    import io
+
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is None:
+        pix = page.get_pixmap(dpi=dpi)
+        page_class, img = 'color', Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    else:
+        # MuPDF keeps the decoded images of the page, so the second render
+        # does not decode scans again
+        small = page.get_pixmap(dpi=CLASSIFY_DPI, alpha=False, colorspace=fitz.csRGB)
+        page_class = _classify_page(np.frombuffer(small.samples_mv, dtype=np.uint8).reshape(small.height, small.width, 3))
+
+        if page_class == 'bilevel':
+            import zlib
+            pix = page.get_pixmap(dpi=dpi * BILEVEL_SCALE, alpha=False, colorspace=fitz.csGRAY)
+            gray = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width)
+            bits = np.packbits(gray >= 128, axis=1)  # 1 = white in DeviceGray
+            # Stored pre-compressed: the writer profiles leave Flate streams as they are
+            doc = new_page.parent
+            xref = doc.get_new_xref()
+            doc.update_object(xref, f"<< /Type /XObject /Subtype /Image /Width {pix.width} /Height {pix.height}"
+                                    f" /ColorSpace /DeviceGray /BitsPerComponent 1 >>")
+            doc.update_stream(xref, zlib.compress(bits.tobytes(), 6), compress=False)
+            doc.xref_set_key(xref, 'Filter', '/FlateDecode')
+            new_page.insert_image(new_page.rect, xref=xref)
+            return page_class, xref
+
+        if page_class == 'gray':
+            pix = page.get_pixmap(dpi=dpi, alpha=False, colorspace=fitz.csGRAY)
+            img = Image.frombytes("L", [pix.width, pix.height], pix.samples)
+        else:
+            pix = page.get_pixmap(dpi=dpi, alpha=False, colorspace=fitz.csRGB)
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+    img_buffer = io.BytesIO()
+    img.save(img_buffer, format="JPEG", quality=quality, optimize=True)
+    return page_class, new_page.insert_image(new_page.rect, stream=img_buffer.getvalue())
+
+def compress_pdf(file_path: str, output_path: str, dpi: int = 72, quality: int = 40, linearize: bool = False,
+                 profile: str = 'compact') -> str:
     """
     Compress PDF by re-rendering pages at lower DPI and quality.
+
+    Each page is encoded for its content: black-and-white pages as 1-bit
+    images, grayscale pages as grey JPEG and only colour pages as RGB JPEG.
+    Identical pages (repeated separators, cover sheets, letterheads) are
+    rendered and encoded once and share one image in the output.
     
     Args:
         file_path: Path to input PDF.
         output_path: Path to save output.
         dpi: Target DPI for rendering (default 72).
         quality: JPEG quality 1-100 (default 40, lower = smaller).
+        linearize: Write a linearized (fast web view) file.
+        profile: Writer profile (default 'compact').
         
     Returns:
         Path to output file.
     """
-    from PIL import Image
-    import io
-    
+    from collections import Counter
+
     try:
         src_doc = fitz.open(file_path)
         out_doc = fitz.open()
         
-        zoom = dpi / 72.0
-        mat = fitz.Matrix(zoom, zoom)
+        encoded = {}  # page fingerprint -> image xref in out_doc
+        digests = {}  # object digests, shared by the page fingerprints
+        reused = 0
+        classes = Counter()
         
         for page in src_doc:
-            pix = page.get_pixmap(matrix=mat)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format="JPEG", quality=quality, optimize=True)
-            img_bytes = img_buffer.getvalue()
-            
+            cancellation.check()
             new_page = out_doc.new_page(width=page.rect.width, height=page.rect.height)
-            new_page.insert_image(new_page.rect, stream=img_bytes)
+            fingerprint = _page_fingerprint(src_doc, page, digests)
+            if fingerprint in encoded:
+                new_page.insert_image(new_page.rect, xref=encoded[fingerprint])
+                reused += 1
+                continue
+
+            page_class, xref = _insert_rendered_page(new_page, page, dpi, quality)
+            classes[page_class] += 1
+            if fingerprint:
+                encoded[fingerprint] = xref
         
         src_doc.close()
-        out_doc.save(output_path, garbage=4, deflate=True)
+        save_pdf(out_doc, output_path, profile or 'compact', linearize)
         out_doc.close()
         
-        logger.info(f"Compressed PDF saved to {output_path}")
+        logger.info(f"Compressed PDF saved to {output_path} ({dict(classes)}, {reused} duplicate pages reused)")
         return output_path
         
+    except cancellation.Cancelled:
+        raise
     except Exception as e:
         logger.error(f"Error compressing PDF: {e}")
         raise
 
-def protect_pdf(file_path: str, output_path: str, user_pwd: str, owner_pwd: str, permissions: dict = None) -> str:
+# Image codecs by their last stream filter
+_CODECS = {
+    'DCTDecode': 'jpeg', 'JPXDecode': 'jpeg2000', 'JBIG2Decode': 'jbig2',
+    'CCITTFaxDecode': 'ccitt', 'FlateDecode': 'flate', 'LZWDecode': 'lzw', 'RunLengthDecode': 'rle',
+}
+_FONT_FILES = {'FontFile': 'type1', 'FontFile2': 'truetype', 'FontFile3': 'cff/opentype'}
+_SUBSET_PREFIX = re.compile(r'^/?[A-Z]{6}\+')
+
+def _refs(value: str) -> List[int]:
+    """Object numbers in a PDF reference or array of references ("12 0 R", "[12 0 R 13 0 R]")."""
+    return [int(num) for num in re.findall(r'(\d+) 0 R', value)]
+
+def _raw_length(doc, xref: int) -> int:
+    kind, value = doc.xref_get_key(xref, 'Length')
+    if kind == 'xref':
+        value = doc.xref_object(_refs(value)[0])
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return len(doc.xref_stream_raw(xref) or b'')
+
+def _font_descriptors(doc, font_xref: int) -> List[int]:
+    """FontDescriptor objects of a font dictionary (through DescendantFonts for Type0 fonts)."""
+    kind, value = doc.xref_get_key(font_xref, 'FontDescriptor')
+    if kind == 'xref':
+        return _refs(value)
+    descriptors = []
+    kind, value = doc.xref_get_key(font_xref, 'DescendantFonts')
+    if kind == 'xref':
+        value = doc.xref_object(_refs(value)[0])
+    for descendant in _refs(value) if kind in ('array', 'xref') else []:
+        kind, ref = doc.xref_get_key(descendant, 'FontDescriptor')
+        if kind == 'xref':
+            descriptors += _refs(ref)
+    return descriptors
+
+def _kb(size: int) -> str:
+    return f"{size / 1024:.1f} KB"
+
+def _suggest_compression(report: dict) -> List[dict]:
+    """Rank compression strategies for an analyze_pdf() report, best first."""
+    size = max(report['file_size'], 1)
+    categories = report['categories']
+    suggestions = []
+
+    large_images = [image for image in report['images'] if image['ppi'] and image['ppi'] > 150]
+    image_bytes = sum(image['bytes'] for image in large_images)
+    if image_bytes > 0.3 * size:
+        # Rasterizing is lossy for text, so only when the document is mostly images anyway
+        level = 'recommended' if categories['fonts'] + categories['content'] < 0.1 * size else 'less'
+        suggestions.append({
+            'action': 'compress', 'options': {'level': level},
+            'reason': f"{len(large_images)} images above 150 ppi make up {image_bytes * 100 // size}% of the file",
+            'estimated_savings': int(image_bytes * 0.7),
+        })
+
+    full_fonts = sum(font['bytes'] for font in report['fonts'] if font['embedded'] and not font['subset'])
+    duplicates = report['duplicates']['bytes']
+    if full_fonts + duplicates > 0.05 * size:
+        reasons = []
+        if full_fonts:
+            reasons.append(f"{_kb(full_fonts)} of fully embedded fonts")
+        if duplicates:
+            reasons.append(f"{_kb(duplicates)} of duplicate streams")
+        suggestions.append({
+            'action': 'resave', 'options': {'profile': 'compact'},
+            'reason': ' and '.join(reasons),
+            'estimated_savings': int(full_fonts * 0.8) + duplicates,
+        })
+
+    uncompressed = report['uncompressed_bytes']
+    if uncompressed > 0.05 * size:
+        suggestions.append({
+            'action': 'resave', 'options': {'profile': 'fast'},
+            'reason': f"{_kb(uncompressed)} of uncompressed streams",
+            'estimated_savings': int(uncompressed * 0.6),
+        })
+
+    suggestions.sort(key=lambda suggestion: suggestion['estimated_savings'], reverse=True)
+    return suggestions
+
+def analyze_pdf(file_path: str) -> dict:
     """
-    Encrypt PDF with user and owner passwords and set permissions.
+    Break the size of a PDF down by what uses it, and suggest how to compress it.
+
+    Walks the xref table once, reading object dictionaries and stored
+    (compressed) stream lengths; stream data is only read to confirm
+    duplicates among streams of identical length. Content streams are not
+    interpreted, so image resolution is relative to the width of the first
+    page that uses the image (exact for full-page scans, a lower bound for
+    smaller placements). Shared resources count towards the first page
+    using them.
+
+    Args:
+        file_path: Path to the PDF.
+
+    Returns:
+        Dictionary with 'file_size', 'page_count', 'object_count',
+        'categories' (bytes for images, fonts, content, forms, metadata,
+        embedded_files, other_streams and structure - everything outside
+        streams), 'images' and 'fonts' (largest first), 'duplicates',
+        'uncompressed_bytes', 'pages' (bytes per page) and 'suggestions'
+        (ranked, with estimated savings).
     """
+    import hashlib
+
+    doc = fitz.open(file_path)
     try:
-        reader = PdfReader(file_path)
-        writer = PdfWriter()
-        writer.append(reader)
-        
-        # Permissions mapping
-        # print, modify, copy, annot-forms, fill-forms, extract, assemble, print-high
-        perms = {
-            'print': permissions.get('print', True) if permissions else True,
-            'copy': permissions.get('copy', True) if permissions else True,
-            'modify': permissions.get('modify', True) if permissions else True
+        if doc.needs_pass:
+            raise ValueError("The PDF is password protected")
+
+        categories = dict.fromkeys(
+            ('images', 'fonts', 'content', 'forms', 'metadata', 'embedded_files', 'other_streams'), 0)
+        streams = {}        # xref -> (category, raw length)
+        images = {}         # xref -> image details
+        descriptors = {}    # FontDescriptor xref -> font details
+        simple_fonts = []   # font dictionaries without a descriptor (standard 14, not embedded)
+        by_length = {}      # (length, filter) -> stream xrefs, duplicate candidates
+        uncompressed = 0
+
+        for xref in range(1, doc.xref_length()):
+            try:
+                obj_type = doc.xref_get_key(xref, 'Type')[1]
+                if obj_type == '/FontDescriptor':
+                    name = doc.xref_get_key(xref, 'FontName')[1]
+                    font = {'name': name.lstrip('/'), 'format': None, 'subset': bool(_SUBSET_PREFIX.match(name)),
+                            'embedded': False, 'bytes': 0, 'file': None}
+                    for key, font_format in _FONT_FILES.items():
+                        ref_kind, ref = doc.xref_get_key(xref, key)
+                        if ref_kind == 'xref':
+                            font.update(format=font_format, embedded=True, file=_refs(ref)[0])
+                    descriptors[xref] = font
+                elif obj_type == '/Font':
+                    font_subtype = doc.xref_get_key(xref, 'Subtype')[1]
+                    if font_subtype not in ('/Type0', '/Type3') and doc.xref_get_key(xref, 'FontDescriptor')[0] == 'null':
+                        simple_fonts.append({'name': doc.xref_get_key(xref, 'BaseFont')[1].lstrip('/'),
+                                             'format': font_subtype.lstrip('/'), 'subset': False,
+                                             'embedded': False, 'bytes': 0})
+                if not doc.xref_is_stream(xref):
+                    continue
+                subtype = doc.xref_get_key(xref, 'Subtype')[1]
+                length = _raw_length(doc, xref)
+                stream_filter = doc.xref_get_key(xref, 'Filter')[1]
+            except Exception as e:
+                logger.warning(f"Skipping unreadable object {xref} in {file_path}: {e}")
+                continue
+
+            if subtype == '/Image':
+                category = 'images'
+                codec = re.findall(r'/(\w+)', stream_filter)
+                images[xref] = {
+                    'xref': xref,
+                    'width': int(doc.xref_get_key(xref, 'Width')[1] or 0),
+                    'height': int(doc.xref_get_key(xref, 'Height')[1] or 0),
+                    'bits': int(doc.xref_get_key(xref, 'BitsPerComponent')[1] or 0),
+                    'colorspace': doc.xref_get_key(xref, 'ColorSpace')[1].lstrip('/'),
+                    'codec': _CODECS.get(codec[-1], codec[-1].lower()) if codec else 'raw',
+                    'bytes': length, 'ppi': None, 'pages': 0,
+                }
+            elif subtype == '/Form':
+                category = 'forms'
+            elif obj_type == '/Metadata':
+                category = 'metadata'
+            elif obj_type == '/EmbeddedFile':
+                category = 'embedded_files'
+            else:
+                category = 'other_streams'  # content and font files are reassigned below
+            streams[xref] = [category, length]
+            by_length.setdefault((length, stream_filter), []).append(xref)
+            if stream_filter == 'null' and obj_type not in ('/XRef', '/ObjStm'):
+                uncompressed += length
+
+        for font in descriptors.values():
+            if font['file'] in streams:
+                streams[font['file']][0] = 'fonts'
+                font['bytes'] = streams[font['file']][1]
+
+        pages = []
+        attributed = set()
+        font_descriptors = {}  # font dictionary xref -> descriptor xrefs, fonts repeat on every page
+        for pno in range(doc.page_count):
+            page_bytes = {'page': pno + 1, 'content': 0, 'images': 0, 'fonts': 0}
+            page_xref = doc.page_xref(pno)
+            kind, contents = doc.xref_get_key(page_xref, 'Contents')
+            for xref in _refs(contents):
+                if xref in streams:
+                    streams[xref][0] = 'content'
+                    if xref not in attributed:
+                        attributed.add(xref)
+                        page_bytes['content'] += streams[xref][1]
+
+            page_width = doc.page_cropbox(pno).width / 72 or 1
+            for image in doc.get_page_images(pno, full=True):
+                details = images.get(image[0])
+                if not details:
+                    continue
+                details['pages'] += 1
+                if image[0] not in attributed:
+                    attributed.add(image[0])
+                    details['ppi'] = round(details['width'] / page_width)
+                    page_bytes['images'] += details['bytes']
+
+            for font in doc.get_page_fonts(pno, full=True):
+                if font[0] not in font_descriptors:
+                    font_descriptors[font[0]] = _font_descriptors(doc, font[0])
+                for descriptor in font_descriptors[font[0]]:
+                    file_xref = descriptors.get(descriptor, {}).get('file')
+                    if file_xref and file_xref not in attributed:
+                        attributed.add(file_xref)
+                        page_bytes['fonts'] += descriptors[descriptor]['bytes']
+            page_bytes['total'] = page_bytes['content'] + page_bytes['images'] + page_bytes['fonts']
+            pages.append(page_bytes)
+
+        for category, length in streams.values():
+            categories[category] += length
+        categories['structure'] = max(os.path.getsize(file_path) - sum(categories.values()), 0)
+
+        duplicate_count, duplicate_bytes = 0, 0
+        for (length, _), xrefs in by_length.items():
+            if len(xrefs) < 2 or length == 0:
+                continue
+            seen = set()
+            for xref in xrefs:
+                digest = hashlib.md5(doc.xref_stream_raw(xref)).digest()
+                if digest in seen:
+                    duplicate_count += 1
+                    duplicate_bytes += length
+                seen.add(digest)
+
+        fonts = [{key: value for key, value in font.items() if key != 'file'} for font in descriptors.values()]
+
+        report = {
+            'file_size': os.path.getsize(file_path),
+            'page_count': doc.page_count,
+            'object_count': doc.xref_length() - 1,
+            'categories': categories,
+            'images': sorted(images.values(), key=lambda image: image['bytes'], reverse=True),
+            'fonts': sorted(fonts + simple_fonts, key=lambda font: font['bytes'], reverse=True),
+            'duplicates': {'objects': duplicate_count, 'bytes': duplicate_bytes},
+            'uncompressed_bytes': uncompressed,
+            'pages': pages,
         }
+        report['suggestions'] = _suggest_compression(report)
+        logger.info(f"Analyzed {file_path}: {len(images)} images, {len(report['fonts'])} fonts")
+        return report
+
+    except Exception as e:
+        logger.error(f"Error analyzing PDF: {e}")
+        raise
+    finally:
+        doc.close()
+
+# Encryption methods supported by protect_pdf (PyMuPDF native, at save time)
+ENCRYPTION_METHODS = {
+    'AES-256': fitz.PDF_ENCRYPT_AES_256,
+    'AES-128': fitz.PDF_ENCRYPT_AES_128,
+    'RC4-128': fitz.PDF_ENCRYPT_RC4_128,
+}
+
+def _permission_flags(permissions: dict = None) -> int:
+    """
+    Build the PDF /P permission bits from a {'print', 'copy', 'modify'} dict.
+    Missing keys default to allowed.
+    """
+    # Permissions mapping
+    # print, modify, copy, annot-forms, fill-forms, extract, assemble, print-high
+    perms = {
+        'print': permissions.get('print', True) if permissions else True,
+        'copy': permissions.get('copy', True) if permissions else True,
+        'modify': permissions.get('modify', True) if permissions else True
+    }
+    
+    # Same bit values as pypdf's UserAccessPermissions (PDF spec table 22)
+    flags = 0
+    if perms['print']: flags |= fitz.PDF_PERM_PRINT
+    if perms['modify']: flags |= fitz.PDF_PERM_MODIFY
+    if perms['copy']: flags |= fitz.PDF_PERM_COPY
+    flags |= fitz.PDF_PERM_ACCESSIBILITY # Always allow accessibility
+    return flags
+
+def protect_pdf(file_path: str, output_path: str, user_pwd: str, owner_pwd: str, permissions: dict = None,
+                algorithm: str = "AES-256", linearize: bool = False, profile: str = None) -> str:
+    """
+    Encrypt PDF with user and owner passwords and set permissions.
+    
+    Encryption happens in MuPDF while the file is written, so streams are
+    encrypted natively in a single pass instead of copying the document
+    object by object in Python.
+    
+    Args:
+        file_path: Input PDF.
+        output_path: Output PDF.
+        user_pwd: Password required to open the document.
+        owner_pwd: Password for full access (defaults to the user password).
+        permissions: Dict with 'print', 'copy', 'modify' booleans.
+        algorithm: 'AES-256' (default), 'AES-128' or 'RC4-128'.
+        linearize: Write a linearized (fast web view) file.
+        profile: Writer profile, 'fast' (default) or 'compact' (see WRITER_PROFILES).
+    """
+    try:
+        if algorithm not in ENCRYPTION_METHODS:
+            raise ValueError(f"Unsupported encryption algorithm: {algorithm}")
         
-        # In pypdf >= 3.0.0, encryption is handled via encrypt()
-        # permissions_flag is an integer bitfield.
-        # UserAccessPermissions is a helper enum in pypdf.
-        from pypdf.constants import UserAccessPermissions
-        
-        flags = 0
-        if perms['print']: flags |= UserAccessPermissions.PRINT
-        if perms['modify']: flags |= UserAccessPermissions.MODIFY
-        if perms['copy']: flags |= UserAccessPermissions.COPY
-        # ACCESSIBILITY attribute removed in pypdf 3.0+. Using raw bit definitions if needed.
-        # Bit 10 (value 512) is typically for accessibility.
-        flags |= 512 # Always allow accessibility
-        
-        writer.encrypt(
-            user_password=user_pwd,
-            owner_password=owner_pwd,
-            permissions_flag=flags,
-            algorithm="AES-128" # Stronger encryption
-        )
+        doc = fitz.open(file_path)
+        if doc.needs_pass:
+            raise ValueError("PDF is already password protected")
         
-        with open(output_path, "wb") as f:
-            writer.write(f)
+        save_pdf(
+            doc,
+            output_path,
+            profile,
+            linearize,
+            encryption=ENCRYPTION_METHODS[algorithm],
+            owner_pw=owner_pwd or user_pwd,
+            user_pw=user_pwd,
+            permissions=_permission_flags(permissions)
+        )
+        doc.close()
             
         logger.info(f"Protected PDF saved to {output_path}")
         return output_path
@@ -455,25 +1180,25 @@ def protect_pdf(file_path: str, output_path: str, user_pwd: str, owner_pwd: str,
         logger.error(f"Error protecting PDF: {e}")
         raise
 
-def unlock_pdf(file_path: str, output_path: str, password: str) -> str:
+def unlock_pdf(file_path: str, output_path: str, password: str, linearize: bool = False,
+               profile: str = None) -> str:
     """
     Remove password security from PDF.
+    Set linearize to write a linearized (fast web view) file, and profile
+    to pick the writer profile.
     """
     try:
-        reader = PdfReader(file_path)
+        # An empty user password is tried on open, so permission-only
+        # locked files need no password
+        doc = fitz.open(file_path)
         
-        if reader.is_encrypted:
+        if doc.needs_pass:
             # Try to decrypt with provided password
-            if not reader.decrypt(password):
-                # Try empty password just in case it's only permission locked
-                if not reader.decrypt(""):
-                    raise ValueError("Incorrect password")
-        
-        writer = PdfWriter()
-        writer.append(reader)
+            if not doc.authenticate(password):
+                raise ValueError("Incorrect password")
         
-        with open(output_path, "wb") as f:
-            writer.write(f)
+        save_pdf(doc, output_path, profile, linearize, encryption=fitz.PDF_ENCRYPT_NONE)
+        doc.close()
             
         logger.info(f"Unlocked PDF saved to {output_path}")
         return output_path
@@ -482,7 +1207,8 @@ def unlock_pdf(file_path: str, output_path: str, password: str) -> str:
         logger.error(f"Error unlocking PDF: {e}")
         raise
 
-def apply_edits(file_path: str, output_path: str, edits_config: dict, image_paths: dict) -> str:
+def apply_edits(file_path: str, output_path: str, edits_config: dict, image_paths: dict,
+                linearize: bool = False, profile: str = None) -> str:
     """
     Apply text, image, and shape edits to a PDF.
     
@@ -491,6 +1217,8 @@ def apply_edits(file_path: str, output_path: str, edits_config: dict, image_path
         output_path: Output PDF path
         edits_config: Dictionary mapping page index (str/int) to list of edit objects.
         image_paths: Dictionary mapping imageId to local file path for uploaded images.
+        linearize: Write a linearized (fast web view) file.
+        profile: Writer profile, 'fast' (default) or 'compact' (see WRITER_PROFILES).
         
     Returns:
         output_path
@@ -500,6 +1228,7 @@ def apply_edits(file_path: str, output_path: str, edits_config: dict, image_path
         doc = fitz.open(file_path)
         
         for page_idx_str, edits in edits_config.items():
+            cancellation.check()
             page_idx = int(page_idx_str)
             logger.info(f"Processing page {page_idx}, {len(edits)} edits")
             
@@ -684,11 +1413,48 @@ def apply_edits(file_path: str, output_path: str, edits_config: dict, image_path
                     )
                     shape.commit(overlay=True)
 
-        doc.save(output_path)
+        save_pdf(doc, output_path, profile, linearize)
         doc.close()
         logger.info(f"Edits applied, saved to {output_path}")
         return output_path
         
+    except cancellation.Cancelled:
+        raise
     except Exception as e:
         logger.error(f"Error applying edits: {e}")
         raise
+
+def count_pages(file_path: str) -> int:
+    """
+    Return the page count of a PDF without processing it.
+    Unreadable files count as 0 pages; the operation itself reports the error.
+    """
+    try:
+        with fitz.open(file_path) as doc:
+            return doc.page_count
+    except Exception as e:
+        logger.warning(f"Could not count pages of {file_path}: {e}")
+        return 0
+
+def inspect_document(file_path: str) -> dict:
+    """Cheap description of a PDF, for input checks (see inspection.inspect_pdf)."""
+    return inspection.inspect_pdf(file_path)
+
+def index_text(file_path: str, index_path: str) -> dict:
+    """
+    Extract the text of every page into a search index (see text_index).
+
+    Returns:
+        Summary dict with 'page_count', 'terms' and 'words'.
+    """
+    try:
+        return text_index.build_index(file_path, index_path)
+    except cancellation.Cancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Error indexing PDF: {e}")
+        raise
+
+def find_word_rects(file_path: str, positions: dict) -> list:
+    """Page rectangles of indexed words, for highlighting (see text_index.word_rects)."""
+    return text_index.word_rects(file_path, positions)
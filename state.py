@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import secrets
+import threading
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Persistent, non-temporary state (signing key, SQLite database). Must not be
+# inside STORAGE_ROOT, whose entries expire.
+STATE_DIR = os.environ.get('STATE_DIR', 'state')
+
+# Metadata store shared by every process of the deployment
+STATE_URL = os.environ.get('STATE_URL', f"sqlite:///{os.path.abspath(os.path.join(STATE_DIR, 'metadata.db'))}")
+
+# Identity of this node. NODE_URL is where other nodes redirect requests for
+# outputs that only this node can serve (no shared STORAGE_ROOT).
+NODE_ID = os.environ.get('NODE_ID', socket.gethostname())
+NODE_URL = os.environ.get('NODE_URL', '').rstrip('/')
+
+
+class MetadataStore(ABC):
+    """
+    Small JSON records shared between processes and nodes: chunked uploads,
+    documents, registered outputs, jobs and cache entries, each in its own
+    namespace. Records may carry a time-to-live.
+
+    Backends implement get(), put() and delete(); touch() and
+    purge_expired() have working defaults.
+    """
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        """The record, or None if it does not exist or has expired."""
+
+    @abstractmethod
+    def put(self, namespace: str, key: str, value: dict, ttl: float = None) -> None:
+        """Create or replace a record, expiring `ttl` seconds from now (None: never)."""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> None:
+        """Remove a record; no error if it does not exist."""
+
+    def touch(self, namespace: str, key: str, ttl: float) -> None:
+        """Extend the expiry of a record that is still in use."""
+        value = self.get(namespace, key)
+        if value is not None:
+            self.put(namespace, key, value, ttl)
+
+    def purge_expired(self) -> int:
+        """Remove expired records. Returns the number removed."""
+        return 0
+
+
+class SQLiteStore(MetadataStore):
+    """
+    MetadataStore in a SQLite database (WAL mode), for any number of
+    processes on one host. Connections are per thread.
+    """
+
+    def __init__(self, path: str, purge_interval: float = 60):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS records_expires ON records (expires)")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+        return db
+
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT value FROM records WHERE namespace = ? AND key = ? AND (expires IS NULL OR expires > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace: str, key: str, value: dict, ttl: float = None) -> None:
+        expires = time.time() + ttl if ttl else None
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+                       (namespace, key, json.dumps(value), expires))
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM records WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def touch(self, namespace: str, key: str, ttl: float) -> None:
+        with self._connect() as db:
+            db.execute("UPDATE records SET expires = ? WHERE namespace = ? AND key = ? AND expires IS NOT NULL",
+                       (time.time() + ttl, namespace, key))
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return 0
+        self._last_purge = now
+        with self._connect() as db:
+            removed = db.execute("DELETE FROM records WHERE expires <= ?", (now,)).rowcount
+        if removed:
+            logger.info(f"Purged {removed} expired metadata records")
+        return removed
+
+
+# URL scheme -> factory(url). Other deployments register their own backend
+# (e.g. a Redis or database service for several hosts) before the app starts.
+BACKENDS: Dict[str, Callable[[str], MetadataStore]] = {
+    'sqlite': lambda url: SQLiteStore(urlparse(url).path),
+}
+
+
+def register_backend(scheme: str, factory: Callable[[str], MetadataStore]) -> None:
+    """Make a MetadataStore implementation available under STATE_URL scheme `scheme`."""
+    BACKENDS[scheme] = factory
+
+
+def open_store(url: str) -> MetadataStore:
+    scheme = urlparse(url).scheme
+    if scheme not in BACKENDS:
+        raise ValueError(f"No metadata store backend for '{scheme}://'")
+    return BACKENDS[scheme](url)
+
+
+def load_secret_key() -> str:
+    """
+    Session signing key shared by all processes: SECRET_KEY if set,
+    otherwise a key generated once and kept in STATE_DIR. The first process
+    to start creates the file; the others read it.
+    """
+    if os.environ.get('SECRET_KEY'):
+        return os.environ['SECRET_KEY']
+
+    path = os.path.join(STATE_DIR, 'secret_key')
+    os.makedirs(STATE_DIR, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(path) as f:
+                key = f.read().strip()
+            if key:
+                return key
+            time.sleep(0.1)  # another process is still writing it
+        raise RuntimeError(f"Secret key file {path} is empty")
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    logger.info(f"Generated a new secret key in {path}")
+    return key
+
+
+metadata = open_store(STATE_URL)
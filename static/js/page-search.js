@@ -0,0 +1,112 @@
+// --- Page Search ---
+// Text search for page grids. The PDF is sent once through the chunked upload
+// API and searched by doc_id afterwards, so the server extracts and indexes
+// its text once and answers later queries in milliseconds. Hits are drawn
+// over thumbnails by drawHits(), called from PageThumbnails' onRender.
+
+class PageSearch {
+    // options:
+    //   chunkSize - upload chunk size in bytes (default 8 MB)
+    constructor(file, options = {}) {
+        this.file = file;
+        this.chunkSize = options.chunkSize || 8 * 1024 * 1024;
+        this.docId = null;
+        this.uploading = null;
+        this.hits = new Map(); // pageNum -> {width, height, rects}
+    }
+
+    // doc_id of the file, uploading it on first use
+    upload() {
+        if (!this.uploading) {
+            this.uploading = this.sendFile().catch(e => {
+                this.uploading = null;
+                throw e;
+            });
+        }
+        return this.uploading;
+    }
+
+    async sendFile() {
+        const created = await this.request('/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: this.file.name, size: this.file.size })
+        });
+        let offset = 0;
+        while (offset < this.file.size) {
+            const chunk = this.file.slice(offset, offset + this.chunkSize);
+            const sent = await this.request(`/uploads/${created.upload_id}`, {
+                method: 'PATCH',
+                headers: { 'Upload-Offset': String(offset) },
+                body: chunk
+            });
+            offset = sent.offset;
+        }
+        const done = await this.request(`/uploads/${created.upload_id}/finalize`, { method: 'POST' });
+        this.docId = done.doc_id;
+        return this.docId;
+    }
+
+    async request(url, init) {
+        const res = await fetch(url, init);
+        const data = await res.json().catch(() => ({}));
+        if (!res.ok) throw new Error(data.error || `Request failed (${res.status})`);
+        return data;
+    }
+
+    async post(url, fields) {
+        const formData = new FormData();
+        formData.append('doc_id', await this.upload());
+        for (const [name, value] of Object.entries(fields)) formData.append(name, value);
+        return this.request(url, { method: 'POST', body: formData });
+    }
+
+    // Pages containing every word of `query`, as returned by /search:
+    // {pages: [{page, hits}], total_hits, page_count}. Also fetches the hit
+    // rectangles of the first matching pages for drawHits().
+    async search(query, phrase = false) {
+        const fields = { query, phrase: phrase ? 'true' : 'false' };
+        const result = await this.post('/search', fields);
+        this.hits.clear();
+        if (result.pages.length) {
+            const found = await this.post('/highlight', fields);
+            for (const page of found.pages) this.hits.set(page.page, page);
+        }
+        return result;
+    }
+
+    clear() {
+        this.hits.clear();
+    }
+
+    // Draw the hits of `pageNum` over `canvas`, replacing any drawn before
+    drawHits(canvas, pageNum) {
+        const slot = canvas.parentNode;
+        if (!slot) return;
+        canvas.dataset.page = pageNum;
+        slot.querySelectorAll('.search-hits').forEach(layer => layer.remove());
+        const page = this.hits.get(pageNum);
+        if (!page || !page.rects.length) return;
+
+        const layer = document.createElement('div');
+        layer.className = 'search-hits';
+        layer.style.left = `${canvas.offsetLeft}px`;
+        layer.style.top = `${canvas.offsetTop}px`;
+        layer.style.width = `${canvas.offsetWidth}px`;
+        layer.style.height = `${canvas.offsetHeight}px`;
+        for (const [x0, y0, x1, y1] of page.rects) {
+            const mark = document.createElement('div');
+            mark.style.left = `${x0 / page.width * 100}%`;
+            mark.style.top = `${y0 / page.height * 100}%`;
+            mark.style.width = `${(x1 - x0) / page.width * 100}%`;
+            mark.style.height = `${(y1 - y0) / page.height * 100}%`;
+            layer.appendChild(mark);
+        }
+        slot.appendChild(layer);
+    }
+
+    // Redraw the hits over every thumbnail shown under `root`
+    redraw(root) {
+        root.querySelectorAll('canvas[data-page]').forEach(canvas => this.drawHits(canvas, Number(canvas.dataset.page)));
+    }
+}
@@ -0,0 +1,206 @@
+// --- Lazy Page Thumbnails ---
+// Renders pdf.js pages only while they are on (or near) the screen. Each page
+// gets a placeholder; an IntersectionObserver renders it when it scrolls into
+// view and releases the canvas when it scrolls away, so canvas memory stays
+// flat however many pages the document has. Full resolution is only rendered
+// by zoom().
+
+class PageThumbnails {
+    // options:
+    //   scale       - render scale (default 0.4), or
+    //   width       - render to this CSS width instead
+    //   root        - scrolling element (default: the viewport)
+    //   rootMargin  - how far ahead to render (default: one screen either way)
+    //   concurrency - pages rendered at once (default 2)
+    //   onRender(canvas, pageNum, slot) - called when a canvas is shown
+    constructor(pdfDoc, options = {}) {
+        this.pdfDoc = pdfDoc;
+        this.options = options;
+        this.concurrency = options.concurrency || 2;
+        this.entries = new Map(); // observed element -> entry
+        this.queue = [];
+        this.active = 0;
+        this.spare = new Map(); // pageNum -> canvas kept across reset()
+        this.observer = new IntersectionObserver(items => this.onIntersect(items), {
+            root: options.root || null,
+            rootMargin: options.rootMargin || '100% 0px'
+        });
+    }
+
+    // Watch `target`; its page is drawn into `slot` (default: target itself).
+    // Whatever the slot holds now is the placeholder shown while not rendered.
+    observe(target, pageNum, slot = target) {
+        const entry = {
+            target, slot, pageNum,
+            placeholder: Array.from(slot.childNodes),
+            visible: false, canvas: null, task: null
+        };
+        const canvas = this.spare.get(pageNum);
+        if (canvas) {
+            this.spare.delete(pageNum);
+            this.show(entry, canvas);
+        }
+        this.entries.set(target, entry);
+        this.observer.observe(target);
+    }
+
+    unobserve(target) {
+        const entry = this.entries.get(target);
+        if (!entry) return;
+        this.observer.unobserve(target);
+        this.release(entry);
+        this.entries.delete(target);
+    }
+
+    // Forget every page, keeping rendered canvases for a following observe()
+    // of the same pages (e.g. when a grid is rebuilt after a reorder).
+    reset() {
+        for (const entry of this.entries.values()) {
+            this.observer.unobserve(entry.target);
+            if (entry.task) entry.task.cancel();
+            if (entry.canvas) this.spare.set(entry.pageNum, entry.canvas);
+        }
+        this.entries.clear();
+        this.queue = [];
+    }
+
+    destroy() {
+        this.reset();
+        this.releaseSpare();
+        this.observer.disconnect();
+    }
+
+    onIntersect(items) {
+        for (const item of items) {
+            const entry = this.entries.get(item.target);
+            if (!entry) continue;
+            entry.visible = item.isIntersecting;
+            if (entry.visible) {
+                if (!entry.canvas && !entry.task && !this.queue.includes(entry)) this.queue.push(entry);
+            } else {
+                this.release(entry);
+            }
+        }
+        // Canvases not picked up again after a reset() are off-screen
+        this.releaseSpare();
+        this.pump();
+    }
+
+    pump() {
+        while (this.active < this.concurrency && this.queue.length) {
+            const entry = this.queue.shift();
+            if (!entry.visible || entry.canvas || !this.entries.has(entry.target)) continue;
+            this.active++;
+            this.render(entry).finally(() => {
+                this.active--;
+                this.pump();
+            });
+        }
+    }
+
+    scaleFor(page) {
+        if (this.options.width) return this.options.width / page.getViewport({ scale: 1 }).width;
+        return this.options.scale || 0.4;
+    }
+
+    async render(entry) {
+        try {
+            const page = await this.pdfDoc.getPage(entry.pageNum);
+            if (!entry.visible) return;
+            const viewport = page.getViewport({ scale: this.scaleFor(page) });
+            const canvas = document.createElement('canvas');
+            canvas.width = viewport.width;
+            canvas.height = viewport.height;
+            entry.task = page.render({ canvasContext: canvas.getContext('2d'), viewport });
+            await entry.task.promise;
+            entry.task = null;
+            // Drop the page's decoded images and operator list; the canvas has the pixels
+            page.cleanup();
+            if (entry.visible && this.entries.get(entry.target) === entry) {
+                this.show(entry, canvas);
+            } else {
+                freeCanvas(canvas);
+            }
+        } catch (e) {
+            entry.task = null;
+            if (e && e.name !== 'RenderingCancelledException') console.error(`Page ${entry.pageNum}:`, e);
+        }
+    }
+
+    show(entry, canvas) {
+        entry.canvas = canvas;
+        entry.slot.replaceChildren(canvas);
+        if (this.options.onRender) this.options.onRender(canvas, entry.pageNum, entry.slot);
+    }
+
+    release(entry) {
+        if (entry.task) {
+            entry.task.cancel();
+            entry.task = null;
+        }
+        if (entry.canvas) {
+            freeCanvas(entry.canvas);
+            entry.canvas = null;
+            entry.slot.replaceChildren(...entry.placeholder);
+        }
+    }
+
+    releaseSpare() {
+        for (const canvas of this.spare.values()) freeCanvas(canvas);
+        this.spare.clear();
+    }
+
+    // Full-resolution view of one page, fitted to the window. Closes on
+    // click or Escape and frees its canvas.
+    async zoom(pageNum, rotation = 0) {
+        const overlay = document.createElement('div');
+        overlay.className = 'page-zoom';
+        overlay.innerHTML = '<div class="loader">⏳</div>';
+        document.body.appendChild(overlay);
+
+        let task = null;
+        const close = () => {
+            if (task) task.cancel();
+            const canvas = overlay.querySelector('canvas');
+            if (canvas) freeCanvas(canvas);
+            overlay.remove();
+            document.removeEventListener('keydown', onKey);
+        };
+        const onKey = (e) => { if (e.key === 'Escape') close(); };
+        overlay.addEventListener('click', close);
+        document.addEventListener('keydown', onKey);
+
+        try {
+            const page = await this.pdfDoc.getPage(pageNum);
+            const angle = (page.rotate + rotation) % 360;
+            const base = page.getViewport({ scale: 1, rotation: angle });
+            const fit = Math.min(window.innerWidth * 0.9 / base.width, window.innerHeight * 0.9 / base.height);
+            const ratio = window.devicePixelRatio || 1;
+            const viewport = page.getViewport({ scale: fit * ratio, rotation: angle });
+
+            const canvas = document.createElement('canvas');
+            canvas.width = viewport.width;
+            canvas.height = viewport.height;
+            canvas.style.width = `${viewport.width / ratio}px`;
+            canvas.style.height = `${viewport.height / ratio}px`;
+            task = page.render({ canvasContext: canvas.getContext('2d'), viewport });
+            await task.promise;
+            task = null;
+            page.cleanup();
+            if (overlay.isConnected) {
+                overlay.replaceChildren(canvas);
+            } else {
+                freeCanvas(canvas);
+            }
+        } catch (e) {
+            if (e && e.name !== 'RenderingCancelledException') console.error(`Zoom page ${pageNum}:`, e);
+        }
+    }
+}
+
+// Browsers keep a canvas's backing store until it is resized or collected
+function freeCanvas(canvas) {
+    canvas.width = 0;
+    canvas.height = 0;
+    canvas.remove();
+}
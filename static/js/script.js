@@ -1,5 +1,5 @@
 // State
-let files = []; // Array of { id, file, thumbnailCanvas }
+let files = []; // Array of { id, file, thumbnailUrl }
 
 // DOM Elements
 const dropArea = document.getElementById('drop-area');
@@ -7,6 +7,16 @@ const fileInput = document.getElementById('file-input');
 const fileGrid = document.getElementById('file-grid');
 const mergeBtn = document.getElementById('merge-btn');
 
+// Thumbnails are rendered when their card scrolls into view
+const thumbnailObserver = new IntersectionObserver(entries => {
+    entries.forEach(entry => {
+        if (!entry.isIntersecting) return;
+        thumbnailObserver.unobserve(entry.target);
+        const fileObj = files.find(f => f.id === entry.target.dataset.id);
+        if (fileObj) generateThumbnail(fileObj);
+    });
+}, { rootMargin: '100% 0px' });
+
 // --- Event Listeners ---
 
 // Click to browse
@@ -106,24 +116,37 @@ async function addFile(file) {
 
     files.push(fileObj);
 
-    // Render UI card immediately
+    // Render UI card immediately (the thumbnail follows once it is on screen)
     renderFileCard(fileObj);
 
-    // Generate Thumbnail asynchronously
-    generateThumbnail(fileObj);
+    // Flag files the merge would reject (damaged, password protected, too long)
+    inspectPdf(file).then(info => {
+        if (!info) return;
+        if (info.error) {
+            fileObj.problem = info.error;
+        } else if (info.needs_password) {
+            fileObj.problem = 'Password protected, unlock it first';
+        } else {
+            fileObj.pages = info.page_count;
+        }
+        updateUI();
+    }).catch(() => {});
 }
 
 function removeFile(id) {
+    const fileObj = files.find(f => f.id === id);
+    if (fileObj && fileObj.thumbnailUrl) URL.revokeObjectURL(fileObj.thumbnailUrl);
     files = files.filter(f => f.id !== id);
     updateUI();
 }
 
 function updateUI() {
+    thumbnailObserver.disconnect();
     fileGrid.innerHTML = '';
     files.forEach(f => renderFileCard(f));
 
     // Update button state
-    mergeBtn.disabled = files.length === 0;
+    mergeBtn.disabled = files.length === 0 || files.some(f => f.problem);
 }
 
 function renderFileCard(fileObj) {
@@ -140,16 +163,27 @@ function renderFileCard(fileObj) {
 
     const previewContainer = document.createElement('div');
     previewContainer.className = 'file-preview';
-    // If we already have a canvas in memory, use it, else generic icon until fuzzy load
-    if (fileObj.canvas) {
-        previewContainer.appendChild(fileObj.canvas);
+    // Use the rendered thumbnail if there is one, else a placeholder until it is on screen
+    if (fileObj.thumbnailUrl) {
+        const img = document.createElement('img');
+        img.src = fileObj.thumbnailUrl;
+        img.alt = '';
+        previewContainer.appendChild(img);
     } else {
         previewContainer.innerHTML = '<span style="font-size: 2rem;">⏳</span>';
+        thumbnailObserver.observe(card);
     }
 
     const name = document.createElement('div');
     name.className = 'file-info';
     name.textContent = fileObj.name;
+    if (fileObj.problem) {
+        name.textContent = `⚠️ ${fileObj.name}`;
+        name.title = fileObj.problem;
+        card.style.borderColor = '#e74c3c';
+    } else if (fileObj.pages) {
+        name.title = `${fileObj.pages} pages`;
+    }
 
     const removeBtn = document.createElement('button');
     removeBtn.className = 'remove-btn';
@@ -172,10 +206,13 @@ async function generateThumbnail(fileObj) {
         console.error("PDF.js not loaded");
         return;
     }
+    if (fileObj.thumbnailUrl || fileObj.thumbnailPending) return;
+    fileObj.thumbnailPending = true;
 
+    let loadingTask = null;
     try {
         const arrayBuffer = await fileObj.file.arrayBuffer();
-        const loadingTask = pdfjsLib.getDocument({ data: arrayBuffer });
+        loadingTask = pdfjsLib.getDocument({ data: arrayBuffer });
         const pdf = await loadingTask.promise;
         const page = await pdf.getPage(1); // Get first page
 
@@ -194,12 +231,24 @@ async function generateThumbnail(fileObj) {
 
         await page.render(renderContext).promise;
 
-        // Save canvas to object and re-render
-        fileObj.canvas = canvas;
-        updateUI(); // Re-render to show the thumbnail
+        // Keep a small JPEG rather than the canvas: the browser can drop
+        // decoded images that are off screen, but never a canvas
+        const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.85));
+        canvas.width = 0;
+        canvas.height = 0;
+        fileObj.thumbnailUrl = URL.createObjectURL(blob);
+        if (files.includes(fileObj)) {
+            updateUI(); // Re-render to show the thumbnail
+        } else {
+            URL.revokeObjectURL(fileObj.thumbnailUrl);
+        }
 
     } catch (error) {
         console.error("Thumbnail error:", error);
+    } finally {
+        fileObj.thumbnailPending = false;
+        // Free the parsed document; only the image is needed from here on
+        if (loadingTask) loadingTask.destroy();
     }
 }
 
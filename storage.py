@@ -0,0 +1,329 @@
+import os
+import time
+import shutil
+import threading
+import logging
+from contextlib import contextmanager
+from typing import List, NamedTuple
+
+import admission
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class StorageFull(admission.AdmissionRejected):
+    """
+    Raised when a file would exceed a storage quota and nothing old enough
+    can be evicted. Handled like an admission rejection (503 + Retry-After):
+    space frees up as downloads complete and files expire.
+    """
+
+    def __init__(self, message: str, retry_after: int = 30):
+        super().__init__(retry_after)
+        self.args = (message,)
+
+
+class Entry(NamedTuple):
+    path: str
+    size: int
+    last_used: float
+
+
+class Backend:
+    """A directory of temp files with a byte quota (0 = unlimited)."""
+
+    def __init__(self, name: str, root: str, quota_bytes: int = 0, min_free_bytes: int = 0):
+        self.name = name
+        self.root = os.path.abspath(root)
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+
+    def ensure_root(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+
+    def contains(self, path: str) -> bool:
+        return os.path.abspath(path).startswith(self.root + os.sep)
+
+    def free_bytes(self) -> int:
+        self.ensure_root()
+        return shutil.disk_usage(self.root).free
+
+    def entries(self) -> List[Entry]:
+        """Top-level files and directories with their total size and last modification."""
+        entries = []
+        try:
+            items = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return entries
+        for item in items:
+            try:
+                stat = item.stat()
+                size, last_used = stat.st_size, stat.st_mtime
+                if item.is_dir():
+                    size = 0
+                    for dirpath, _, filenames in os.walk(item.path):
+                        for filename in filenames:
+                            child = os.stat(os.path.join(dirpath, filename))
+                            size += child.st_size
+                            last_used = max(last_used, child.st_mtime)
+                entries.append(Entry(item.path, size, last_used))
+            except OSError:
+                continue  # removed while scanning
+        return entries
+
+    def usage(self) -> int:
+        return sum(entry.size for entry in self.entries())
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+class TempStorage:
+    """
+    Temp file placement with quotas.
+
+    Every temp file goes through allocate(): small files with a known size
+    go to the RAM backend (tmpfs) when one is configured, everything else to
+    disk. Before handing out a path, the global quota, the free-space floor
+    and the per-session quota are checked against the expected size. Under
+    pressure, entries idle for longer than evict_grace are evicted,
+    large stale ones first (idle time x size). Entries pinned by a running
+    job (pinned()) are never evicted. If that is not enough the request is
+    refused with StorageFull.
+
+    Usage is not measured on every allocation: the roots are scanned at
+    most every usage_refresh seconds, and allocations in between add their
+    size hints to the running totals. Apparent pressure triggers a fresh
+    scan before anything is evicted or refused.
+    """
+
+    def __init__(self, disk: Backend, ram: Backend = None, session_quota_bytes: int = 0,
+                 ram_max_file_bytes: int = 16 * MB, max_age: float = 3600, evict_grace: float = 300,
+                 cleanup_interval: float = 60, usage_refresh: float = 10):
+        self.disk = disk
+        self.ram = ram
+        self.session_quota_bytes = session_quota_bytes
+        self.ram_max_file_bytes = ram_max_file_bytes
+        self.max_age = max_age
+        self.evict_grace = evict_grace
+        self.cleanup_interval = cleanup_interval
+        self.usage_refresh = usage_refresh
+
+        self._owners = {}  # absolute path -> session key
+        self._pins = {}  # absolute path -> number of jobs using it
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        # Running totals, re-measured by _scan()
+        self._scanned_at = None
+        self._entries = {}  # backend name -> entries at the last scan
+        self._usage = {}  # backend name -> bytes
+        self._session_usage = {}  # session key -> bytes
+
+    @property
+    def backends(self) -> List[Backend]:
+        return [self.disk] + ([self.ram] if self.ram else [])
+
+    def disk_path(self, filename: str) -> str:
+        """Path for a named file on disk, without quota checks (fixed-name lookups)."""
+        self.disk.ensure_root()
+        return os.path.join(self.disk.root, filename)
+
+    def allocate(self, filename: str, session: str = None, size_hint: int = 0, allow_ram: bool = True) -> str:
+        """
+        Reserve a temp file path.
+
+        Args:
+            filename: File name within the storage root.
+            session: Owner, for the per-session quota.
+            size_hint: Expected size in bytes (0 if unknown).
+            allow_ram: Allow the RAM backend (callers that rename into
+                other temp files must stay on one filesystem).
+
+        Returns:
+            Absolute path.
+
+        Raises:
+            StorageFull: If a quota would be exceeded.
+        """
+        size_hint = max(int(size_hint or 0), 0)
+        with self._lock:
+            self._scan()
+            self._check_session(session, size_hint)
+            backend = self.disk
+            if allow_ram and self.ram and 0 < size_hint <= self.ram_max_file_bytes:
+                try:
+                    self._make_room(self.ram, size_hint)
+                    backend = self.ram
+                except StorageFull:
+                    pass
+            if backend is self.disk:
+                self._make_room(self.disk, size_hint)
+
+            backend.ensure_root()
+            path = os.path.join(backend.root, filename)
+            self._usage[backend.name] = self._usage.get(backend.name, 0) + size_hint
+            if session:
+                self._owners[path] = session
+                self._session_usage[session] = self._session_usage.get(session, 0) + size_hint
+        return path
+
+    def allocate_dir(self, dirname: str, session: str = None, size_hint: int = 0) -> str:
+        """Create and return a temp directory on disk (for multi-file outputs)."""
+        path = self.allocate(dirname, session, size_hint, allow_ram=False)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def touch(self, path: str) -> None:
+        """Mark a file as recently used, so LRU eviction keeps it."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @contextmanager
+    def pinned(self, *paths: str):
+        """
+        Keep files from being evicted or expired while a job uses them.
+        They are also touched, for processes sharing the root (pins are per
+        process).
+        """
+        paths = [os.path.abspath(path) for path in paths if path]
+        with self._lock:
+            for path in paths:
+                self._pins[path] = self._pins.get(path, 0) + 1
+        for path in paths:
+            self.touch(path)
+        try:
+            yield
+        finally:
+            with self._lock:
+                for path in paths:
+                    self._pins[path] -= 1
+                    if not self._pins[path]:
+                        del self._pins[path]
+
+    def _scan(self, force: bool = False) -> None:
+        """Re-measure backend and session usage (every usage_refresh seconds, or when forced)."""
+        now = time.monotonic()
+        if not force and self._scanned_at is not None and now - self._scanned_at < self.usage_refresh:
+            return
+        self._scanned_at = now
+        self._entries = {backend.name: backend.entries() for backend in self.backends}
+        self._usage = {name: sum(entry.size for entry in entries) for name, entries in self._entries.items()}
+        sizes = {entry.path: entry.size for entries in self._entries.values() for entry in entries}
+        self._session_usage = {}
+        for path, owner in self._owners.items():
+            # Allocated but not written yet counts as 0
+            self._session_usage[owner] = self._session_usage.get(owner, 0) + sizes.get(path, 0)
+
+    def _check_session(self, session: str, size_hint: int) -> None:
+        if not session or not self.session_quota_bytes:
+            return
+        if self._session_usage.get(session, 0) + size_hint > self.session_quota_bytes:
+            # Files may have been downloaded and removed since the last scan
+            self._scan(force=True)
+            if self._session_usage.get(session, 0) + size_hint > self.session_quota_bytes:
+                raise StorageFull("Storage quota for this session exceeded, please retry after your downloads complete")
+
+    def _excess(self, backend: Backend, needed: int) -> int:
+        excess = 0
+        if backend.quota_bytes:
+            excess = self._usage.get(backend.name, 0) + needed - backend.quota_bytes
+        if backend.min_free_bytes:
+            excess = max(excess, backend.min_free_bytes + needed - backend.free_bytes())
+        return excess
+
+    def _make_room(self, backend: Backend, needed: int) -> None:
+        """Evict idle, unpinned entries until `needed` bytes fit in the backend's quota and free-space floor."""
+        if self._excess(backend, needed) <= 0:
+            return
+        self._scan(force=True)
+        excess = self._excess(backend, needed)
+        if excess <= 0:
+            return
+
+        now = time.time()
+        candidates = [entry for entry in self._entries.get(backend.name, [])
+                      if now - entry.last_used > self.evict_grace and entry.path not in self._pins]
+        candidates.sort(key=lambda entry: (now - entry.last_used) * entry.size, reverse=True)
+        for entry in candidates:
+            if excess <= 0:
+                break
+            try:
+                _remove(entry.path)
+            except OSError as e:
+                logger.warning(f"Could not evict {entry.path}: {e}")
+                continue
+            owner = self._owners.pop(entry.path, None)
+            if owner in self._session_usage:
+                self._session_usage[owner] -= entry.size
+            self._usage[backend.name] -= entry.size
+            excess -= entry.size
+            logger.info(f"Evicted {entry.path} ({entry.size} bytes) from {backend.name} storage")
+
+        if excess > 0:
+            raise StorageFull(f"Temporary storage is full ({backend.name})")
+
+    def cleanup(self, force: bool = False) -> None:
+        """Remove entries unused for max_age seconds. The roots themselves are never removed."""
+        now = time.time()
+        if not force and now - self._last_cleanup < self.cleanup_interval:
+            return
+        self._last_cleanup = now
+
+        for backend in self.backends:
+            for entry in backend.entries():
+                if now - entry.last_used <= self.max_age or entry.path in self._pins:
+                    continue
+                try:
+                    _remove(entry.path)
+                    logger.info(f"Removed expired file: {entry.path}")
+                except OSError as e:
+                    logger.error(f"Error removing file {entry.path}: {e}")
+
+        with self._lock:
+            for path in [p for p in self._owners if not os.path.exists(p)]:
+                del self._owners[path]
+            self._scanned_at = None  # re-measure on the next allocation
+
+    def snapshot(self) -> dict:
+        """Usage per backend (as of the last scan, plus allocations since), for the health endpoint."""
+        with self._lock:
+            self._scan()
+            usage = dict(self._usage)
+        return {
+            backend.name: {
+                'used_bytes': usage.get(backend.name, 0),
+                'quota_bytes': backend.quota_bytes,
+                'free_bytes': backend.free_bytes(),
+            }
+            for backend in self.backends
+        }
+
+
+def _mb(name: str, default: float) -> int:
+    return int(float(os.environ.get(name, default)) * MB)
+
+
+def _from_env() -> TempStorage:
+    ram_root = os.environ.get('STORAGE_RAM_ROOT', '')
+    return TempStorage(
+        disk=Backend('disk', os.environ.get('STORAGE_ROOT', 'temp'),
+                     quota_bytes=_mb('STORAGE_QUOTA_MB', 10240),
+                     min_free_bytes=_mb('STORAGE_MIN_FREE_MB', 1024)),
+        ram=Backend('ram', ram_root, quota_bytes=_mb('STORAGE_RAM_QUOTA_MB', 256)) if ram_root else None,
+        session_quota_bytes=_mb('STORAGE_SESSION_QUOTA_MB', 2048),
+        ram_max_file_bytes=_mb('STORAGE_RAM_MAX_FILE_MB', 16),
+        max_age=float(os.environ.get('STORAGE_MAX_AGE', 3600)),
+        evict_grace=float(os.environ.get('STORAGE_EVICT_GRACE', 300)),
+        usage_refresh=float(os.environ.get('STORAGE_USAGE_REFRESH', 10)),
+    )
+
+
+store = _from_env()
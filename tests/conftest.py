@@ -0,0 +1,16 @@
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+# The modules read their configuration from the environment when imported,
+# so point temp storage and state at a scratch directory first
+_scratch = tempfile.mkdtemp(prefix='pdf-suite-tests-')
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ.setdefault('STORAGE_ROOT', os.path.join(_scratch, 'temp'))
+os.environ.setdefault('STATE_DIR', os.path.join(_scratch, 'state'))
+os.environ.setdefault('STORAGE_MIN_FREE_MB', '0')
+os.environ.setdefault('WORKER_POOL_SIZE', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,107 @@
+import time
+import threading
+
+import pytest
+
+import admission
+import cancellation
+import config
+
+
+def _controller(**kwargs) -> admission.AdmissionController:
+    options = dict(cost_budget=1, memory_budget=1 << 30, max_queue=8, queue_timeout=5)
+    options.update(kwargs)
+    return admission.AdmissionController(**options)
+
+
+def _wait_queued(controller, count: int) -> None:
+    for _ in range(200):
+        if controller.snapshot()['queued'] == count:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"expected {count} queued requests")
+
+
+def _queue(controller, session: str, name: str, order: list) -> threading.Thread:
+    def run():
+        with controller.admit(session, 1):
+            order.append(name)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_queued_sessions_are_served_round_robin():
+    controller = _controller()
+    holder = controller.acquire('other', 1)
+    order, threads = [], []
+    # One session queues three jobs, then another queues one
+    for session, name in [('a', 'a1'), ('a', 'a2'), ('a', 'a3'), ('b', 'b1')]:
+        threads.append(_queue(controller, session, name, order))
+        _wait_queued(controller, len(threads))
+
+    controller.release(holder)
+    for thread in threads:
+        thread.join(5)
+    assert order == ['a1', 'b1', 'a2', 'a3']
+    assert controller.snapshot()['running'] == 0
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    controller = _controller(max_queue=1)
+    holder = controller.acquire('a', 1)
+    thread = _queue(controller, 'b', 'b1', [])
+    _wait_queued(controller, 1)
+
+    with pytest.raises(admission.AdmissionRejected) as e:
+        controller.acquire('c', 1)
+    assert e.value.retry_after >= 1
+    assert controller.snapshot()['rejected_total'] == 1
+
+    controller.release(holder)
+    thread.join(5)
+
+
+def test_queue_timeout_rejects_and_leaves_the_queue():
+    controller = _controller(queue_timeout=0.2)
+    holder = controller.acquire('a', 1)
+    with pytest.raises(admission.AdmissionRejected):
+        controller.acquire('b', 1)
+    assert controller.snapshot()['queued'] == 0
+    controller.release(holder)
+
+
+def test_job_larger_than_the_budget_runs_when_idle():
+    controller = _controller()
+    ticket = controller.acquire('a', 100)
+    assert ticket.granted
+    controller.release(ticket)
+
+
+def test_cancelled_request_leaves_the_queue():
+    controller = _controller()
+    holder = controller.acquire('a', 1)
+    token = cancellation.CancelToken()
+    threading.Timer(0.1, token.cancel, args=(cancellation.CLIENT_DISCONNECTED,)).start()
+
+    with cancellation.scope(token), pytest.raises(cancellation.Cancelled) as e:
+        controller.acquire('b', 1)
+    assert e.value.reason == cancellation.CLIENT_DISCONNECTED
+    assert controller.snapshot()['queued'] == 0
+    controller.release(holder)
+
+
+def test_estimate_cost_scales_with_dpi():
+    cost_72, memory_72 = admission.estimate_cost('compress', 10, dpi=72)
+    cost_144, memory_144 = admission.estimate_cost('compress', 10, dpi=144)
+    assert cost_144 == pytest.approx(4 * cost_72)
+    assert memory_144 > memory_72
+
+
+def test_estimate_cost_charges_bilevel_render_scale():
+    compress_cost, compress_memory = admission.estimate_cost('compress', 10, dpi=72)
+    jpg_cost, jpg_memory = admission.estimate_cost('pdf_to_jpg', 10, dpi=72)
+    factor = config.COMPRESS_BILEVEL_SCALE ** 2
+    assert compress_cost == pytest.approx(factor * jpg_cost)
+    assert compress_memory == factor * jpg_memory
@@ -0,0 +1,80 @@
+import os
+
+import assets
+
+FONT_CSS = """@font-face {
+  font-family: 'Outfit';
+  src: url(outfit-latin.woff2) format('woff2');
+}
+@font-face {
+  font-family: 'Outfit';
+  src: url("outfit-latin-ext.woff2") format('woff2');
+}
+"""
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _font_source(tmp_path) -> str:
+    source = tmp_path / 'fonts-src'
+    _write(str(source / 'outfit.css'), FONT_CSS.encode())
+    _write(str(source / 'outfit-latin.woff2'), b'wOF2 latin')
+    _write(str(source / 'outfit-latin-ext.woff2'), b'wOF2 latin-ext')
+    return str(source)
+
+
+def test_missing_vendored_lists_everything_on_a_fresh_checkout(tmp_path):
+    missing = assets.missing_vendored(str(tmp_path))
+    assert missing == [f"{assets.PDFJS_DIR}/{name}" for name in assets.PDFJS_FILES] + [assets.FONTS_CSS]
+
+
+def test_fetch_from_local_sources_completes_the_vendored_files(tmp_path):
+    static_dir = str(tmp_path / 'static')
+    pdfjs_source = tmp_path / 'pdfjs-dist' / 'build'
+    for name in assets.PDFJS_FILES:
+        _write(str(pdfjs_source / name), b'export {};')
+
+    assets.fetch_pdfjs(str(pdfjs_source), static_dir)
+    assets.fetch_fonts(_font_source(tmp_path), static_dir)
+
+    assert assets.missing_vendored(static_dir) == []
+    with open(os.path.join(static_dir, *assets.FONTS_CSS.split('/')), encoding='utf-8') as f:
+        css = f.read()
+    assert 'url(outfit-latin.woff2)' in css and 'url(outfit-latin-ext.woff2)' in css
+
+
+def test_missing_font_file_is_reported(tmp_path):
+    static_dir = str(tmp_path / 'static')
+    assets.fetch_fonts(_font_source(tmp_path), static_dir)
+    os.remove(os.path.join(static_dir, *assets.FONTS_DIR.split('/'), 'outfit-latin-ext.woff2'))
+    assert f"{assets.FONTS_DIR}/outfit-latin-ext.woff2" in assets.missing_vendored(static_dir)
+
+
+def test_build_points_the_font_stylesheet_at_fingerprinted_fonts(tmp_path):
+    static_dir = str(tmp_path / 'static')
+    assets.fetch_fonts(_font_source(tmp_path), static_dir)
+    manifest = assets.build(static_dir, str(tmp_path / 'dist'))
+
+    with open(os.path.join(str(tmp_path / 'dist'), manifest[assets.FONTS_CSS]), encoding='utf-8') as f:
+        css = f.read()
+    assert os.path.basename(manifest[f"{assets.FONTS_DIR}/outfit-latin.woff2"]) in css
+
+
+def test_urls_fall_back_to_cdns_until_vendored(tmp_path, monkeypatch):
+    import app as app_module
+
+    static_dir = str(tmp_path / 'static')
+    monkeypatch.setattr(assets, 'STATIC_DIR', static_dir)
+    monkeypatch.setattr(assets, 'DIST_DIR', str(tmp_path / 'dist'))
+    with app_module.app.test_request_context():
+        assert assets.pdfjs_url('pdf.min.mjs') == assets.PDFJS_CDN + 'pdf.min.mjs'
+        assert assets.fonts_url() == assets.FONTS_SOURCE
+
+        _write(os.path.join(static_dir, *assets.PDFJS_DIR.split('/'), 'pdf.min.mjs'), b'export {};')
+        assets.fetch_fonts(_font_source(tmp_path), static_dir)
+        assert assets.pdfjs_url('pdf.min.mjs') == f"/static/{assets.PDFJS_DIR}/pdf.min.mjs"
+        assert assets.fonts_url() == f"/static/{assets.FONTS_CSS}"
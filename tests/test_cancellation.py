@@ -0,0 +1,85 @@
+import io
+import os
+
+import fitz
+import pytest
+
+import app as app_module
+import cancellation
+import worker_pool
+
+
+def _pdf_bytes(pages: int = 2) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {i + 1}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def client():
+    app_module.app.config['TESTING'] = True
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def cancelled_worker(monkeypatch):
+    """Workers write part of their output, then the job is cancelled."""
+    written = []
+    real_run = worker_pool.run
+
+    def run(func_name, *args, **kwargs):
+        if func_name not in ('rotate_pdf', 'reorder_pdf', 'protect_pdf', 'unlock_pdf', 'analyze_pdf'):
+            return real_run(func_name, *args, **kwargs)
+        if func_name != 'analyze_pdf':
+            output_path = args[1]
+            with open(output_path, 'wb') as f:
+                f.write(b'%PDF-partial')
+            written.append(output_path)
+        raise cancellation.Cancelled()
+
+    monkeypatch.setattr(worker_pool, 'run', run)
+    return written
+
+
+@pytest.mark.parametrize('route, field, form', [
+    ('/rotate', 'file', {'rotations': '{"1": 90}'}),
+    ('/sort-pdf', 'file', {'page_order': '[2, 1]'}),
+    ('/protect', 'files[]', {'user_password': 'secret'}),
+    ('/unlock', 'files[]', {'password': ''}),
+])
+def test_cancelled_job_discards_partial_output(client, cancelled_worker, route, field, form):
+    data = dict(form, **{field: (io.BytesIO(_pdf_bytes()), 'doc.pdf')})
+    response = client.post(route, data=data, content_type='multipart/form-data')
+    assert response.status_code == 503
+    assert response.get_json()['error'].startswith('Cancelled')
+    assert cancelled_worker
+    assert not any(os.path.exists(path) for path in cancelled_worker)
+
+
+def test_cancelled_analysis_is_reported(client, cancelled_worker):
+    data = {'file': (io.BytesIO(_pdf_bytes()), 'doc.pdf')}
+    response = client.post('/analyze', data=data, content_type='multipart/form-data')
+    assert response.status_code == 503
+
+
+def test_async_job_cancelled_during_warm_up_is_never_sent(tmp_path):
+    import asyncio
+    from async_services import AsyncPDFServices
+
+    async def scenario():
+        async with AsyncPDFServices(workers=1, tmp_dir=str(tmp_path)) as pdf:
+            # The worker is still importing its libraries
+            task = asyncio.ensure_future(pdf.compress(_pdf_bytes()))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # The job had stopped before its staged input was removed
+            assert pdf._slots._value == pdf.max_pending
+            assert not os.listdir(tmp_path)
+            assert [worker.jobs for worker in pdf._pool._idle.queue] == [0]
+
+    asyncio.run(scenario())
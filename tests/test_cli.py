@@ -0,0 +1,35 @@
+import os
+
+import fitz
+import pytest
+
+import cli
+
+
+@pytest.fixture
+def one_page_pdf(tmp_path):
+    path = tmp_path / 'in' / 'doc.pdf'
+    path.parent.mkdir()
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Hello")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.mark.parametrize('command, options, output', [
+    ('compress', ['--level', 'recommended'], 'doc.pdf'),
+    ('merge', [], None),
+    ('split', [], 'doc'),
+    ('watermark', ['--text', 'DRAFT'], 'doc.pdf'),
+    ('to-jpg', ['--dpi', '36'], 'doc'),
+])
+def test_every_command_runs(tmp_path, one_page_pdf, command, options, output):
+    target = str(tmp_path / ('merged.pdf' if output is None else 'out'))
+    report = str(tmp_path / 'report.json')
+    assert cli.main([command, one_page_pdf, '-o', target, '-j', '1', '--report', report] + options) == 0
+
+    produced = target if output is None else os.path.join(target, output)
+    assert os.path.exists(produced)
+    if os.path.isdir(produced):
+        assert os.listdir(produced)
@@ -0,0 +1,104 @@
+import fitz
+
+import pdf_services
+
+
+def _text_page(doc, text: str, rotate: int = 0):
+    page = doc.new_page()
+    page.insert_text((72, 72), text, fontsize=24)
+    if rotate:
+        page.set_rotation(rotate)
+    return page
+
+
+def _fingerprints(doc):
+    return [pdf_services._page_fingerprint(doc, page) for page in doc]
+
+
+def _image_bytes(color) -> bytes:
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), False)
+    pix.set_rect(pix.irect, color)
+    return pix.tobytes('png')
+
+
+def test_identical_pages_share_a_fingerprint():
+    doc = fitz.open()
+    _text_page(doc, "Separator")
+    _text_page(doc, "Chapter 1")
+    _text_page(doc, "Separator")
+    doc.new_page()
+    doc.new_page()
+    first, chapter, again, blank, blank_again = _fingerprints(doc)
+    assert first == again
+    assert first != chapter
+    assert blank == blank_again and blank != first
+
+
+def test_geometry_and_rotation_are_part_of_the_fingerprint():
+    doc = fitz.open()
+    _text_page(doc, "Same")
+    _text_page(doc, "Same", rotate=90)
+    doc.new_page(width=300, height=300)
+    doc.new_page(width=400, height=300)
+    upright, rotated, square, wide = _fingerprints(doc)
+    assert upright != rotated
+    assert square != wide
+
+
+def test_same_image_embedded_twice_matches():
+    doc = fitz.open()
+    for color in ((255, 0, 0), (255, 0, 0), (0, 0, 255)):
+        # Separate objects with the same data, as when two files with the same scan are merged
+        single = fitz.open()
+        single.new_page().insert_image(fitz.Rect(0, 0, 200, 200), stream=_image_bytes(color))
+        doc.insert_pdf(single)
+    red, red_again, blue = _fingerprints(doc)
+    assert len({image[0] for page in doc for image in page.get_images()}) == 3
+    assert red == red_again
+    assert red != blue
+
+
+def test_annotated_pages_only_match_themselves():
+    doc = fitz.open()
+    for _ in range(2):
+        _text_page(doc, "Reviewed").add_text_annot((100, 100), "note")
+    first, second = _fingerprints(doc)
+    assert first and second and first != second
+
+
+def test_compress_encodes_duplicate_pages_once(tmp_path):
+    source, output = tmp_path / 'in.pdf', tmp_path / 'out.pdf'
+    doc = fitz.open()
+    for text in ("Cover", "Separator", "Body", "Separator", "Separator"):
+        _text_page(doc, text)
+    doc.save(str(source))
+
+    pdf_services.compress_pdf(str(source), str(output))
+    with fitz.open(str(output)) as out:
+        assert out.page_count == 5
+        per_page = [page.get_images()[0][0] for page in out]
+    assert per_page[1] == per_page[3] == per_page[4]
+    assert len(set(per_page)) == 3
+
+
+def _page_with_state(doc, state: str):
+    """A page whose content stream is always the same; only its /G0 graphics state differs."""
+    page = doc.new_page(width=200, height=200)
+    gstate = doc.get_new_xref()
+    doc.update_object(gstate, state)
+    contents = doc.get_new_xref()
+    doc.update_object(contents, "<<>>")
+    doc.update_stream(contents, b"/G0 gs 1 0 0 rg 20 20 160 160 re f")
+    doc.xref_set_key(page.xref, "Contents", f"{contents} 0 R")
+    doc.xref_set_key(page.xref, "Resources", f"<</ExtGState<</G0 {gstate} 0 R>>>>")
+    return page
+
+
+def test_graphics_state_is_part_of_the_fingerprint():
+    doc = fitz.open()
+    _page_with_state(doc, "<</Type/ExtGState/ca 0.5>>")
+    _page_with_state(doc, "<</Type/ExtGState/ca 0.5>>")
+    _page_with_state(doc, "<</Type/ExtGState/ca 1>>")
+    half, half_again, opaque = _fingerprints(doc)
+    assert half == half_again
+    assert half != opaque
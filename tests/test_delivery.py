@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+import app as app_module
+import delivery
+
+BODY = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def client():
+    app_module.app.config['TESTING'] = True
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def output(tmp_path):
+    path = str(tmp_path / 'result.pdf')
+    with open(path, 'wb') as f:
+        f.write(BODY)
+    with app_module.app.app_context():
+        return path, delivery.register_output(path, 'result.pdf')
+
+
+def _get(client, output_id, **headers):
+    return client.get(f"/outputs/{output_id}", headers=headers, buffered=False)
+
+
+def test_range_request_gets_a_partial_response_and_keeps_the_file(client, output):
+    path, output_id = output
+    response = _get(client, output_id, Range='bytes=10-19')
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f"bytes 10-19/{len(BODY)}"
+    assert response.get_data() == BODY[10:20]
+    response.close()
+    assert os.path.exists(path)
+
+
+def test_matching_etag_gets_not_modified_and_keeps_the_file(client, output):
+    path, output_id = output
+    head = _get(client, output_id, Range='bytes=0-0')
+    etag = head.headers['ETag']
+    head.close()
+
+    response = _get(client, output_id, **{'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    response.close()
+    assert os.path.exists(path)
+
+
+def test_single_use_file_is_deleted_after_a_complete_send(client, output):
+    path, output_id = output
+    response = _get(client, output_id)
+    assert response.status_code == 200
+    assert response.headers['Content-Location'] == f"/outputs/{output_id}"
+    assert response.get_data() == BODY
+    assert os.path.exists(path)  # still open until the server closes the body
+    response.close()
+    assert not os.path.exists(path)
+
+
+def test_interrupted_send_keeps_the_file_for_a_retry(client, output):
+    path, output_id = output
+    response = _get(client, output_id)
+    next(iter(response.response))
+    response.close()
+    assert os.path.exists(path)
+
+    retry = _get(client, output_id, Range="bytes=100-")
+    assert retry.status_code == 206
+    assert retry.get_data() == BODY[100:]
+    retry.close()
+    assert os.path.exists(path)
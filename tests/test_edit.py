@@ -0,0 +1,83 @@
+import io
+import os
+
+import fitz
+import pytest
+
+import admission
+import app as app_module
+import cancellation
+import worker_pool
+
+
+def _pdf_bytes() -> bytes:
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Edit me")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _png_bytes() -> bytes:
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), False)
+    pix.set_rect(pix.irect, (255, 0, 0))
+    return pix.tobytes('png')
+
+
+@pytest.fixture
+def client():
+    app_module.app.config['TESTING'] = True
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def reserved(monkeypatch):
+    """Every temp path the request reserves (image assets and the output)."""
+    paths = []
+    temp_path = app_module.temp_path
+
+    def record(*args, **kwargs):
+        path = temp_path(*args, **kwargs)
+        paths.append(path)
+        return path
+
+    monkeypatch.setattr(app_module, 'temp_path', record)
+    return paths
+
+
+def _post_edit(client):
+    data = {
+        'file': (io.BytesIO(_pdf_bytes()), 'doc.pdf'),
+        'edits': '{}',
+        'image_assets_logo': (io.BytesIO(_png_bytes()), 'logo.png'),
+    }
+    return client.post('/edit-pdf', data=data, content_type='multipart/form-data')
+
+
+def test_rejected_edit_leaves_nothing_behind(client, reserved, monkeypatch):
+    def reject(*args, **kwargs):
+        raise admission.AdmissionRejected(retry_after=5)
+
+    monkeypatch.setattr(admission.controller, 'admit', reject)
+    response = _post_edit(client)
+    assert response.status_code == 503
+    assert len(reserved) == 3  # the input, the image asset and the output
+    assert not any(os.path.exists(path) for path in reserved)
+
+
+@pytest.mark.parametrize('error', [cancellation.Cancelled(), RuntimeError("edit failed")])
+def test_failed_edit_discards_partial_output(client, reserved, monkeypatch, error):
+    real_run = worker_pool.run
+
+    def run(func_name, *args, **kwargs):
+        if func_name != 'apply_edits':
+            return real_run(func_name, *args, **kwargs)
+        with open(args[1], 'wb') as f:
+            f.write(b'%PDF-partial')
+        raise error
+
+    monkeypatch.setattr(worker_pool, 'run', run)
+    response = _post_edit(client)
+    assert response.status_code == (503 if isinstance(error, cancellation.Cancelled) else 500)
+    assert len(reserved) == 3
+    assert not any(os.path.exists(path) for path in reserved)
@@ -0,0 +1,84 @@
+import fitz
+import pytest
+from PIL import Image
+
+import image_ingest
+
+RED, BLUE, WHITE = (255, 0, 0), (0, 0, 255), (255, 255, 255)
+
+
+def _write_pdf(tmp_path, *images):
+    output = str(tmp_path / 'out.pdf')
+    assert image_ingest.write_images_pdf([str(path) for path in images], output) == len(images)
+    return fitz.open(output)
+
+
+def _pixel(page, x: float, y: float) -> tuple:
+    """Colour at (x, y), as fractions of the displayed page."""
+    pix = page.get_pixmap(dpi=72, colorspace=fitz.csRGB, alpha=False)
+    return pix.pixel(int(x * (pix.width - 1)), int(y * (pix.height - 1)))
+
+
+def _close(color, expected, tolerance: int = 40) -> bool:
+    return all(abs(a - b) <= tolerance for a, b in zip(color, expected))
+
+
+def test_exif_orientation_6_turns_the_page(tmp_path):
+    # Stored 200x100, left half red; orientation 6 shows it turned 90 degrees clockwise
+    img = Image.new('RGB', (200, 100), BLUE)
+    img.paste(RED, (0, 0, 100, 100))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    path = tmp_path / 'rotated.jpg'
+    img.save(path, quality=95, dpi=(72, 72), exif=exif.tobytes())
+
+    probed = image_ingest.probe_jpeg(str(path))
+    assert probed.orientation == 6
+    page = _write_pdf(tmp_path, path)[0]
+    assert (round(page.rect.width), round(page.rect.height)) == (100, 200)
+    # The stored left edge is now at the top
+    assert _close(_pixel(page, 0.5, 0.1), RED)
+    assert _close(_pixel(page, 0.5, 0.9), BLUE)
+
+
+def test_cmyk_jpeg_is_embedded_as_is_with_its_colours(tmp_path):
+    path = tmp_path / 'cmyk.jpg'
+    # PIL writes CMYK JPEGs Adobe-style, with inverted samples
+    Image.new('CMYK', (60, 60), (255, 0, 0, 0)).save(path, quality=95)
+
+    probed = image_ingest.probe_jpeg(str(path))
+    assert probed.colorspace == '/DeviceCMYK'
+    assert probed.decode == '[1 0 1 0 1 0 1 0]'
+    page = _write_pdf(tmp_path, path)[0]
+    assert page.get_images(full=True)[0][8] == 'DCTDecode'
+    r, g, b = _pixel(page, 0.5, 0.5)
+    assert r < 100 and g > 150 and b > 200  # cyan
+
+
+def test_alpha_png_gets_a_soft_mask(tmp_path):
+    img = Image.new('RGBA', (40, 40), (0, 0, 0, 0))
+    img.paste((255, 0, 0, 255), (0, 0, 20, 40))
+    path = tmp_path / 'alpha.png'
+    img.save(path)
+
+    assert image_ingest.probe_png(str(path)) is None  # needs decoding
+    page = _write_pdf(tmp_path, path)[0]
+    assert page.get_images(full=True)[0][1] != 0  # smask xref
+    assert _close(_pixel(page, 0.25, 0.5), RED)
+    assert _close(_pixel(page, 0.75, 0.5), WHITE)
+
+
+@pytest.mark.parametrize('mode, fill, expected', [
+    ('P', RED, RED),
+    ('I;16', 65535, WHITE),
+    ('RGB', BLUE, BLUE),
+])
+def test_png_modes_render_their_colours(tmp_path, mode, fill, expected):
+    path = tmp_path / f"{mode.replace(';', '')}.png"
+    img = Image.new('RGB', (30, 30), fill) if mode == 'P' else Image.new(mode, (30, 30), fill)
+    if mode == 'P':
+        img = img.convert('P')
+    img.save(path)
+
+    page = _write_pdf(tmp_path, path)[0]
+    assert _close(_pixel(page, 0.5, 0.5), expected)
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+import app as app_module
+from benchmarks import loadtest
+
+
+@pytest.fixture
+def client():
+    app_module.app.config['TESTING'] = True
+    return app_module.app.test_client()
+
+
+def test_health_reports_state(client):
+    response = client.get('/health')
+    assert response.status_code in (200, 503)
+    assert response.get_json()['status'] in ('ok', 'busy', 'starting')
+
+
+@pytest.mark.parametrize('path', ['/', '/rotate', '/split', '/sort', '/compress', '/edit-pdf'])
+def test_pages_render(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    assert b'pdf.min.mjs' in response.data
+
+
+def test_app_py_starts_and_becomes_ready():
+    # The load test harness starts the server exactly like this
+    workdir = tempfile.mkdtemp(prefix='server-test-')
+    process = None
+    try:
+        process, url, log_path = loadtest.start_server(workdir, threads=2, pool_size=0)
+        try:
+            loadtest.wait_ready(url, process, timeout=60)
+        except RuntimeError:
+            with open(log_path, errors='replace') as f:
+                pytest.fail(f"Server did not start:\n{f.read()[-2000:]}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,100 @@
+import os
+import random
+
+import fitz
+import pytest
+
+import pdf_services
+
+KB = 1024
+
+
+def _noise_pixmap(seed: int, size: int = 100) -> fitz.Pixmap:
+    """An RGB image that does not compress: about size * size * 3 bytes in the PDF."""
+    samples = random.Random(seed).randbytes(size * size * 3)
+    return fitz.Pixmap(fitz.csRGB, size, size, samples, 0)
+
+
+def _make_pdf(path, pages: int, shared: bool = False) -> str:
+    doc = fitz.open()
+    for pno in range(pages):
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(50, 50, 250, 250), pixmap=_noise_pixmap(0 if shared else pno))
+        page.insert_text((50, 300), f"Page {pno + 1}")
+    doc.save(str(path), deflate=True)
+    doc.close()
+    return str(path)
+
+
+def _page_runs(paths):
+    """Page texts of each output part, to check order and coverage."""
+    runs = []
+    for path in paths:
+        with fitz.open(path) as doc:
+            runs.append([page.get_text().strip() for page in doc])
+    return runs
+
+
+def test_parts_stay_under_the_limit_and_keep_page_order(tmp_path):
+    source = _make_pdf(tmp_path / 'in.pdf', 10)
+    out = tmp_path / 'out'
+    out.mkdir()
+    parts = pdf_services.split_pdf(source, str(out), max_bytes=100 * KB)
+
+    assert len(parts) > 1
+    assert all(os.path.getsize(path) <= 100 * KB for path in parts)
+    runs = _page_runs(parts)
+    assert [text for run in runs for text in run] == [f"Page {n}" for n in range(1, 11)]
+    # Packed as few as fit: no two neighbouring parts would fit together
+    assert len(parts) <= 10 * 30 * KB // (100 * KB) + 2
+
+
+def test_shared_resources_are_counted_once_per_part(tmp_path):
+    source = _make_pdf(tmp_path / 'in.pdf', 10, shared=True)
+    out = tmp_path / 'out'
+    out.mkdir()
+    parts = pdf_services.split_pdf(source, str(out), max_bytes=100 * KB)
+    assert len(parts) == 1
+
+
+def test_underestimated_part_is_halved_until_it_fits(tmp_path, monkeypatch):
+    source = _make_pdf(tmp_path / 'in.pdf', 8)
+    out = tmp_path / 'out'
+    out.mkdir()
+    # An estimator that is far off: everything in one part
+    monkeypatch.setattr(pdf_services, '_pack_pages', lambda estimator, pages, max_bytes: [pages])
+    parts = pdf_services.split_pdf(source, str(out), max_bytes=70 * KB)
+
+    assert len(parts) > 1
+    assert all(os.path.getsize(path) <= 70 * KB for path in parts)
+    assert [text for run in _page_runs(parts) for text in run] == [f"Page {n}" for n in range(1, 9)]
+    # Oversized attempts are removed, only the written parts are left
+    assert sorted(os.listdir(out)) == sorted(os.path.basename(path) for path in parts)
+    names = [os.path.basename(path) for path in parts]
+    assert names[0].startswith('part_1_pages_1-') and names[-1].endswith('8.pdf')
+
+
+def test_page_above_the_limit_gets_its_own_part(tmp_path):
+    source = _make_pdf(tmp_path / 'in.pdf', 3)
+    out = tmp_path / 'out'
+    out.mkdir()
+    parts = pdf_services.split_pdf(source, str(out), max_bytes=20 * KB)
+    assert len(parts) == 3
+    assert all(os.path.getsize(path) > 20 * KB for path in parts)
+
+
+def test_size_mode_respects_the_page_selection(tmp_path):
+    source = _make_pdf(tmp_path / 'in.pdf', 6)
+    out = tmp_path / 'out'
+    out.mkdir()
+    parts = pdf_services.split_pdf(source, str(out), page_selection=[1, 2, 3, 99], max_bytes=1024 * KB)
+    assert _page_runs(parts) == [["Page 2", "Page 3", "Page 4"]]
+
+
+@pytest.mark.parametrize('pages, max_bytes', [([0, 1, 2, 3], 100 * KB), ([2, 3], 40 * KB)])
+def test_pack_pages_groups_consecutive_pages(tmp_path, pages, max_bytes):
+    source = _make_pdf(tmp_path / 'in.pdf', 4)
+    with fitz.open(source) as doc:
+        groups = pdf_services._pack_pages(pdf_services._PageSizeEstimator(doc), pages, max_bytes)
+    assert [p for group in groups for p in group] == pages
+    assert all(len(group) * 30 * KB <= max_bytes or len(group) == 1 for group in groups)
@@ -0,0 +1,23 @@
+import pytest
+
+import state
+
+
+def test_incomplete_backend_fails_when_created():
+    class NoDelete(state.MetadataStore):
+        def get(self, namespace, key):
+            return None
+
+        def put(self, namespace, key, value, ttl=None):
+            pass
+
+    with pytest.raises(TypeError):
+        NoDelete()
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    store = state.SQLiteStore(str(tmp_path / 'metadata.db'))
+    store.put('jobs', 'a', {'status': 'done'})
+    assert store.get('jobs', 'a') == {'status': 'done'}
+    store.delete('jobs', 'a')
+    assert store.get('jobs', 'a') is None
@@ -0,0 +1,65 @@
+import os
+import time
+
+import pytest
+
+import storage
+
+
+def _store(tmp_path, **kwargs) -> storage.TempStorage:
+    options = dict(evict_grace=60, usage_refresh=3600)
+    options.update(kwargs)
+    disk = storage.Backend('disk', str(tmp_path / 'disk'), quota_bytes=options.pop('quota', 1000))
+    return storage.TempStorage(disk, **options)
+
+
+def _write(store, name: str, size: int, age: float = 0, session: str = None) -> str:
+    path = store.allocate(name, session=session, size_hint=size)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    if age:
+        os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+
+def test_idle_entries_are_evicted_for_room(tmp_path):
+    store = _store(tmp_path)
+    old = _write(store, 'old', 600, age=120)
+    _write(store, 'new', 300)
+    _write(store, 'next', 400)
+    assert not os.path.exists(old)
+
+
+def test_pinned_inputs_are_not_evicted(tmp_path):
+    store = _store(tmp_path)
+    old = _write(store, 'old', 600, age=120)
+    with store.pinned(old):
+        with pytest.raises(storage.StorageFull):
+            store.allocate('next', size_hint=600)
+    assert os.path.exists(old)
+    # Released, and touched when pinned, so only evictable once idle again
+    os.utime(old, (time.time() - 120, time.time() - 120))
+    store.allocate('next', size_hint=600)
+    assert not os.path.exists(old)
+
+
+def test_allocations_add_to_the_running_total(tmp_path):
+    store = _store(tmp_path)
+    store.allocate('a', size_hint=400)
+    store.allocate('b', size_hint=400)
+    assert store.snapshot()['disk']['used_bytes'] == 800
+
+
+def test_removed_files_are_noticed_before_refusing(tmp_path):
+    store = _store(tmp_path)
+    path = _write(store, 'done', 900)
+    os.remove(path)  # downloaded and deleted outside the store
+    store.allocate('next', size_hint=900)
+
+
+def test_session_quota(tmp_path):
+    store = _store(tmp_path, quota=0, session_quota_bytes=1000)
+    _write(store, 'a', 800, session='s1')
+    with pytest.raises(storage.StorageFull):
+        store.allocate('b', session='s1', size_hint=300)
+    store.allocate('c', session='s2', size_hint=300)
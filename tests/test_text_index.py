@@ -0,0 +1,63 @@
+import fitz
+import pytest
+
+import text_index
+
+PAGES = [
+    "Send the invoice by e-mail to accounts.",
+    "Invoices are archived after payment.",
+    "The email address changed; mail the archive instead.",
+]
+
+
+@pytest.fixture
+def indexed_pdf(tmp_path):
+    pdf_path = str(tmp_path / 'doc.pdf')
+    doc = fitz.open()
+    for text in PAGES:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(pdf_path)
+    doc.close()
+
+    index_path = str(tmp_path / 'doc.index.json.gz')
+    summary = text_index.build_index(pdf_path, index_path)
+    assert summary['page_count'] == len(PAGES)
+    return pdf_path, text_index.load_index(index_path)
+
+
+def test_words_match_case_insensitively(indexed_pdf):
+    _, index = indexed_pdf
+    assert list(index.search('INVOICE')) == [0]
+    assert list(index.search('archive')) == [2]
+
+
+def test_all_words_must_be_on_the_page(indexed_pdf):
+    _, index = indexed_pdf
+    assert list(index.search('invoice accounts')) == [0]
+    assert index.search('invoice payment') == {}
+
+
+def test_prefix_query(indexed_pdf):
+    _, index = indexed_pdf
+    assert list(index.search('invoice*')) == [0, 1]
+    assert list(index.search('archiv*')) == [1, 2]
+
+
+def test_phrase_requires_consecutive_words(indexed_pdf):
+    _, index = indexed_pdf
+    assert list(index.search('the invoice', phrase=True)) == [0]
+    assert index.search('invoice the', phrase=True) == {}
+    assert list(index.search('invoice the')) == [0]
+
+
+def test_phrase_inside_one_word(indexed_pdf):
+    # get_text('words') returns "e-mail" as one word of two tokens
+    pdf_path, index = indexed_pdf
+    matches = index.search('e-mail', phrase=True)
+    assert list(matches) == [0]
+    assert index.search('e mail', phrase=True) == matches
+
+    pages = text_index.word_rects(pdf_path, matches)
+    assert [page['page'] for page in pages] == [1]
+    # Both tokens belong to the same word, so there is one rectangle
+    assert len(pages[0]['rects']) == 1
@@ -0,0 +1,81 @@
+import io
+import hashlib
+
+import pytest
+
+import uploads
+
+DATA = bytes(range(256)) * 1000  # 256 kB
+
+
+def _upload(data: bytes, chunk: int, size=None) -> str:
+    upload_id = uploads.create_upload('doc.pdf', size)['upload_id']
+    for offset in range(0, len(data), chunk):
+        uploads.append_chunk(upload_id, offset, io.BytesIO(data[offset:offset + chunk]))
+    return upload_id
+
+
+def test_chunks_assemble_and_verify():
+    upload_id = _upload(DATA, 100_000, len(DATA))
+    info = uploads.finalize_upload(upload_id, hashlib.sha256(DATA).hexdigest())
+    path, name = uploads.get_document(info['doc_id'])
+    assert name == 'doc.pdf'
+    assert info['size'] == len(DATA)
+    with open(path, 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_offset_mismatch_reports_expected_offset():
+    upload_id = _upload(DATA[:1000], 1000)
+    with pytest.raises(uploads.OffsetMismatchError) as e:
+        uploads.append_chunk(upload_id, 500, io.BytesIO(DATA[500:1500]))
+    assert e.value.expected == 1000
+    # Nothing was written by the rejected chunk
+    assert uploads.get_upload_status(upload_id)['offset'] == 1000
+
+
+def test_resume_after_interrupted_chunk():
+    upload_id = uploads.create_upload('doc.pdf', len(DATA))['upload_id']
+
+    class Dropped(io.BytesIO):
+        """A body whose connection drops after the first block."""
+
+        def read(self, size=-1):
+            if self.tell():
+                raise ConnectionError("client went away")
+            return super().read(size)
+
+    with pytest.raises(ConnectionError):
+        uploads.append_chunk(upload_id, 0, Dropped(DATA))
+    offset = uploads.get_upload_status(upload_id)['offset']
+    assert offset == uploads.READ_BUFFER_SIZE
+
+    uploads.append_chunk(upload_id, offset, io.BytesIO(DATA[offset:]))
+    info = uploads.finalize_upload(upload_id, hashlib.sha256(DATA).hexdigest())
+    assert info['size'] == len(DATA)
+
+
+def test_hash_rebuilt_when_state_is_lost():
+    # As after a restart, or when another process appended the last chunk
+    upload_id = _upload(DATA, 64_000)
+    uploads._hashers.pop(upload_id)
+    info = uploads.finalize_upload(upload_id)
+    assert info['sha256'] == hashlib.sha256(DATA).hexdigest()
+
+
+def test_checksum_mismatch_is_rejected():
+    upload_id = _upload(DATA, len(DATA))
+    with pytest.raises(uploads.UploadError, match="Checksum mismatch"):
+        uploads.finalize_upload(upload_id, hashlib.sha256(b'other').hexdigest())
+
+
+def test_incomplete_upload_cannot_be_finalized():
+    upload_id = _upload(DATA[:1000], 1000, size=len(DATA))
+    with pytest.raises(uploads.UploadError, match="incomplete"):
+        uploads.finalize_upload(upload_id)
+
+
+def test_chunk_beyond_declared_size_is_rejected():
+    upload_id = uploads.create_upload('doc.pdf', 10)['upload_id']
+    with pytest.raises(uploads.UploadError):
+        uploads.append_chunk(upload_id, 0, io.BytesIO(DATA[:11]))
@@ -0,0 +1,185 @@
+import os
+import re
+import gzip
+import json
+import logging
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List
+
+import cancellation
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+
+# Query syntax: words, optionally ending in '*' for prefix matches
+_TOKEN = re.compile(r'\w+')
+_QUERY_TOKEN = re.compile(r'(\w+)(\*?)')
+
+
+def tokenize(text: str) -> List[str]:
+    """Case-folded word tokens, as stored in the index."""
+    return [token.casefold() for token in _TOKEN.findall(text)]
+
+
+def build_index(file_path: str, index_path: str) -> dict:
+    """
+    Extract the text of every page and write an inverted index.
+
+    Positions are token numbers on the page, so the tokens of one word
+    ('e-mail') follow each other like separate words and phrase queries
+    match them. word_rects() maps them back to the page's get_text('words')
+    list by tokenizing it again, so rectangles are not stored. The index is
+    gzipped JSON: {term: [page, count, position..., page, count,
+    position...]} with 0-indexed pages, flattened to keep it small.
+
+    Args:
+        file_path: PDF to index.
+        index_path: Destination; written under a temporary name and renamed,
+            so concurrent builders and readers never see a partial file.
+
+    Returns:
+        Summary dict with 'page_count', 'terms' and 'words'.
+    """
+    import fitz
+
+    postings = defaultdict(dict)  # term -> {page: [positions]}
+    words_total = 0
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+        for pno in range(page_count):
+            cancellation.check()
+            words = doc[pno].get_text('words')
+            words_total += len(words)
+            for position, term in enumerate(term for word in words for term in tokenize(word[4])):
+                postings[term].setdefault(pno, []).append(position)
+
+    terms = {}
+    for term, pages in postings.items():
+        flat = []
+        for pno, positions in pages.items():
+            flat.append(pno)
+            flat.append(len(positions))
+            flat.extend(positions)
+        terms[term] = flat
+
+    partial = f"{index_path}.partial"
+    with gzip.open(partial, 'wt', encoding='utf-8', compresslevel=6) as f:
+        json.dump({'version': INDEX_VERSION, 'page_count': page_count, 'terms': terms}, f, separators=(',', ':'))
+    os.replace(partial, index_path)
+
+    logger.info(f"Indexed {page_count} pages, {len(terms)} terms of {file_path}")
+    return {'page_count': page_count, 'terms': len(terms), 'words': words_total}
+
+
+class TextIndex:
+    """A loaded index. Postings are decoded per term, on lookup."""
+
+    def __init__(self, data: dict):
+        self.page_count = data['page_count']
+        self.terms = data['terms']
+
+    def postings(self, term: str) -> Dict[int, List[int]]:
+        """{page: [positions]} for one exact term."""
+        flat = self.terms.get(term)
+        pages = {}
+        if not flat:
+            return pages
+        i = 0
+        while i < len(flat):
+            pno, count = flat[i], flat[i + 1]
+            pages[pno] = flat[i + 2:i + 2 + count]
+            i += 2 + count
+        return pages
+
+    def prefix_postings(self, prefix: str) -> Dict[int, List[int]]:
+        """Postings of all terms starting with `prefix`, merged."""
+        merged = defaultdict(list)
+        for term in self.terms:
+            if term.startswith(prefix):
+                for pno, positions in self.postings(term).items():
+                    merged[pno].extend(positions)
+        return {pno: sorted(positions) for pno, positions in merged.items()}
+
+    def search(self, query: str, phrase: bool = False) -> Dict[int, List[int]]:
+        """
+        Pages matching every word of the query.
+
+        Args:
+            query: Words; 'word*' matches any word starting with 'word'.
+            phrase: Require the words to be consecutive, in order.
+
+        Returns:
+            {page (0-indexed): sorted word positions of the hits}, in page order.
+        """
+        tokens = [(word.casefold(), bool(star)) for word, star in _QUERY_TOKEN.findall(query)]
+        if not tokens:
+            return {}
+        lists = [self.prefix_postings(word) if star else self.postings(word) for word, star in tokens]
+        pages = set(lists[0]).intersection(*lists[1:])
+
+        matches = {}
+        for pno in sorted(pages):
+            if phrase:
+                following = [set(postings[pno]) for postings in lists[1:]]
+                starts = [p for p in lists[0][pno]
+                          if all(p + offset in positions for offset, positions in enumerate(following, 1))]
+                hits = sorted({p + offset for p in starts for offset in range(len(tokens))})
+            else:
+                hits = sorted({p for postings in lists for p in postings[pno]})
+            if hits:
+                matches[pno] = hits
+        return matches
+
+
+@lru_cache(maxsize=32)
+def _load_cached(index_path: str, inode: int, size: int) -> TextIndex:
+    with gzip.open(index_path, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != INDEX_VERSION:
+        raise ValueError(f"Unsupported index version in {index_path}")
+    return TextIndex(data)
+
+
+def load_index(index_path: str) -> TextIndex:
+    """
+    Load an index, kept in memory so repeated searches take milliseconds.
+    Cached by inode and size, which change when build_index() replaces the
+    file (the mtime also changes whenever storage.touch() keeps it alive).
+    """
+    stat = os.stat(index_path)
+    return _load_cached(os.path.abspath(index_path), stat.st_ino, stat.st_size)
+
+
+def word_rects(file_path: str, positions: Dict[int, List[int]]) -> List[dict]:
+    """
+    Rectangles of indexed words, for highlighting.
+
+    Args:
+        file_path: The indexed PDF.
+        positions: {page (0-indexed): token positions}, as from TextIndex.search().
+
+    Returns:
+        One dict per page: 'page' (1-indexed), 'width' and 'height' in
+        points, and 'rects' as [x0, y0, x1, y1] from the top-left corner of
+        the page as displayed (rotation applied), one per word hit.
+    """
+    import fitz
+
+    results = []
+    with fitz.open(file_path) as doc:
+        for pno in sorted(positions):
+            if not 0 <= pno < doc.page_count:
+                continue
+            page = doc[pno]
+            words = page.get_text('words')
+            # Token position -> word number, as numbered by build_index()
+            owners = [n for n, word in enumerate(words) for _ in tokenize(word[4])]
+            hit_words = sorted({owners[p] for p in positions[pno] if p < len(owners)})
+            # Words come in unrotated coordinates; viewers show the rotated page
+            matrix = page.rotation_matrix
+            rects = [[round(v, 2) for v in fitz.Rect(words[n][:4]) * matrix] for n in hit_words]
+            results.append({'page': pno + 1, 'width': round(page.rect.width, 2),
+                            'height': round(page.rect.height, 2), 'rects': rects})
+    return results
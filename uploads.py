@@ -0,0 +1,236 @@
+import os
+import hashlib
+import secrets
+import threading
+import logging
+from typing import BinaryIO, Tuple
+from werkzeug.utils import secure_filename
+
+try:
+    import fcntl
+except ImportError:  # Windows: chunks are serialised per process only
+    fcntl = None
+
+from storage import store
+from state import metadata
+
+logger = logging.getLogger(__name__)
+
+# Size of the buffer used to copy a chunk body to disk. Memory use per
+# request is bounded by this, independent of the chunk or file size.
+READ_BUFFER_SIZE = 64 * 1024
+
+# Chunk size suggested to clients. Must stay below MAX_CONTENT_LENGTH.
+RECOMMENDED_CHUNK_SIZE = 8 * 1024 * 1024
+
+MAX_UPLOAD_SIZE = 4 * 1024 * 1024 * 1024  # 4GB per assembled file
+
+# Running sha256 state per active upload, with the offset it covers.
+# hashlib objects cannot be persisted, so after a restart, or when another
+# process appended the previous chunk, the state is rebuilt from the part file.
+_hashers = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+class UploadError(ValueError):
+    """Raised for invalid upload requests (unknown id, size exceeded...)."""
+
+
+class OffsetMismatchError(UploadError):
+    """Raised when a chunk does not start at the current end of the upload."""
+
+    def __init__(self, expected: int, received: int):
+        super().__init__(f"Offset mismatch: expected {expected}, got {received}")
+        self.expected = expected
+
+
+def _valid_id(upload_id: str) -> bool:
+    return bool(upload_id) and len(upload_id) == 32 and all(c in "0123456789abcdef" for c in upload_id)
+
+
+def _part_path(upload_id: str) -> str:
+    return store.disk_path(f"upload_{upload_id}.part")
+
+
+def _lock_for(upload_id: str) -> threading.Lock:
+    with _registry_lock:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _open_part(upload_id: str):
+    """
+    Open the part file for appending, holding an exclusive lock so that
+    processes (and hosts sharing STORAGE_ROOT) handle one chunk at a time.
+    """
+    try:
+        f = os.fdopen(os.open(_part_path(upload_id), os.O_WRONLY | os.O_APPEND), "ab")
+    except FileNotFoundError:
+        raise UploadError("Unknown upload")
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    return f
+
+
+def _load_meta(upload_id: str) -> dict:
+    meta = metadata.get('uploads', upload_id) if _valid_id(upload_id) else None
+    if meta is None:
+        raise UploadError("Unknown upload")
+    return meta
+
+
+def _rebuild_hasher(path: str):
+    """Re-hash an existing part file, streaming it in fixed-size blocks."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BUFFER_SIZE), b""):
+            hasher.update(block)
+    return hasher
+
+
+def create_upload(filename: str, total_size: int = None, session: str = None) -> dict:
+    """
+    Start a new chunked upload.
+
+    Args:
+        filename: Original client file name (sanitised before use).
+        total_size: Expected size in bytes, if the client knows it.
+        session: Owner, charged against the per-session storage quota.
+
+    Returns:
+        Upload state dict (upload_id, offset, size, chunk_size).
+    """
+    name = secure_filename(filename or "") or "upload.pdf"
+    if total_size is not None:
+        total_size = int(total_size)
+        if total_size < 0 or total_size > MAX_UPLOAD_SIZE:
+            raise UploadError("Declared size exceeds the upload limit")
+
+    upload_id = secrets.token_hex(16)
+    # Reserve the declared size up front; the part file is renamed into the
+    # document on finalize, so it must stay on the disk backend
+    part_path = store.allocate(f"upload_{upload_id}.part", session=session, size_hint=total_size, allow_ram=False)
+    open(part_path, "wb").close()
+    metadata.put('uploads', upload_id, {"filename": name, "size": total_size, "session": session},
+                 ttl=store.max_age)
+    _hashers[upload_id] = (hashlib.sha256(), 0)
+
+    logger.info(f"Started chunked upload {upload_id} for {name}")
+    return {"upload_id": upload_id, "offset": 0, "size": total_size, "chunk_size": RECOMMENDED_CHUNK_SIZE}
+
+
+def get_upload_status(upload_id: str) -> dict:
+    """Return the current offset of an upload so the client can resume."""
+    meta = _load_meta(upload_id)
+    return {
+        "upload_id": upload_id,
+        "offset": os.path.getsize(_part_path(upload_id)),
+        "size": meta.get("size"),
+        "chunk_size": RECOMMENDED_CHUNK_SIZE,
+    }
+
+
+def append_chunk(upload_id: str, offset: int, stream: BinaryIO) -> int:
+    """
+    Append a chunk read from ``stream`` at ``offset``.
+
+    The body is copied to disk in READ_BUFFER_SIZE blocks and fed to the
+    running hash as it goes, so a chunk is never held in memory. If the
+    connection drops mid-chunk, the bytes already written are kept and the
+    client resumes from the offset reported by get_upload_status().
+
+    Returns:
+        The new offset (bytes received so far).
+    """
+    meta = _load_meta(upload_id)
+    limit = meta.get("size") or MAX_UPLOAD_SIZE
+    part_path = _part_path(upload_id)
+
+    with _lock_for(upload_id), _open_part(upload_id) as f:
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            raise OffsetMismatchError(current, offset)
+
+        hasher, hashed = _hashers.get(upload_id, (None, 0))
+        if hasher is None or hashed != current:
+            hasher = _rebuild_hasher(part_path)
+
+        try:
+            while True:
+                block = stream.read(READ_BUFFER_SIZE)
+                if not block:
+                    break
+                if current + len(block) > limit:
+                    raise UploadError("Upload exceeds the declared size or upload limit")
+                f.write(block)
+                hasher.update(block)
+                current += len(block)
+            f.flush()
+            _hashers[upload_id] = (hasher, current)
+        except Exception:
+            # Disk and hash state may have diverged; rebuild on next chunk.
+            _hashers.pop(upload_id, None)
+            raise
+
+    metadata.touch('uploads', upload_id, ttl=store.max_age)
+    return current
+
+
+def finalize_upload(upload_id: str, expected_sha256: str = None) -> dict:
+    """
+    Turn a completed upload into a document usable by the operation routes.
+
+    Args:
+        upload_id: Upload to finalize.
+        expected_sha256: Optional hex digest to verify against.
+
+    Returns:
+        Document info dict (doc_id, filename, size, sha256).
+    """
+    meta = _load_meta(upload_id)
+    part_path = _part_path(upload_id)
+
+    with _lock_for(upload_id), _open_part(upload_id) as f:
+        # Another process may have finalized it while we waited for the lock
+        _load_meta(upload_id)
+        size = os.fstat(f.fileno()).st_size
+        if meta.get("size") is not None and size != meta["size"]:
+            raise UploadError(f"Upload incomplete: {size} of {meta['size']} bytes received")
+
+        hasher, hashed = _hashers.pop(upload_id, (None, 0))
+        if hasher is None or hashed != size:
+            hasher = _rebuild_hasher(part_path)
+        digest = hasher.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != digest:
+            raise UploadError("Checksum mismatch")
+
+        doc_id = upload_id
+        doc_path = store.allocate(f"doc_{doc_id}_{meta['filename']}", session=meta.get("session"), allow_ram=False)
+        os.replace(part_path, doc_path)
+
+        info = {"doc_id": doc_id, "filename": meta["filename"], "size": size, "sha256": digest}
+        metadata.put('documents', doc_id, dict(info, path=doc_path), ttl=store.max_age)
+        metadata.delete('uploads', upload_id)
+
+    with _registry_lock:
+        _locks.pop(upload_id, None)
+
+    logger.info(f"Finalized upload {upload_id} ({size} bytes)")
+    return info
+
+
+def get_document(doc_id: str) -> Tuple[str, str]:
+    """
+    Resolve a finalized document id.
+
+    Returns:
+        (path, original filename)
+    """
+    info = metadata.get('documents', doc_id) if _valid_id(doc_id) else None
+    if info is None:
+        raise UploadError("Unknown document")
+    if not os.path.exists(info["path"]):
+        raise UploadError("Document has expired")
+    store.touch(info["path"])
+    metadata.touch('documents', doc_id, ttl=store.max_age)
+    return info["path"], info["filename"]
@@ -1,56 +1,52 @@
-import os
-import time
 import logging
-import uuid
-from typing import List
+from typing import List, Optional, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-TEMP_DIR = 'temp'
-MAX_LIFETIME = 3600  # 1 hour
+def parse_page_spec(spec: str) -> List[Tuple[int, Optional[int]]]:
+    """
+    Parse a page selection like "1-3,5,8-" (1-indexed, as shown to users)
+    without knowing the document, so requests can be validated up front.
 
-def ensure_temp_directory_exists() -> None:
-    """Ensure the temporary directory exists."""
-    if not os.path.exists(TEMP_DIR):
-        os.makedirs(TEMP_DIR)
+    Returns:
+        (first, last) ranges, inclusive; last is None for open ranges.
 
-def get_temp_path(filename: str = None) -> str:
-    """
-    Get a full path for a temporary file.
-    If filename is not provided, generating a unique one.
+    Raises:
+        ValueError: If a part is not a page number or range.
     """
-    ensure_temp_directory_exists()
-    if not filename:
-        filename = f"{uuid.uuid4()}.pdf"
-    return os.path.join(TEMP_DIR, filename)
-
-def cleanup_temp_files() -> None:
-    """Remove expired temporary files."""
-    if not os.path.exists(TEMP_DIR):
-        return
-
-    current_time = time.time()
-    
-    for file_name in os.listdir(TEMP_DIR):
-        file_path = os.path.join(TEMP_DIR, file_name)
-        
-        # Skip if it's not a file
-        if not os.path.isfile(file_path):
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
             continue
-            
+        start, dash, end = part.partition('-')
         try:
-            file_age = current_time - os.path.getctime(file_path)
-            if file_age > MAX_LIFETIME:
-                os.remove(file_path)
-                logger.info("Removed expired file: %s", file_path)
-        except Exception as e:
-            logger.error("Error removing file %s: %s", file_path, e)
-            
-    # Optional: cleanup empty directory if needed, but usually keeping it is fine
-    try:
-        if not os.listdir(TEMP_DIR):
-            os.rmdir(TEMP_DIR)
-    except OSError:
-        pass
+            first = int(start) if start.strip() else 1
+            last = (int(end) if end.strip() else None) if dash else first
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part}") from None
+        if last is not None and first > last:
+            raise ValueError(f"Invalid page range: {part}")
+        ranges.append((first, last))
+    return ranges
+
+def parse_page_ranges(spec: str, page_count: int) -> List[int]:
+    """
+    Parse a page selection like "1-3,5,8-" (1-indexed, as shown to users).
+
+    Args:
+        spec: Comma-separated pages and ranges. Open ranges run to the end.
+        page_count: Number of pages in the document.
+
+    Returns:
+        Sorted list of unique 0-indexed page numbers within the document.
+
+    Raises:
+        ValueError: If the selection is malformed (see parse_page_spec).
+    """
+    selected = set()
+    for first, last in parse_page_spec(spec):
+        selected.update(range(max(first, 1) - 1, min(page_count if last is None else last, page_count)))
+    return sorted(selected)
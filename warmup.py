@@ -0,0 +1,100 @@
+import io
+import sys
+import time
+import threading
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Imported on demand by pdf_services; the first request would otherwise pay for them.
+# Only processes that run PDF jobs load them (the workers, or the web process
+# when WORKER_POOL_SIZE=0).
+HEAVY_MODULES = ('fitz', 'PIL.Image', 'pdf_services')
+
+_timings = {}  # step -> milliseconds
+_worker_timings = []  # warm_up() timings reported by each worker process
+_started = threading.Event()
+_ready = threading.Event()
+
+
+def _record(step: str, start: float) -> None:
+    _timings[step] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def timed_import(name: str):
+    """Import a module, recording how long the first import took."""
+    already_loaded = name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if not already_loaded:
+        _record(f"import {name}", start)
+    return module
+
+
+def warm_up() -> dict:
+    """
+    Load heavy libraries and exercise the code paths that lazily initialise
+    state on first use (base-14 fonts, the renderer, the JPEG encoder).
+
+    Returns:
+        Timings in milliseconds per step.
+    """
+    total_start = time.perf_counter()
+    for name in HEAVY_MODULES:
+        timed_import(name)
+
+    fitz = sys.modules['fitz']
+    Image = sys.modules['PIL.Image']
+
+    start = time.perf_counter()
+    fitz.Font("helv")  # used by add_watermark
+    doc = fitz.open()
+    page = doc.new_page(width=72, height=72)
+    page.insert_text((10, 40), "warm", fontname="helv", fontsize=12)
+    pix = page.get_pixmap()
+    Image.frombytes("RGB", [pix.width, pix.height], pix.samples).save(io.BytesIO(), format="JPEG")
+    doc.close()
+    _record("first render", start)
+
+    _record("total", total_start)
+    return dict(_timings)
+
+
+def record_workers(timings: list) -> None:
+    """Keep the warm-up timings of the worker processes, for status()."""
+    _worker_timings[:] = timings
+
+
+def start_background(*steps) -> threading.Thread:
+    """
+    Run the given warm-up callables (e.g. starting the worker processes) in
+    a background thread, then mark the process ready. The server can accept
+    connections meanwhile and report itself as starting.
+    """
+    def run():
+        try:
+            for step in steps:
+                start = time.perf_counter()
+                step()
+                _record(getattr(step, '__name__', 'step'), start)
+            logger.info(f"Warm-up finished: {_timings}, workers: {_worker_timings}")
+        except Exception as e:
+            logger.error(f"Warm-up failed: {e}")
+        finally:
+            _ready.set()
+
+    _started.set()
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def status() -> dict:
+    """Startup state for the health endpoint."""
+    return {
+        'warmup_started': _started.is_set(),
+        'ready': _ready.is_set() or not _started.is_set(),
+        'timings_ms': dict(_timings),
+        'worker_timings_ms': list(_worker_timings),
+    }
@@ -0,0 +1,334 @@
+import os
+import time
+import queue
+import atexit
+import threading
+import logging
+import multiprocessing
+
+import warmup
+import cancellation
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerError(RuntimeError):
+    """Base class for failures of the worker process itself (not the job)."""
+
+
+class JobTimeout(WorkerError):
+    """The job exceeded its wall-clock limit and was stopped."""
+
+
+class WorkerCrashed(WorkerError):
+    """The worker died while running the job (segfault, OOM kill...)."""
+
+
+class JobCancelled(WorkerError, cancellation.Cancelled):
+    """The caller cancelled the job (or its client went away) and it was stopped."""
+
+    def __init__(self, message: str, reason: str = cancellation.JOB_CANCELLED):
+        WorkerError.__init__(self, message)
+        self.reason = reason
+
+
+# Seconds a job has to stop at its next page once cancelled (or past its
+# deadline) before its worker is killed
+CANCEL_GRACE = float(os.environ.get('WORKER_CANCEL_GRACE', 5))
+
+
+def _apply_memory_limit(limit_mb: int) -> None:
+    """Cap the address space of the current process (POSIX only)."""
+    if not limit_mb:
+        return
+    try:
+        import resource
+    except ImportError:
+        logger.info("Memory limits are not supported on this platform")
+        return
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(conn, memory_limit_mb: int, cancel_event) -> None:
+    """
+    Worker process loop: receive (func_name, args, kwargs, deadline), send
+    back the result. The job runs with a CancelToken on `cancel_event`,
+    which the parent sets to stop it.
+    """
+    _apply_memory_limit(memory_limit_mb)
+
+    # Pre-warm: pay for imports and first-use initialisation before the first job
+    conn.send(('ready', warmup.warm_up()))
+    import pdf_services
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+
+        func_name, args, kwargs, deadline = job
+        token = cancellation.CancelToken(deadline=deadline, event=cancel_event)
+        try:
+            with cancellation.scope(token):
+                result = getattr(pdf_services, func_name)(*args, **kwargs)
+            conn.send(('ok', result))
+        except Exception as e:
+            try:
+                conn.send(('error', e))
+            except Exception:
+                # Exception not picklable, keep the message
+                conn.send(('error', RuntimeError(str(e))))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_limit_mb: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.cancel_event = ctx.Event()
+        # Not daemonic, so jobs may use their own process pools (images_to_pdf).
+        # Workers still exit when the parent goes away: recv() hits EOF.
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, memory_limit_mb, self.cancel_event),
+                                   daemon=False)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.ready = False
+        self.timings = None
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Consume the worker's ready message (sent once its warm-up is done)."""
+        if not self.ready and self.conn.poll(timeout):
+            status, self.timings = self.conn.recv()
+            self.ready = status == 'ready'
+        return self.ready
+
+    def stop(self, kill: bool = False) -> None:
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+                self.process.join(timeout=5)
+                if self.process.is_alive():
+                    self.process.kill()
+        except Exception:
+            pass
+        finally:
+            self.conn.close()
+
+
+class WorkerPool:
+    """
+    Pool of pre-started worker processes running pdf_services functions.
+
+    A job that hangs is killed after job_timeout seconds; a job that blows
+    the memory limit fails with MemoryError (or kills its worker). Either
+    way only that request fails and the worker is replaced. Workers are also
+    recycled after max_jobs jobs to bound leaks and fragmentation.
+    """
+
+    def __init__(self, size: int, max_jobs: int = 100, job_timeout: float = 300, memory_limit_mb: int = 2048):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.job_timeout = job_timeout
+        self.memory_limit_mb = memory_limit_mb
+
+        # spawn gives clean workers on every platform (fork is unsafe in a
+        # threaded server and unavailable on Windows)
+        self._ctx = multiprocessing.get_context('spawn')
+        self._idle = queue.Queue()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+        logger.info(f"Started {size} PDF worker processes")
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._ctx, self.memory_limit_mb)
+
+    def _release(self, worker: _Worker, discard: bool = False) -> None:
+        if discard or worker.jobs >= self.max_jobs:
+            worker.stop(kill=discard)
+            if self._closed:
+                return
+            worker = self._spawn()
+        if self._closed:
+            worker.stop()
+        else:
+            self._idle.put(worker)
+
+    def _wait_result(self, worker: _Worker, func_name: str, timeout: float,
+                     cancel: cancellation.CancelToken = None) -> None:
+        """
+        Block until the worker has answered.
+
+        When `cancel` trips, the job is asked to stop (it checks between
+        pages); past its deadline it stops by itself. A job that has not
+        answered CANCEL_GRACE seconds later is killed: JobCancelled /
+        JobTimeout.
+        """
+        deadline = time.monotonic() + timeout
+        kill_at = None
+        while not worker.conn.poll(0.1):
+            now = time.monotonic()
+            if kill_at is None:
+                if cancel is not None and cancel.cancelled:
+                    worker.cancel_event.set()
+                    kill_at = now + CANCEL_GRACE
+                elif now >= deadline:
+                    kill_at = now + CANCEL_GRACE
+            elif now >= kill_at:
+                if now >= deadline:
+                    raise JobTimeout(f"{func_name} exceeded {timeout:g}s and was stopped")
+                raise JobCancelled(f"{func_name} was cancelled ({cancel.reason})", cancel.reason)
+
+    def _acquire(self, func_name: str, timeout: float, deadline: float,
+                 cancel: cancellation.CancelToken = None) -> _Worker:
+        """Wait for an idle worker, within the job's deadline and while it is still wanted."""
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise JobTimeout(f"No worker was free for {func_name} within {timeout:g}s")
+            try:
+                return self._idle.get(timeout=min(remaining, 0.5))
+            except queue.Empty:
+                if cancel is not None:
+                    cancel.check()
+
+    def _wait_warm(self, worker: _Worker, deadline: float, cancel: cancellation.CancelToken = None) -> None:
+        """Let a worker finish its warm-up before it gets a job, while the job is still wanted."""
+        while not worker.wait_ready(min(max(deadline - time.time(), 0), 0.5)) and time.time() < deadline:
+            if cancel is not None:
+                cancel.check()
+
+    def call(self, func_name: str, *args, timeout: float = None, cancel: cancellation.CancelToken = None, **kwargs):
+        """
+        Run pdf_services.<func_name>(*args, **kwargs) in a worker and return its result.
+
+        The job stops at its next page when `cancel` (default: the token in
+        scope, see cancellation.py) trips, raising JobCancelled, or when the
+        timeout or the token's deadline passes, raising JobTimeout. The
+        worker is only killed if it does not stop within CANCEL_GRACE.
+        """
+        timeout = timeout or self.job_timeout
+        cancel = cancel or cancellation.current()
+        if cancel is not None:
+            cancel.check()
+        deadline = time.time() + timeout
+        if cancel is not None and cancel.deadline is not None:
+            deadline = min(deadline, cancel.deadline)
+        worker = self._acquire(func_name, timeout, deadline, cancel)
+        if not worker.process.is_alive():
+            # Died while idle (killed externally); don't fail this job for it
+            worker.stop(kill=True)
+            worker = self._spawn()
+        discard = False
+        try:
+            self._wait_warm(worker, deadline, cancel)
+            # The job may have been cancelled while the worker warmed up
+            if cancel is not None:
+                cancel.check()
+            worker.jobs += 1
+            worker.cancel_event.clear()
+            worker.conn.send((func_name, args, kwargs, deadline))
+            while True:
+                try:
+                    self._wait_result(worker, func_name, max(deadline - time.time(), 0), cancel)
+                except WorkerError:
+                    discard = True
+                    raise
+                status, payload = worker.conn.recv()
+                if status != 'ready':
+                    break
+                # wait_ready() timed out and the warm-up finished since; the reply follows
+                worker.ready, worker.timings = True, payload
+        except (EOFError, OSError) as e:
+            discard = True
+            worker.process.join(timeout=1)
+            raise WorkerCrashed(f"Worker crashed during {func_name} (exit code {worker.process.exitcode})") from e
+        finally:
+            self._release(worker, discard)
+
+        if status == 'error':
+            if isinstance(payload, cancellation.Cancelled):
+                # Stopped cleanly; the worker goes back to the pool
+                if payload.reason == cancellation.DEADLINE_EXCEEDED:
+                    raise JobTimeout(f"{func_name} exceeded {timeout:g}s and was stopped")
+                reason = cancel.reason if cancel is not None and cancel.reason else payload.reason
+                raise JobCancelled(f"{func_name} was cancelled ({reason})", reason)
+            raise payload
+        return payload
+
+    def warm_up(self, timeout: float = 60) -> list:
+        """Wait until every worker has finished its warm-up; return their timings."""
+        timings = []
+        for _ in range(self.size):
+            worker = self._idle.get()
+            try:
+                if worker.wait_ready(timeout):
+                    timings.append(worker.timings)
+            except (EOFError, OSError):
+                worker.process.join(timeout=1)
+                self._release(worker, discard=True)
+                continue
+            self._idle.put(worker)
+        return timings
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared pool, starting it on first use. None when disabled."""
+    global _pool
+    size = int(os.environ.get('WORKER_POOL_SIZE', os.cpu_count() or 1))
+    if size <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(
+                size=size,
+                max_jobs=int(os.environ.get('WORKER_MAX_JOBS', 100)),
+                job_timeout=float(os.environ.get('WORKER_JOB_TIMEOUT', 300)),
+                memory_limit_mb=int(os.environ.get('WORKER_MEMORY_LIMIT_MB', 2048)),
+            )
+            atexit.register(_pool.close)
+        return _pool
+
+
+def warm_workers() -> None:
+    """
+    Start the pool and block until all workers are warm. With the pool
+    disabled, jobs run in this process, so warm it up instead.
+    """
+    pool = get_pool()
+    if pool is None:
+        warmup.warm_up()
+    else:
+        warmup.record_workers(pool.warm_up())
+
+
+def run(func_name: str, *args, timeout: float = None, **kwargs):
+    """
+    Run a pdf_services function, isolated in the worker pool when enabled.
+    Set WORKER_POOL_SIZE=0 to run in-process (debugging; `timeout` is not
+    enforced then). Either way the job stops early when the cancellation
+    token in scope trips.
+    """
+    pool = get_pool()
+    if pool is None:
+        import pdf_services
+        cancellation.check()
+        return getattr(pdf_services, func_name)(*args, **kwargs)
+    return pool.call(func_name, *args, timeout=timeout, **kwargs)